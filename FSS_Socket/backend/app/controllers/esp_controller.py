@@ -4,7 +4,10 @@ import os
 from dotenv import load_dotenv
 from flask import Blueprint, jsonify, request
 from flask_sock import Sock
+from app.dao.redis_dao import RedisDAO
 from app.util.fix_connection import FixConnection
+from app.util.esp_snapshot_stream import EspSnapshotStream
+from app.util.esp_subscription_manager import EspSubscriptionManager
 from flask_cors import CORS
 
 # Initialize WebSocket Blueprint
@@ -17,9 +20,6 @@ load_dotenv()
 # Initialize Sock instance
 sock = Sock(ws_bp)
 
-# List to keep track of connected WebSocket clients
-connected_clients = []
-
 # Initialize the FIX connection
 fix_connection = FixConnection(
     host=os.getenv("FIX_SOCKET_HOST"),
@@ -29,21 +29,53 @@ fix_connection = FixConnection(
     tls_cert=os.getenv("FIX_TLS_CERT", "cert_production_alex@gzcim.com.pem"),
     tls_key=os.getenv("FIX_TLS_KEY", "key_production_alex@gzcim.com.pem"),
     log_file="ws_fix_logs.txt",
+    log_format=os.getenv("FIX_LOG_FORMAT", "text"),
+    log_rotation=os.getenv("FIX_LOG_ROTATION") or None,
+    log_max_bytes=int(os.getenv("FIX_LOG_MAX_BYTES", "0")) or None,
     msg_seq_num_file="stream_msg_seq_num.txt",
+    seq_num_durability="periodic",
+    seq_num_recovery_gap=int(os.getenv("FIX_SEQ_NUM_RECOVERY_GAP", "100")),
     quote_type="esp",
     redis_host=os.getenv("REDIS_HOST", "localhost"),
     redis_port=int(os.getenv("REDIS_PORT", "6379")),
     redis_db=0,
     redis_password=(os.getenv("REDIS_PASSWORD", None)),
     redis_ssl=(os.getenv("REDIS_SSL", "False")=="True"),
+    redis_stream_maxlen=int(os.getenv("REDIS_STREAM_MAXLEN", "10000")),
+)
+
+# Venue subscriptions shared by every /ws_esp client and /api/subscribe_quote
+esp_subscriptions = EspSubscriptionManager(
+    fix_connection,
+    coalesce_delay=float(os.getenv("ESP_SUBSCRIBE_COALESCE_MS", "50")) / 1000,
 )
+fix_connection.on_reconnect = esp_subscriptions.resubscribe_all
+
+# One Redis consumer shared by every /ws_esp client
+esp_snapshot_stream = EspSnapshotStream(
+    RedisDAO(
+        quote_type="esp",
+        host=os.getenv("REDIS_HOST", "localhost"),
+        port=int(os.getenv("REDIS_PORT", "6379")),
+        password=os.getenv("REDIS_PASSWORD"),
+        ssl=os.getenv("REDIS_SSL", "False") == "True",
+        read_legacy_keys=os.getenv("REDIS_READ_LEGACY_KEYS", "True") == "True",
+    ),
+    interval=float(os.getenv("ESP_SNAPSHOT_INTERVAL", "2")),
+    source=os.getenv("ESP_QUOTE_SOURCE", "stream"),
+)
+# Connected /ws_esp clients, each with its own sender thread
+connected_clients = esp_snapshot_stream.clients
+
+
+# Default per-client update cadence; ?conflate_ms= on /ws_esp overrides it
+ESP_CONFLATE_MS = int(os.getenv("ESP_CONFLATE_MS", "0"))
 
 
 # Handle WebSocket connections
 @sock.route("/ws_esp")
 def websocket(ws):
     print("Client connected")
-    connected_clients.append(ws)
 
     ws.send("Connected to esp price feed")
 
@@ -57,8 +89,10 @@ def websocket(ws):
                 password=os.getenv("FIX_PASSWORD"),
             )
 
-        # Request streaming prices for EUR/USD with Full Amount options
-        fix_connection.request_esp_prices(
+        # Request streaming prices for EUR/USD with Full Amount options;
+        # only the first client for a symbol sends a request to the venue
+        esp_subscriptions.subscribe(
+            ws,
             symbols=[
                 "EUR/USD",
                 # "USD/JPY",
@@ -75,76 +109,35 @@ def websocket(ws):
         print(f"FIX connection failed (expected in container environment): {e}")
         ws.send("WebSocket connected - FIX gateway not available in container environment")
 
-    # Import Redis DAO here to fetch data
-    from app.dao.redis_dao import RedisDAO
-    import time
-    import threading
-    
-    # Initialize Redis connection for this client
-    redis_dao = RedisDAO(
-        quote_type="esp",
-        host=os.getenv("REDIS_HOST", "localhost"),
-        port=int(os.getenv("REDIS_PORT", "6379")),
-        password=os.getenv("REDIS_PASSWORD"),
-        ssl=os.getenv("REDIS_SSL", "False") == "True"
+    # Redis quotes come from the shared snapshot producer; all sends to this
+    # socket go through its sender so they never interleave
+    try:
+        conflate_ms = int(request.args.get("conflate_ms", ESP_CONFLATE_MS))
+    except ValueError:
+        conflate_ms = ESP_CONFLATE_MS
+    sender = esp_snapshot_stream.subscribe(
+        ws, conflate_interval=max(0, conflate_ms) / 1000
     )
-    
-    # Function to send Redis quotes - get ALL available data
-    def send_redis_quotes():
-        while ws in connected_clients:
-            try:
-                # Get ALL exchange rate keys from Redis
-                all_rates = redis_dao.get_all_exchange_rates()
-                
-                # Send each quote to the client
-                for key, quote_data in all_rates.items():
-                    if quote_data and quote_data.get("rate"):
-                        # Parse the key to extract details
-                        # Format: exchange_rate:quote_type:symbol:type:quantity:side:settlement:provider
-                        parts = key.split(":")
-                        if len(parts) >= 7:
-                            quote_type = parts[1]  # esp or rfs
-                            symbol = parts[2]
-                            rate_type = parts[3]  # SPOT, FORWARD, etc
-                            quantity = parts[4]
-                            side = parts[5]
-                            settlement = parts[6]
-                            provider = parts[7] if len(parts) > 7 else "Unknown"
-                            
-                            message = {
-                                "type": "quote",
-                                "quote_type": quote_type,
-                                "symbol": symbol,
-                                "rate_type": rate_type,
-                                "price": quote_data.get("rate"),
-                                "side": side,
-                                "provider": provider,
-                                "quantity": quantity,
-                                "settlement": settlement,
-                                "timestamp": quote_data.get("timestamp"),
-                                "source": "redis"
-                            }
-                            ws.send(json.dumps(message))
-                
-                time.sleep(2)  # Update every 2 seconds
-            except Exception as e:
-                print(f"Error sending Redis quotes: {e}")
-                break
-    
-    # Start background thread to send Redis quotes
-    redis_thread = threading.Thread(target=send_redis_quotes, daemon=True)
-    redis_thread.start()
-    
+
     # Continuously listen for messages from the client
     while True:
         try:
             data = ws.receive()
             if data:
                 print(f"Received from client: {data}")
-                ws.send(f"Echo: {data}")
+                control = _control_message(data)
+                if control.get("type") == "resync":
+                    esp_snapshot_stream.resync(ws)
+                elif control.get("type") == "replay":
+                    esp_snapshot_stream.replay(ws, control.get("count", 100))
+                elif control.get("type") in ("subscribe", "unsubscribe", "topics"):
+                    esp_snapshot_stream.update_topics(ws, control)
+                else:
+                    sender.send(f"Echo: {data}")
         except Exception as e:
             print(f"Client disconnected: {e}")
-            connected_clients.remove(ws)
+            esp_snapshot_stream.unsubscribe(ws)
+            esp_subscriptions.unsubscribe(ws)
             break
 
 
@@ -165,7 +158,11 @@ def request_quote():
                     username=os.getenv("FIX_USERNAME"),
                     password=os.getenv("FIX_PASSWORD"),
                 )
-            fix_connection.request_esp_prices([symbol], [settl_type],ndf=ndf=='true')
+            settl_types = settl_type if isinstance(settl_type, list) else [settl_type]
+            # API subscriptions are never released, so they share one subscriber
+            esp_subscriptions.subscribe(
+                "api", [symbol], settl_types, ndf=ndf == 'true'
+            )
             logger.info(f"Quote request sent for {symbol}")
             return jsonify({"message": f"Quote request sent for {symbol}"})
         except Exception as fix_error:
@@ -180,6 +177,16 @@ def request_quote():
         return jsonify({"error": str(e)}), 500
 
 
+@ws_bp.route("/api/esp_subscriptions", methods=["GET"])
+def esp_subscription_table():
+    return jsonify(
+        {
+            "subscriptions": esp_subscriptions.subscriptions(),
+            "stats": esp_subscriptions.stats(),
+        }
+    )
+
+
 # Push price updates to all connected WebSocket clients
 def push_prices_to_clients(
     quote_id,
@@ -192,7 +199,8 @@ def push_prices_to_clients(
     originator,
 ):
     """
-    Send price updates to all connected WebSocket clients.
+    Send price updates to all connected WebSocket clients, conflated per
+    (symbol, settlement, side, provider, quantity) at each client's cadence.
     """
     data = {
         "quote_id": quote_id,
@@ -205,13 +213,24 @@ def push_prices_to_clients(
         "originator": originator,
     }
     # print(f"Sending price update: {data}")
-    json_data = json.dumps(data)
-    for client in connected_clients:
-        try:
-            client.send(json_data)
-        except Exception as e:
-            print(f"Error sending data to client: {e}")
-            connected_clients.remove(client)
+    esp_snapshot_stream.broadcast_latest(
+        ("fix", symbol, settlement_type, entry_type, originator, quantity),
+        json.dumps(data),
+        topic=(symbol, settlement_type, originator),
+    )
+
+
+def _control_message(data):
+    """
+    Parse a JSON control message from a client, e.g. {"type": "resync"},
+    {"type": "replay", "count": 100} or {"type": "subscribe", "symbols":
+    ["EUR/USD"]}. Returns an empty dict for anything else.
+    """
+    try:
+        message = json.loads(data)
+    except (TypeError, ValueError):
+        return {}
+    return message if isinstance(message, dict) else {}
 
 
 # Link the FIX connection price update handler to WebSocket
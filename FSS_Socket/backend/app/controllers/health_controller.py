@@ -86,7 +86,23 @@ def health_check():
         except Exception as conn_error:
             logger.warning(f"Could not get connection counts: {conn_error}")
             health_status["connections"] = {"status": "unknown"}
-        
+
+        # Redis write-behind and ESP snapshot producer metrics
+        try:
+            from app.controllers.esp_controller import fix_connection as esp_fix_connection
+            from app.controllers.esp_controller import esp_snapshot_stream
+            from app.controllers.rfs_controller import fix_connection_stream as rfs_fix_connection
+
+            health_status["redis_writes"] = {
+                "esp": esp_fix_connection.redis_dao.get_write_metrics(),
+                "rfs": rfs_fix_connection.redis_dao.get_write_metrics(),
+            }
+            health_status["esp_snapshot_stream"] = esp_snapshot_stream.stats()
+            from app.controllers.esp_controller import esp_subscriptions
+            health_status["esp_subscriptions"] = esp_subscriptions.stats()
+        except Exception as metrics_error:
+            logger.warning(f"Could not get stream metrics: {metrics_error}")
+
         return jsonify(health_status), 200
         
     except Exception as e:
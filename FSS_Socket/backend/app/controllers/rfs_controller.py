@@ -3,7 +3,10 @@ from datetime import date, datetime
 import json
 from flask import Blueprint, request, jsonify
 from sqlalchemy import create_engine
+from app.util.business_calendar import get_calendar
 from app.util.fix_connection import FixConnection
+from app.util.client_registry import ClientRegistry
+from app.util.topic_index import TopicIndex
 from dotenv import load_dotenv
 import os
 import logging
@@ -12,8 +15,7 @@ from app.controllers.trade_result_controller import (
     push_execution_result,
 )
 from flask_sock import Sock
-from datetime import datetime, timedelta
-from dateutil.relativedelta import relativedelta
+from datetime import datetime
 # from app.dao.virtual_fx_trade_dao import VirtiualFxTradeDAO
 # from app.dao.trade_inventory_dao import TradeInventoryDAO
 
@@ -28,27 +30,56 @@ load_dotenv()
 fix_bp = Blueprint("fix", __name__)
 CORS(fix_bp)
 sock = Sock(fix_bp)
-# List to keep track of connected WebSocket clients
-connected_clients = []
+# Clients get every quote until they subscribe to (symbol, tenor, provider) topics
+rfs_topics = TopicIndex()
+# Connected WebSocket clients, each with its own sender thread
+connected_clients = ClientRegistry("rfs", on_remove=rfs_topics.remove)
 
 
 @sock.route("/ws_rfs")
 def websocket(ws):
     print("Client connected")
-    connected_clients.append(ws)
     ws.send("Connected to rfs price feed")
+    sender = connected_clients.add(ws)
+    rfs_topics.add(sender)
     while True:
         try:
             data = ws.receive()
             if data:
                 print(f"Received from client: {data}")
-                ws.send(f"Echo: {data}")
+                reply = _topic_request(sender, data)
+                sender.send(reply if reply is not None else f"Echo: {data}")
         except Exception as e:
             print(f"Client disconnected: {e}")
             connected_clients.remove(ws)
             break
 
 
+def _topic_request(sender, data):
+    """
+    Apply a {"type": "subscribe" | "unsubscribe" | "topics", "symbols",
+    "tenors", "providers"} message and return the JSON reply, or None if data
+    is something else. Invalid fields get an {"type": "error"} reply.
+    """
+    try:
+        message = json.loads(data)
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(message, dict):
+        return None
+    fields = {name: message.get(name) for name in ("symbols", "tenors", "providers")}
+    try:
+        if message.get("type") == "subscribe":
+            rfs_topics.subscribe(sender, **fields)
+        elif message.get("type") == "unsubscribe":
+            rfs_topics.unsubscribe(sender, **fields)
+        elif message.get("type") != "topics":
+            return None
+    except ValueError as e:
+        return json.dumps({"type": "error", "message": str(e)})
+    return json.dumps({"type": "topics", "topics": rfs_topics.topics(sender)})
+
+
 def push_prices_to_clients(
     symbol,
     type,
@@ -71,7 +102,8 @@ def push_prices_to_clients(
     value_date=None,
 ):
     """
-    Send price updates to all connected WebSocket clients.
+    Send price updates to the WebSocket clients following the quote's
+    (symbol, settlement type, provider) topic.
     """
     data = {
         "symbol": symbol,
@@ -96,12 +128,9 @@ def push_prices_to_clients(
     }
     # print(f"Sending price update: {data}")
     json_data = json.dumps(data)
-    for client in connected_clients:
-        try:
-            client.send(json_data)
-        except Exception as e:
-            print(f"Error sending data to client: {e}")
-            connected_clients.remove(client)
+    # Only queues; each client's sender thread writes and drops failed sockets
+    for sender in rfs_topics.match(symbol, settlement_type, provider):
+        sender.send(json_data)
 
 
 fix_connection_stream = FixConnection(
@@ -112,13 +141,19 @@ fix_connection_stream = FixConnection(
     tls_cert="192.168.50.103.pem",
     tls_key="192.168.50.103-key.pem",
     log_file="fix_rfs_logs.txt",
+    log_format=os.getenv("FIX_LOG_FORMAT", "text"),
+    log_rotation=os.getenv("FIX_LOG_ROTATION") or None,
+    log_max_bytes=int(os.getenv("FIX_LOG_MAX_BYTES", "0")) or None,
     msg_seq_num_file="msg_seq_num.txt",
+    seq_num_durability="periodic",
+    seq_num_recovery_gap=int(os.getenv("FIX_SEQ_NUM_RECOVERY_GAP", "100")),
     quote_type="rfs",
     redis_host=os.getenv("REDIS_HOST", "localhost"),
     redis_port=int(os.getenv("REDIS_PORT", "6379")),
     redis_db=0,
     redis_password=(os.getenv("REDIS_PASSWORD", None)),
     redis_ssl=(os.getenv("REDIS_SSL", "False") == "True"),
+    redis_stream_maxlen=int(os.getenv("REDIS_STREAM_MAXLEN", "10000")),
 )
 # Link the FIX connection price update handler to WebSocket
 fix_connection_stream.on_price_update = push_prices_to_clients
@@ -141,7 +176,11 @@ fix_connection_trade = FixConnection(
     tls_cert="192.168.50.103.pem",
     tls_key="192.168.50.103-key.pem",
     log_file="fix_logs.txt",
+    log_format=os.getenv("FIX_LOG_FORMAT", "text"),
+    log_rotation=os.getenv("FIX_LOG_ROTATION") or None,
+    log_max_bytes=int(os.getenv("FIX_LOG_MAX_BYTES", "0")) or None,
     msg_seq_num_file="trade_rfs_msg_seq_num.txt",
+    seq_num_durability="fsync",
     db_url=DATABASE_URL,
 )
 
@@ -175,34 +214,16 @@ def start_fix():
         logger.error(f"Error starting FIX connection: {e}", exc_info=True)
         return jsonify({"error": str(e)}), 500
 
-def calculate_near_fixing_settlments_dates_from_settlement(settlement_type: str):
+def calculate_near_fixing_settlments_dates_from_settlement(settlement_type: str, symbol: str = None):
     """
-    For NDF/NDS quotes, compute:
-    - near_settl_date: based on tenor from trade date
-    - near_fixing_date: usually 2 business days before settlement
+    For NDF/NDS quotes, compute on symbol's business calendar:
+    - near_settl_date: value date of the tenor traded today
+    - near_fixing_date: 2 business days before settlement
     """
     try:
-        tenor_map = {
-            "SP": 0,
-            "TOM": 1,
-            "TD": 0,
-            "ON": 0,
-            "TN": 1,
-            "SN": 2,
-            "M1": 1,
-            "M3": 3,
-            "M6": 6,
-            "Y1": 12,
-        }
-
-        today = datetime.utcnow().date()
-        spot = today + timedelta(days=2)  # T+2 for spot
-
-        # Use M1 = 1 month, M3 = 3 months, etc.
-        near_settl_date = spot + relativedelta(months=tenor_map.get(settlement_type, 0))
-
-        # Default fixing = 2 days before settlement
-        near_fixing_date = near_settl_date - timedelta(days=2)
+        calendar = get_calendar(symbol)
+        near_settl_date = calendar.tenor_date(settlement_type, datetime.utcnow().date())
+        near_fixing_date = calendar.fixing_date(near_settl_date)
 
         return near_fixing_date.strftime("%Y%m%d"), near_settl_date.strftime("%Y%m%d")
 
@@ -236,7 +257,7 @@ def request_quote():
         if is_swap:
             # For swap quotes, pass NDF flag to the swap quote method
             if ndf:
-                near_fixing_date,near_settl_date = calculate_near_fixing_settlments_dates_from_settlement(settl_type)
+                near_fixing_date,near_settl_date = calculate_near_fixing_settlments_dates_from_settlement(settl_type, symbol)
 
 
             quote_req_id = fix_connection_stream.request_swap_quote(
@@ -403,29 +424,14 @@ def request_trade():
         return jsonify({"error": str(e)}), 500
 
 
-def calculate_swap_dates_from_settlement(settlement_type, settlement_type2):
-    """Parse compound settlement type like 'M1_M3' into near/far dates."""
+def calculate_swap_dates_from_settlement(settlement_type, settlement_type2, symbol=None):
+    """Near/far value dates of a swap's two tenors, on symbol's business calendar."""
     try:
-        # Basic tenor map
-        tenor_map = {
-            "SP": 0,
-            "TOM": 1,
-            "TD": 0,
-            "ON": 0,
-            "TN": 1,
-            "SN": 2,
-            "M1": 1,
-            "M3": 3,
-            "M6": 6,
-            "Y1": 12,
-        }
-
-
+        calendar = get_calendar(symbol)
         t0 = datetime.utcnow().date()
-        spot = t0 + timedelta(days=2)  # Standard T+2 spot convention
 
-        near_date = spot + relativedelta(months=tenor_map.get(settlement_type, 0))
-        far_date = spot + relativedelta(months=tenor_map.get(settlement_type2, 0))
+        near_date = calendar.tenor_date(settlement_type, t0)
+        far_date = calendar.tenor_date(settlement_type2, t0)
 
         return near_date.strftime("%Y%m%d"), far_date.strftime("%Y%m%d")
     except Exception as e:
@@ -473,7 +479,7 @@ def request_swap_trade():
                 settlement_type, settlement_type2 = settlement_type_parts
             else:
                 settlement_type2 = settlement_type
-            near_date, far_date = calculate_swap_dates_from_settlement(settlement_type, settlement_type2)
+            near_date, far_date = calculate_swap_dates_from_settlement(settlement_type, settlement_type2, symbol)
 
         logger.info(
             f"Swap trade request: {symbol} {side} {order_qty} SPOT={spot_price} FWD={forward_price} {settlement_type} NEAR={near_date} FAR={far_date}"
@@ -2,24 +2,25 @@ from flask import Blueprint
 from flask_sock import Sock
 import json
 from flask_cors import CORS
+from app.util.client_registry import ClientRegistry
 
 # Create Blueprint
 tr_bp = Blueprint("execution", __name__)
 CORS(tr_bp)
 sock = Sock(tr_bp)
 
-# List of connected WebSocket clients
-connected_clients = []
+# Connected WebSocket clients, each with its own sender thread
+connected_clients = ClientRegistry("execution")
 
 
 # WebSocket route for execution results
 @sock.route("/ws_execution")
 def websocket_execution(ws):
     print("Client connected for execution results")
-    connected_clients.append(ws)
     ws.send(
         json.dumps({"message": "Connected to execution result feed"})
     )
+    connected_clients.add(ws)
 
     while True:
         try:
@@ -34,10 +35,5 @@ def websocket_execution(ws):
 
 # Function to push execution results to all WebSocket clients
 def push_execution_result(result):
-
-    for client in connected_clients:
-        try:
-            client.send(json.dumps(result))
-        except Exception as e:
-            print(f"Error sending data to client: {e}")
-            connected_clients.remove(client)
+    # Encoded once and only queued; each client's sender thread does the writing
+    connected_clients.broadcast(json.dumps(result))
@@ -1,8 +1,22 @@
+import atexit
+import calendar
+import logging
+import threading
+import time
 import redis
 import json
 
+logger = logging.getLogger(__name__)
+
 
 class RedisDAO:
+    HASH_KEY_PREFIX = "exchange_rates:"
+    SYMBOL_INDEX_KEY = "exchange_rates:symbols"
+    LEGACY_KEY_PREFIX = "exchange_rate:"
+    LEGACY_MIGRATED_KEY = "exchange_rates:legacy_migrated"
+    STREAM_KEY = "exchange_rates:stream"
+    # Format of the "timestamp" stored with every rate (UTC)
+    TIMESTAMP_FORMAT = "%Y-%m-%d %H-%M-%S"
 
     def __init__(
         self,
@@ -12,7 +26,42 @@ class RedisDAO:
         db=0,
         password=None,
         ssl=False,
+        write_behind=False,
+        flush_interval=0.05,
+        max_pending=10000,
+        max_retry_delay=5.0,
+        read_legacy_keys=True,
+        stream_maxlen=None,
     ):
+        """
+        Rates are stored as one hash per quote_type/symbol
+        (exchange_rates:{quote_type}:{symbol}) with one field per
+        type/quantity/side/settlement/provider, and every symbol that has been
+        written is tracked in the exchange_rates:symbols sorted set, scored by
+        its last update time.
+
+        Args:
+            write_behind: When True, save_exchange_rate only queues the write
+                and a background thread sends queued writes in one pipeline.
+                Callers can request an early flush with schedule_flush().
+            flush_interval: Seconds between timer-driven flushes.
+            max_pending: Maximum number of distinct keys waiting to be
+                written. Writes for new keys beyond this are dropped and
+                counted rather than blocking the caller.
+            max_retry_delay: Upper bound in seconds on the delay between
+                retries of a failed flush; the delay doubles from
+                flush_interval on every consecutive failure.
+            read_legacy_keys: Also return rates still stored under the old
+                flat exchange_rate:* keys from get_all_exchange_rates(), so a
+                snapshot stays complete during the migration. Once
+                migrate_legacy_keys() has written the
+                exchange_rates:legacy_migrated marker, every DAO sharing the
+                Redis stops reading them.
+            stream_maxlen: When set, every rate write is also appended to the
+                exchange_rates:stream Redis Stream, capped at roughly this
+                many entries, so consumers can follow updates with
+                read_updates() instead of polling the hashes.
+        """
         self.redis = redis.Redis(
             host=host,
             port=port,
@@ -22,6 +71,36 @@ class RedisDAO:
             ssl=ssl,
         )
         self.quote_type = quote_type
+        self.read_legacy_keys = read_legacy_keys
+        self._legacy_migrated = False
+        self.stream_maxlen = stream_maxlen
+
+        self.write_behind = write_behind
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_retry_delay = max_retry_delay
+        # Seconds to wait before retrying a failed flush; 0 while Redis is healthy
+        self._retry_delay = 0.0
+        self._failed_flushes = 0
+        # Pending writes keyed by (hash key, field); a newer value for the same
+        # field replaces the queued one since only the latest rate matters.
+        self._pending: dict[tuple[str, str], str] = {}
+        self._pending_cond = threading.Condition()
+        self._flush_requested = False
+        self._writer_running = False
+        self.write_metrics = {
+            "queued": 0,
+            "coalesced": 0,
+            "dropped": 0,
+            "written": 0,
+            "flushes": 0,
+            "errors": 0,
+            "max_depth": 0,
+            "last_flush_size": 0,
+            "last_flush_ms": 0.0,
+        }
+        if write_behind:
+            self._start_writer()
 
     def save_exchange_rate(
         self,
@@ -34,15 +113,172 @@ class RedisDAO:
         timestamp,
         exchange_rate,
     ):
-        key = (
-            f"exchange_rate:{self.quote_type}:{symbol}:{type}:{quantity}:"
-            f"{side}:{settlement}:{provider}"
-        )
+        hash_key = self._hash_key(self.quote_type, symbol)
+        field = self._field(type, quantity, side, settlement, provider)
         value = json.dumps(
             {"rate": exchange_rate, "timestamp": timestamp}
         )
 
-        self.redis.set(key, value)
+        if self.write_behind:
+            self._enqueue((hash_key, field), value)
+        else:
+            pipe = self.redis.pipeline(transaction=False)
+            self._write_batch(pipe, {(hash_key, field): value})
+            pipe.execute()
+
+    # --- Key layout ---
+    @classmethod
+    def _hash_key(cls, quote_type, symbol):
+        return f"{cls.HASH_KEY_PREFIX}{quote_type}:{symbol}"
+
+    @staticmethod
+    def _field(type, quantity, side, settlement, provider):
+        return f"{type}:{quantity}:{side}:{settlement}:{provider}"
+
+    @staticmethod
+    def _legacy_key(quote_type, symbol, field):
+        return f"{RedisDAO.LEGACY_KEY_PREFIX}{quote_type}:{symbol}:{field}"
+
+    def _write_batch(self, pipe, batch):
+        """
+        Queue HSETs for every (hash key, field) in batch plus one ZADD touching
+        the symbol index, and an XADD per rate when the update stream is enabled.
+        """
+        now = time.time()
+        touched = {}
+        for (hash_key, field), value in batch.items():
+            pipe.hset(hash_key, field, value)
+            member = hash_key[len(self.HASH_KEY_PREFIX):]
+            touched[member] = now
+            if self.stream_maxlen:
+                pipe.xadd(
+                    self.STREAM_KEY,
+                    {"key": f"{self.LEGACY_KEY_PREFIX}{member}:{field}", "value": value},
+                    maxlen=self.stream_maxlen,
+                    approximate=True,
+                )
+        pipe.zadd(self.SYMBOL_INDEX_KEY, touched)
+
+    # --- Write-behind batching ---
+    def _start_writer(self):
+        self._writer_running = True
+        threading.Thread(target=self._writer_loop, daemon=True).start()
+        atexit.register(self.close)
+
+    def _enqueue(self, key, value):
+        with self._pending_cond:
+            metrics = self.write_metrics
+            if key in self._pending:
+                metrics["coalesced"] += 1
+            elif len(self._pending) >= self.max_pending:
+                metrics["dropped"] += 1
+                return
+            self._pending[key] = value
+            metrics["queued"] += 1
+            if len(self._pending) > metrics["max_depth"]:
+                metrics["max_depth"] = len(self._pending)
+
+    def schedule_flush(self):
+        """Wake the writer thread so queued writes go out without waiting for the timer."""
+        if not self.write_behind:
+            return
+        with self._pending_cond:
+            self._flush_requested = True
+            self._pending_cond.notify()
+
+    def flush(self):
+        """Send all queued writes in a single pipeline. Returns the number of keys written."""
+        with self._pending_cond:
+            batch = self._pending
+            self._pending = {}
+            self._flush_requested = False
+        if not batch:
+            return 0
+
+        start = time.perf_counter()
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            self._write_batch(pipe, batch)
+            pipe.execute()
+        except Exception as e:
+            with self._pending_cond:
+                if not self._retry_delay:
+                    logger.error(
+                        f"Redis pipeline flush of {len(batch)} keys failed, "
+                        f"retrying with backoff: {e}"
+                    )
+                self._retry_delay = min(
+                    max(self._retry_delay * 2, self.flush_interval),
+                    self.max_retry_delay,
+                )
+                self._failed_flushes += 1
+                self.write_metrics["errors"] += 1
+                self._requeue(batch)
+            return 0
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self._pending_cond:
+            if self._retry_delay:
+                logger.info(
+                    f"Redis pipeline flush recovered after "
+                    f"{self._failed_flushes} failed attempts"
+                )
+                self._retry_delay = 0.0
+                self._failed_flushes = 0
+            metrics = self.write_metrics
+            metrics["written"] += len(batch)
+            metrics["flushes"] += 1
+            metrics["last_flush_size"] = len(batch)
+            metrics["last_flush_ms"] = round(elapsed_ms, 3)
+        return len(batch)
+
+    def _requeue(self, batch):
+        # Caller holds self._pending_cond. Put a failed batch back so the next
+        # flush retries it; keys written again since the swap keep their newer
+        # value, and only what no longer fits under max_pending is dropped.
+        pending = self._pending
+        for key, value in batch.items():
+            if key in pending:
+                continue
+            if len(pending) >= self.max_pending:
+                self.write_metrics["dropped"] += 1
+                continue
+            pending[key] = value
+        if len(pending) > self.write_metrics["max_depth"]:
+            self.write_metrics["max_depth"] = len(pending)
+
+    def _writer_loop(self):
+        while self._writer_running:
+            with self._pending_cond:
+                if self._retry_delay:
+                    # Backing off after a failure; flush requests don't shorten it
+                    self._pending_cond.wait_for(
+                        lambda: not self._writer_running, self._retry_delay
+                    )
+                elif not self._flush_requested:
+                    self._pending_cond.wait(self.flush_interval)
+            self.flush()
+
+    def get_write_metrics(self):
+        """Return a snapshot of the write-behind counters and current queue depth."""
+        with self._pending_cond:
+            return {
+                **self.write_metrics,
+                "depth": len(self._pending),
+                "max_pending": self.max_pending,
+                "retry_delay": self._retry_delay,
+            }
+
+    def close(self):
+        """Stop the writer thread and flush anything still queued."""
+        if not self._writer_running:
+            return
+        self._writer_running = False
+        self.schedule_flush()
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"Final Redis flush failed: {e}")
 
     def get_exchange_rate(
         self,
@@ -53,8 +289,10 @@ class RedisDAO:
         settlement,
         provider,
     ):
-        key = f"exchange_rate:{self.quote_type}:{symbol}:{type}:{quantity}:{side}:{settlement}:{provider}"
-        value = self.redis.get(key)
+        field = self._field(type, quantity, side, settlement, provider)
+        value = self.redis.hget(self._hash_key(self.quote_type, symbol), field)
+        if value is None:
+            value = self.redis.get(self._legacy_key(self.quote_type, symbol, field))
         if value:
             return json.loads(value)
         return None
@@ -68,24 +306,162 @@ class RedisDAO:
         settlement,
         provider,
     ):
-        key = f"exchange_rate:{self.quote_type}:{symbol}:{type}:{quantity}:{side}:{settlement}:{provider}"
-        self.redis.delete(key)
-        print(f"🗑️ Deleted: {key}")
+        field = self._field(type, quantity, side, settlement, provider)
+        hash_key = self._hash_key(self.quote_type, symbol)
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.hdel(hash_key, field)
+        pipe.delete(self._legacy_key(self.quote_type, symbol, field))
+        pipe.execute()
+        print(f"🗑️ Deleted: {hash_key} {field}")
+
+    def get_all_exchange_rates(self, max_age=None):
+        """
+        Return every stored rate keyed by its flat exchange_rate:* key.
+
+        Reads the symbol index once and then all symbol hashes in a single
+        pipeline, so a full snapshot costs two round trips regardless of the
+        number of rates. Until the legacy keys have been migrated it also
+        scans them, which costs a pass over the keyspace.
+
+        Args:
+            max_age: If given, skip symbols not updated within this many
+                seconds, and legacy rates whose timestamp is older than that.
+        """
+        check_legacy = self.read_legacy_keys and not self._legacy_migrated
+        pipe = self.redis.pipeline(transaction=False)
+        if max_age is None:
+            pipe.zrange(self.SYMBOL_INDEX_KEY, 0, -1)
+        else:
+            pipe.zrangebyscore(self.SYMBOL_INDEX_KEY, time.time() - max_age, "+inf")
+        if check_legacy:
+            pipe.exists(self.LEGACY_MIGRATED_KEY)
+        members, *migrated = pipe.execute()
 
-    def get_all_exchange_rates(self):
-        keys = self.redis.keys("exchange_rate:*")
         exchange_rates = {}
-        for key in keys:
-            value = self.redis.get(key)
-            (
-                quote_type,
-                symbol,
-                type,
-                quantity,
-                side,
-                settlement,
-                provider,
-            ) = key.split(":")[1:]
-            exchange_rates[key] = json.loads(value)
+        if check_legacy:
+            if migrated[0]:
+                self._legacy_migrated = True
+            else:
+                exchange_rates.update(self._get_legacy_exchange_rates(max_age))
+
+        if members:
+            pipe = self.redis.pipeline(transaction=False)
+            for member in members:
+                pipe.hgetall(f"{self.HASH_KEY_PREFIX}{member}")
+            for member, fields in zip(members, pipe.execute()):
+                quote_type, symbol = member.split(":", 1)
+                for field, value in fields.items():
+                    key = self._legacy_key(quote_type, symbol, field)
+                    exchange_rates[key] = json.loads(value)
 
         return exchange_rates
+
+    # --- Update stream ---
+    def read_updates(self, last_id, block_ms=1000, count=1000):
+        """
+        Wait up to block_ms for stream entries newer than last_id.
+
+        Returns:
+            (last_id, updates) where updates is a list of (key, quote_data)
+            in stream order, keyed like get_all_exchange_rates(), and last_id
+            is the id to pass to the next call.
+        """
+        response = self.redis.xread(
+            {self.STREAM_KEY: last_id}, count=count, block=block_ms
+        )
+        updates = []
+        for _, entries in response or []:
+            for entry_id, fields in entries:
+                last_id = entry_id
+                updates.append((fields["key"], json.loads(fields["value"])))
+        return last_id, updates
+
+    def get_recent_updates(self, count):
+        """
+        Return the last count stream entries, oldest first.
+
+        Returns:
+            (last_id, updates) where last_id is the newest entry id, or "0-0"
+            if the stream is empty, so it can seed read_updates().
+        """
+        entries = self.redis.xrevrange(self.STREAM_KEY, count=count)
+        entries.reverse()
+        updates = [
+            (fields["key"], json.loads(fields["value"])) for _, fields in entries
+        ]
+        last_id = entries[-1][0] if entries else "0-0"
+        return last_id, updates
+
+    def _get_legacy_exchange_rates(self, max_age=None):
+        """
+        Read rates still stored under flat exchange_rate:* keys using SCAN and
+        MGET. With max_age, rates whose timestamp is older (or unreadable) are
+        skipped.
+        """
+        exchange_rates = {}
+        batch = []
+        for key in self.redis.scan_iter(match=f"{self.LEGACY_KEY_PREFIX}*", count=1000):
+            batch.append(key)
+            if len(batch) >= 1000:
+                exchange_rates.update(self._mget_legacy(batch))
+                batch = []
+        if batch:
+            exchange_rates.update(self._mget_legacy(batch))
+        if max_age is not None:
+            cutoff = time.time() - max_age
+            exchange_rates = {
+                key: value
+                for key, value in exchange_rates.items()
+                if self._rate_time(value) >= cutoff
+            }
+        return exchange_rates
+
+    @classmethod
+    def _rate_time(cls, value):
+        """Epoch seconds of a stored rate's timestamp, or 0 if it has none."""
+        try:
+            return calendar.timegm(
+                time.strptime(value["timestamp"], cls.TIMESTAMP_FORMAT)
+            )
+        except (KeyError, TypeError, ValueError):
+            return 0
+
+    def _mget_legacy(self, keys):
+        return {
+            key: json.loads(value)
+            for key, value in zip(keys, self.redis.mget(keys))
+            if value
+        }
+
+    def migrate_legacy_keys(self, delete=False):
+        """
+        Copy rates from flat exchange_rate:* keys into the hash layout, then
+        set the exchange_rates:legacy_migrated marker so get_all_exchange_rates()
+        stops scanning for legacy keys on every DAO sharing this Redis. Fields
+        already present in the hashes are not overwritten. Run it once no
+        process still writes the flat keys (see migrate_redis_keys.py).
+
+        Args:
+            delete: Remove each legacy key once it has been copied.
+
+        Returns:
+            Number of legacy keys migrated.
+        """
+        legacy = self._get_legacy_exchange_rates()
+        pipe = self.redis.pipeline(transaction=False)
+        touched = {}
+        for key, value in legacy.items():
+            quote_type, symbol, field = key[len(self.LEGACY_KEY_PREFIX):].split(":", 2)
+            pipe.hsetnx(self._hash_key(quote_type, symbol), field, json.dumps(value))
+            # Index a migrated symbol by its rate's age, so max_age still applies
+            member = f"{quote_type}:{symbol}"
+            touched[member] = max(touched.get(member, 0), self._rate_time(value))
+        if touched:
+            pipe.zadd(self.SYMBOL_INDEX_KEY, touched, nx=True)
+        if delete and legacy:
+            pipe.delete(*legacy.keys())
+        pipe.set(self.LEGACY_MIGRATED_KEY, int(time.time()))
+        pipe.execute()
+        self._legacy_migrated = True
+        logger.info(f"Migrated {len(legacy)} legacy exchange_rate keys to hash layout")
+        return len(legacy)
@@ -0,0 +1,107 @@
+import json
+import logging
+import time
+
+import fakeredis
+import pytest
+
+from app.dao.redis_dao import RedisDAO
+
+
+def _stamp(age):
+    return time.strftime(RedisDAO.TIMESTAMP_FORMAT, time.gmtime(time.time() - age))
+
+
+def _legacy(dao, symbol, rate, age=0):
+    key = f"exchange_rate:esp:{symbol}:SPOT:1000000:Bid:SP:FSS"
+    dao.redis.set(key, json.dumps({"rate": rate, "timestamp": _stamp(age)}))
+    return key
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+
+def _dao(server, **kwargs):
+    dao = RedisDAO(quote_type="esp", **kwargs)
+    dao.redis = fakeredis.FakeRedis(server=server, decode_responses=True)
+    return dao
+
+
+@pytest.fixture
+def dao(server):
+    return _dao(server)
+
+
+def test_snapshot_includes_unmigrated_legacy_keys(dao):
+    key = _legacy(dao, "EURUSD", 1.1)
+    dao.save_exchange_rate("GBPUSD", "SPOT", "1000000", "Bid", "SP", "FSS", _stamp(0), 1.3)
+    rates = dao.get_all_exchange_rates()
+    assert rates[key]["rate"] == 1.1
+    assert rates["exchange_rate:esp:GBPUSD:SPOT:1000000:Bid:SP:FSS"]["rate"] == 1.3
+
+
+def test_max_age_filters_legacy_keys_by_timestamp(dao):
+    fresh = _legacy(dao, "EURUSD", 1.1, age=5)
+    stale = _legacy(dao, "USDJPY", 150.0, age=3600)
+    rates = dao.get_all_exchange_rates(max_age=60)
+    assert fresh in rates
+    assert stale not in rates
+
+
+def test_migration_marker_stops_legacy_scans_on_every_dao(server, dao):
+    key = _legacy(dao, "EURUSD", 1.1)
+    other = _dao(server)
+    assert key in other.get_all_exchange_rates()
+
+    assert dao.migrate_legacy_keys() == 1
+    assert dao.redis.exists(RedisDAO.LEGACY_MIGRATED_KEY)
+
+    # A flat key written after the migration is no longer read, by any DAO
+    late = _legacy(dao, "USDJPY", 150.0)
+    rates = other.get_all_exchange_rates()
+    assert rates[key]["rate"] == 1.1  # now served from the hash
+    assert late not in rates
+
+
+def test_migrated_symbols_keep_their_age(dao):
+    _legacy(dao, "USDJPY", 150.0, age=3600)
+    dao.migrate_legacy_keys(delete=True)
+    assert dao.redis.keys("exchange_rate:*") == []
+    assert dao.get_all_exchange_rates(max_age=60) == {}
+    assert len(dao.get_all_exchange_rates()) == 1
+
+
+class _FailingPipeline:
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+    def execute(self):
+        raise ConnectionError("Redis is down")
+
+
+def test_failed_flush_backs_off_and_logs_state_changes(dao, caplog, monkeypatch):
+    caplog.set_level(logging.INFO, logger="app.dao.redis_dao")
+    dao.write_behind = True
+    dao.flush_interval = 0.05
+    dao.max_retry_delay = 0.3
+    pipeline = dao.redis.pipeline
+    monkeypatch.setattr(dao.redis, "pipeline", lambda **kwargs: _FailingPipeline())
+    dao.save_exchange_rate("EURUSD", "SPOT", "1000000", "Bid", "SP", "FSS", _stamp(0), 1.1)
+
+    delays = []
+    for _ in range(5):
+        assert dao.flush() == 0
+        delays.append(dao.get_write_metrics()["retry_delay"])
+    assert delays == [0.05, 0.1, 0.2, 0.3, 0.3]
+    metrics = dao.get_write_metrics()
+    assert metrics["errors"] == 5
+    assert metrics["depth"] == 1
+    assert [r.levelname for r in caplog.records] == ["ERROR"]
+
+    monkeypatch.setattr(dao.redis, "pipeline", pipeline)
+    assert dao.flush() == 1
+    assert dao.get_write_metrics()["retry_delay"] == 0.0
+    assert [r.levelname for r in caplog.records] == ["ERROR", "INFO"]
+    assert dao.get_all_exchange_rates()
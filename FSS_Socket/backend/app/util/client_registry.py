@@ -0,0 +1,110 @@
+import logging
+import threading
+
+from app.util.client_sender import ClientSender
+
+logger = logging.getLogger(__name__)
+
+
+class ClientRegistry:
+    """
+    The WebSocket clients of one endpoint, each with its own ClientSender.
+
+    The FIX listener, the per-client sender threads and the Flask request
+    threads all touch the registry. Readers never lock: they iterate an
+    immutable tuple of senders that add() and compaction replace wholesale
+    (copy-on-write). Removal only tombstones a client: its sender is closed
+    at once, so every reader skips it, and it is dropped from the published
+    tuple on the next compaction. Compactions are batched, so a burst of
+    disconnects copies the tuple once rather than once per client.
+    """
+
+    def __init__(self, name, max_queue=10000, on_remove=None):
+        """
+        Args:
+            name: Label for logs and stats.
+            max_queue: Per-client send queue bound.
+            on_remove: Optional callback invoked with the ClientSender of every
+                client that is removed, including clients whose socket failed.
+        """
+        self.name = name
+        self.max_queue = max_queue
+        self.on_remove = on_remove
+        self._lock = threading.Lock()
+        self._senders: dict = {}  # ws -> ClientSender, changed under _lock
+        self._snapshot: tuple = ()
+        self._tombstones = 0
+
+    def add(self, ws, conflate_interval=0.0):
+        """Register a client and return its ClientSender."""
+        sender = ClientSender(
+            ws,
+            max_queue=self.max_queue,
+            on_close=self._on_sender_closed,
+            conflate_interval=conflate_interval,
+        )
+        with self._lock:
+            previous = self._senders.pop(ws, None)
+            self._senders[ws] = sender
+            self._publish()
+        if previous is not None:
+            previous.close()
+            if callable(self.on_remove):
+                self.on_remove(previous)
+        return sender
+
+    def remove(self, ws):
+        """Tombstone a client: close its sender now, compact the snapshot later."""
+        with self._lock:
+            sender = self._senders.pop(ws, None)
+            if sender is None:
+                return
+            self._tombstones += 1
+            if self._tombstones >= max(8, len(self._senders) // 4):
+                self._publish()
+        sender.close()
+        if callable(self.on_remove):
+            self.on_remove(sender)
+
+    def get(self, ws):
+        """The live ClientSender of ws, or None."""
+        sender = self._senders.get(ws)
+        return sender if sender is not None and not sender.closed else None
+
+    def snapshot(self):
+        """Live senders, read without locking."""
+        return [sender for sender in self._snapshot if not sender.closed]
+
+    def broadcast(self, message):
+        """Queue one encoded message for every client. Returns how many took it."""
+        return sum(1 for sender in self._snapshot if sender.send(message))
+
+    def broadcast_latest(self, key, message):
+        """Queue message for every client, conflated with anything pending under key."""
+        items = ((key, message),)
+        return sum(1 for sender in self._snapshot if sender.send_latest(items))
+
+    def __len__(self):
+        return len(self._senders)
+
+    def __bool__(self):
+        return bool(self._senders)
+
+    def stats(self):
+        senders = self._snapshot
+        return {
+            "name": self.name,
+            "clients": len(self._senders),
+            "tombstones": self._tombstones,
+            "client_queues": [s.stats() for s in senders if not s.closed],
+        }
+
+    def _on_sender_closed(self, sender):
+        logger.info(f"[{self.name}] Removing client after failed send")
+        if self._senders.get(sender.ws) is sender:
+            self.remove(sender.ws)
+
+    def _publish(self):
+        # Caller holds self._lock
+        self._snapshot = tuple(self._senders.values())
+        self._tombstones = 0
@@ -0,0 +1,134 @@
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class ClientSender:
+    """
+    Sends messages to one WebSocket client from a dedicated worker thread.
+
+    Messages wait in a bounded queue. When the client falls behind, the
+    oldest queued messages are dropped, so a slow socket never blocks the
+    producer or the other clients.
+
+    Keyed messages (send_latest) are conflated: only the newest message per
+    key waits, and with a conflate_interval the pending ones are flushed at
+    most once per interval. The last message for a key is always delivered.
+    """
+
+    def __init__(self, ws, max_queue=10000, on_close=None, conflate_interval=0.0):
+        """
+        Args:
+            ws: The flask_sock WebSocket to write to.
+            max_queue: Maximum number of messages waiting to be sent.
+            on_close: Optional callback invoked with this sender once the
+                socket fails and the worker stops.
+            conflate_interval: Seconds between flushes of keyed messages;
+                0 sends them as soon as the worker is free.
+        """
+        self.ws = ws
+        self.max_queue = max_queue
+        self.on_close = on_close
+        self.conflate_interval = conflate_interval
+        self.closed = False
+        self.sent = 0
+        self.dropped = 0
+        self.conflated = 0
+        self._queue = deque()
+        # key -> newest message; dicts keep a replaced key in its first position
+        self._latest = {}
+        self._next_flush = 0.0
+        self._cond = threading.Condition()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def send(self, message):
+        """Queue one message. Returns False if the sender is closed."""
+        return self.send_many((message,))
+
+    def send_many(self, messages):
+        """Queue several messages in order. Returns False if the sender is closed."""
+        with self._cond:
+            if self.closed:
+                return False
+            for message in messages:
+                if len(self._queue) >= self.max_queue:
+                    self._queue.popleft()
+                    self.dropped += 1
+                self._queue.append(message)
+            self._cond.notify()
+        return True
+
+    def send_latest(self, items):
+        """
+        Queue (key, message) pairs, replacing any message still pending for the
+        same key. Returns False if the sender is closed.
+        """
+        with self._cond:
+            if self.closed:
+                return False
+            for key, message in items:
+                if key in self._latest:
+                    self.conflated += 1
+                self._latest[key] = message
+            self._cond.notify()
+        return True
+
+    def discard_latest(self):
+        """Drop pending keyed messages, e.g. before a snapshot that supersedes them."""
+        with self._cond:
+            self._latest.clear()
+
+    def close(self):
+        """Stop the worker and discard anything still queued."""
+        with self._cond:
+            self.closed = True
+            self._queue.clear()
+            self._latest.clear()
+            self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "queued": len(self._queue),
+                "pending_latest": len(self._latest),
+                "sent": self.sent,
+                "dropped": self.dropped,
+                "conflated": self.conflated,
+                "conflate_ms": round(self.conflate_interval * 1000),
+                "closed": self.closed,
+            }
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self.closed:
+                    if self._queue:
+                        break
+                    if self._latest:
+                        wait = self._next_flush - time.monotonic()
+                        if wait <= 0:
+                            break
+                        self._cond.wait(wait)
+                    else:
+                        self._cond.wait()
+                if self.closed:
+                    return
+                batch = list(self._queue)
+                self._queue.clear()
+                if self._latest and time.monotonic() >= self._next_flush:
+                    batch.extend(self._latest.values())
+                    self._latest.clear()
+                    self._next_flush = time.monotonic() + self.conflate_interval
+            for message in batch:
+                try:
+                    self.ws.send(message)
+                    self.sent += 1
+                except Exception as e:
+                    logger.info(f"WebSocket send failed, closing client sender: {e}")
+                    self.close()
+                    if callable(self.on_close):
+                        self.on_close(self)
+                    return
@@ -0,0 +1,369 @@
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from app.util.client_registry import ClientRegistry
+from app.util.topic_index import TopicIndex
+
+logger = logging.getLogger(__name__)
+
+
+class EspSnapshotStream:
+    """
+    Process-wide producer for the /ws_esp Redis quote feed.
+
+    One background thread follows Redis and encodes each changed quote
+    message once. With source="stream" it blocks on the exchange_rates:stream
+    Redis Stream, so updates reach clients as soon as the FIX listener writes
+    them, on every replica. It seeds itself from the rate hashes first. With
+    source="poll" it re-reads every rate once per interval.
+
+    Every quote key carries a version taken from a monotonically increasing
+    counter, bumped whenever the key's rate or timestamp changes. Each client
+    remembers the last version it was sent. A new client gets a full snapshot,
+    and after that only the entries that changed. A client can send
+    {"type": "resync"} to get a fresh full snapshot, or
+    {"type": "replay", "count": N} to get the last N raw updates from the
+    stream.
+
+    Updates go to each client conflated per quote key, so a client with a
+    conflate interval gets the latest price of every key once per interval
+    rather than every tick.
+
+    A client that sends {"type": "subscribe", "symbols": [...], "tenors":
+    [...], "providers": [...]} only gets quotes on those topics from then on
+    (see TopicIndex); until then it gets everything.
+    """
+
+    def __init__(
+        self,
+        redis_dao,
+        interval=2.0,
+        max_client_queue=10000,
+        source="stream",
+        block_ms=1000,
+        max_replay=1000,
+    ):
+        """
+        Args:
+            redis_dao: RedisDAO to read rates from.
+            interval: Seconds between polls in "poll" mode, and the retry
+                delay after a Redis error in either mode.
+            max_client_queue: Per-client send queue bound.
+            source: "stream" to consume the Redis update stream, or "poll"
+                to re-read the rate hashes every interval.
+            block_ms: How long one stream read blocks. This also bounds how
+                long the consumer takes to notice that every client has left.
+            max_replay: Upper bound on the count of a replay request.
+        """
+        self.redis_dao = redis_dao
+        self.interval = interval
+        self.max_client_queue = max_client_queue
+        self.source = source
+        self.block_ms = block_ms
+        self.max_replay = max_replay
+        self.clients = ClientRegistry(
+            "esp", max_queue=max_client_queue, on_remove=self._forget
+        )
+        # Last version delivered to each client, keyed by its ClientSender
+        self._client_versions: dict = {}
+        # key -> (version, (rate, timestamp), encoded payload, topic)
+        self._entries: dict[str, tuple[int, tuple, str, tuple]] = {}
+        # Topic subscriptions, keyed by ClientSender
+        self.topics = TopicIndex()
+        self._version = 0
+        self._lock = threading.Lock()
+        self._running = False
+        self.metrics = {
+            "polls": 0,
+            "errors": 0,
+            "last_poll_ms": 0.0,
+            "last_snapshot_size": 0,
+            "last_delta_size": 0,
+            "full_snapshots_sent": 0,
+            "stream_reads": 0,
+            "stream_updates": 0,
+            "replays_sent": 0,
+        }
+
+    def subscribe(self, ws, conflate_interval=0.0):
+        """
+        Register a WebSocket, queue a full snapshot for it and return its
+        ClientSender. conflate_interval is the client's update cadence in
+        seconds (0 for every update).
+        """
+        # Added outside self._lock: replacing a sender for the same ws calls
+        # back into _forget, which takes the lock
+        sender = self.clients.add(ws, conflate_interval=conflate_interval)
+        self.topics.add(sender)
+        with self._lock:
+            if sender not in self._client_versions:  # a publish may have got there first
+                self._send_full_snapshot(sender)
+            if not self._running:
+                self._running = True
+                threading.Thread(target=self._run, daemon=True).start()
+        return sender
+
+    def unsubscribe(self, ws):
+        self.clients.remove(ws)
+
+    def _forget(self, sender):
+        # Registry callback for every removed client, including failed sockets
+        with self._lock:
+            self._client_versions.pop(sender, None)
+        self.topics.remove(sender)
+
+    def resync(self, ws):
+        """Queue a fresh full snapshot for one client."""
+        with self._lock:
+            sender = self.clients.get(ws)
+            if sender is not None:
+                self._send_full_snapshot(sender)
+
+    def replay(self, ws, count):
+        """Queue the last count updates from the Redis stream for one client."""
+        sender = self.clients.get(ws)
+        if sender is None:
+            return
+        try:
+            count = max(0, min(int(count), self.max_replay))
+        except (TypeError, ValueError):
+            return
+        if count == 0:
+            return
+        _, updates = self.redis_dao.get_recent_updates(count)
+        payloads = []
+        for key, quote_data in updates:
+            message = self.quote_message(key, quote_data)
+            if message is not None:
+                message["replay"] = True
+                payloads.append(json.dumps(message))
+        sender.send_many(payloads)
+        self.metrics["replays_sent"] += 1
+
+    def update_topics(self, ws, request):
+        """
+        Apply a {"type": "subscribe" | "unsubscribe" | "topics", "symbols",
+        "tenors", "providers"} request and queue the client's topic list. A
+        subscribe is followed by a snapshot of what the client now follows.
+        Invalid fields get an {"type": "error"} reply and change nothing.
+        """
+        sender = self.clients.get(ws)
+        if sender is None:
+            return
+        fields = {
+            name: request.get(name) for name in ("symbols", "tenors", "providers")
+        }
+        try:
+            if request.get("type") == "subscribe":
+                self.topics.subscribe(sender, **fields)
+            elif request.get("type") == "unsubscribe":
+                self.topics.unsubscribe(sender, **fields)
+        except ValueError as e:
+            sender.send(json.dumps({"type": "error", "message": str(e)}))
+            return
+        with self._lock:
+            sender.send(
+                json.dumps({"type": "topics", "topics": self.topics.topics(sender)})
+            )
+            if request.get("type") == "subscribe":
+                self._send_full_snapshot(sender)
+
+    def broadcast_latest(self, key, message, topic=None):
+        """
+        Send message to every client following topic (every client when topic
+        is None), conflated with anything pending under key.
+        """
+        if topic is None:
+            self.clients.broadcast_latest(key, message)
+            return
+        for sender in self.topics.match(*topic):
+            sender.send_latest(((key, message),))
+
+    def stats(self):
+        senders = self.clients.snapshot()
+        with self._lock:
+            version = self._version
+            entries = len(self._entries)
+        return {
+            **self.metrics,
+            "version": version,
+            "entries": entries,
+            "clients": len(senders),
+            "client_queues": [sender.stats() for sender in senders],
+            "topics": self.topics.stats(),
+        }
+
+    def _send_full_snapshot(self, sender):
+        # Caller holds self._lock. With nothing cached yet the client starts
+        # at version 0 and gets a full snapshot on the first publish.
+        if self._entries:
+            if self.topics.is_subscribed(sender):
+                payloads = [
+                    payload
+                    for _, _, payload, topic in self._entries.values()
+                    if self.topics.accepts(sender, *topic)
+                ]
+            else:
+                payloads = [payload for _, _, payload, _ in self._entries.values()]
+            header = json.dumps(
+                {"type": "snapshot", "version": self._version, "count": len(payloads)}
+            )
+            # Pending updates are older than the snapshot; sent after it they
+            # would roll prices back
+            sender.discard_latest()
+            sender.send_many([header, *payloads])
+            self.metrics["full_snapshots_sent"] += 1
+        self._client_versions[sender] = self._version
+
+    def _run(self):
+        if self.source == "stream":
+            self._consume_stream()
+        else:
+            self._poll()
+
+    def _has_subscribers(self):
+        with self._lock:
+            if not self.clients:
+                self._running = False
+                return False
+            return True
+
+    def _poll(self):
+        while self._has_subscribers():
+            start = time.perf_counter()
+            try:
+                self._publish_snapshot()
+                self.metrics["polls"] += 1
+            except Exception as e:
+                self.metrics["errors"] += 1
+                logger.error(f"Error producing ESP snapshot: {e}")
+            self.metrics["last_poll_ms"] = round(
+                (time.perf_counter() - start) * 1000, 3
+            )
+            time.sleep(self.interval)
+
+    def _consume_stream(self):
+        last_id = None
+        while self._has_subscribers():
+            try:
+                if last_id is None:
+                    # Take the stream position before reading the hashes so no
+                    # update written in between is missed.
+                    last_id, _ = self.redis_dao.get_recent_updates(1)
+                    self._publish_snapshot()
+                last_id, updates = self.redis_dao.read_updates(
+                    last_id, block_ms=self.block_ms
+                )
+                self.metrics["stream_reads"] += 1
+                if updates:
+                    self.metrics["stream_updates"] += len(updates)
+                    self._publish(dict(updates))
+            except Exception as e:
+                self.metrics["errors"] += 1
+                logger.error(f"Error consuming ESP quote stream: {e}")
+                last_id = None
+                time.sleep(self.interval)
+
+    def _publish_snapshot(self):
+        all_rates = self.redis_dao.get_all_exchange_rates()
+        self._publish(all_rates)
+        self.metrics["last_snapshot_size"] = len(all_rates)
+
+    def _publish(self, rates):
+        with self._lock:
+            previous_version = self._version
+            changed = self._apply_snapshot(rates)
+            self._deliver(previous_version, changed)
+        self.metrics["last_delta_size"] = len(changed)
+
+    def _apply_snapshot(self, all_rates):
+        """
+        Version and encode every rate that changed. Returns (key, payload,
+        topic) in version order.
+        """
+        changed = []
+        for key, quote_data in all_rates.items():
+            fingerprint = (
+                (quote_data or {}).get("rate"),
+                (quote_data or {}).get("timestamp"),
+            )
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] == fingerprint:
+                continue
+            message = self.quote_message(key, quote_data)
+            if message is None:
+                continue
+            self._version += 1
+            message["version"] = self._version
+            payload = json.dumps(message)
+            topic = (message["symbol"], message["settlement"], message["provider"])
+            self._entries[key] = (self._version, fingerprint, payload, topic)
+            changed.append((key, payload, topic))
+        return changed
+
+    def _deliver(self, previous_version, changed):
+        # Clients that were current before this poll all get the same delta
+        # list. A client that has never had a snapshot (subscribed before the
+        # first poll) gets a full one; any other client that is behind gets
+        # every entry newer than its last-seen version. Clients with topic
+        # subscriptions only get entries on their topics.
+        everything = [(key, payload) for key, payload, _ in changed]
+        routed = None
+        for sender in self.clients.snapshot():
+            last_seen = self._client_versions.get(sender, 0)
+            if last_seen == 0:
+                self._send_full_snapshot(sender)
+                continue
+            subscribed = self.topics.is_subscribed(sender)
+            if last_seen == previous_version and not subscribed:
+                payloads = everything
+            elif last_seen == previous_version:
+                if routed is None:
+                    routed = self._route(changed)
+                payloads = routed.get(sender)
+            else:
+                payloads = [
+                    (key, payload)
+                    for key, (version, _, payload, topic) in self._entries.items()
+                    if version > last_seen
+                    and (not subscribed or self.topics.accepts(sender, *topic))
+                ]
+            if payloads:
+                sender.send_latest(payloads)
+            self._client_versions[sender] = self._version
+
+    def _route(self, changed):
+        """Group changed entries by the clients whose topics they match."""
+        routed = defaultdict(list)
+        for key, payload, topic in changed:
+            for sender in self.topics.match(*topic):
+                routed[sender].append((key, payload))
+        return routed
+
+    @staticmethod
+    def quote_message(key, quote_data):
+        """
+        Build the client quote message for one Redis rate, or None if the rate is unusable.
+        Key format: exchange_rate:quote_type:symbol:type:quantity:side:settlement:provider
+        """
+        if not quote_data or not quote_data.get("rate"):
+            return None
+        parts = key.split(":")
+        if len(parts) < 7:
+            return None
+        return {
+            "type": "quote",
+            "quote_type": parts[1],  # esp or rfs
+            "symbol": parts[2],
+            "rate_type": parts[3],  # SPOT, FORWARD, etc
+            "price": quote_data.get("rate"),
+            "side": parts[5],
+            "provider": parts[7] if len(parts) > 7 else "Unknown",
+            "quantity": parts[4],
+            "settlement": parts[6],
+            "timestamp": quote_data.get("timestamp"),
+            "source": "redis",
+        }
@@ -0,0 +1,291 @@
+import logging
+import threading
+import time
+import traceback
+
+logger = logging.getLogger(__name__)
+
+
+class EspSubscriptionManager:
+    """
+    Reference-counted ESP market data subscriptions on one FixConnection.
+
+    Every (symbol, settl_type, ndf) is subscribed at the venue at most once,
+    however many subscribers (WebSocket clients, API callers) ask for it.
+    Keys that are new within coalesce_delay seconds of each other are sent
+    together with request_esp_prices_batch, one message per (settl_type, ndf).
+
+    A batch Market Data Request has a single MDReqID, and unsubscribe (263=2)
+    cancels the whole request. A key whose last subscriber leaves is kept
+    "idle" until every key in its request is idle, and then the request is
+    cancelled. A subscriber who asks for an idle key gets it straight back
+    without a new request.
+
+    After a reconnect the venue has no subscriptions, so resubscribe_all()
+    requests every live key again. A request that fails is retried after
+    retry_delay seconds, doubling up to max_retry_delay while it keeps
+    failing.
+
+    Requests are sent without holding the lock, so subscribers on Flask
+    threads never wait on the FIX socket. Keys on their way out are
+    "requesting" until the MDReqID is recorded.
+    """
+
+    def __init__(
+        self, fix_connection, coalesce_delay=0.05, retry_delay=1.0, max_retry_delay=30.0
+    ):
+        self.fix_connection = fix_connection
+        self.coalesce_delay = coalesce_delay
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self._lock = threading.Lock()
+        # (symbol, settl_type, ndf) -> {"subscribers", "mdreq_id", "status", "since"}
+        self._subscriptions = {}
+        # MDReqID -> keys it covers that are still in the table
+        self._requests = {}
+        self._pending = set()
+        self._flush_timer = None
+        self._next_retry_delay = retry_delay
+        # Bumped by resubscribe_all; requests sent before that are discarded
+        self._session = 0
+        self.metrics = {
+            "subscribe_calls": 0,
+            "deduplicated": 0,
+            "requests_sent": 0,
+            "keys_requested": 0,
+            "unsubscribes_sent": 0,
+            "retries": 0,
+            "errors": 0,
+        }
+
+    def subscribe(self, subscriber, symbols, settl_types, ndf=False):
+        """
+        Add subscriber to every symbol/settl_type combination.
+
+        Returns:
+            The (symbol, settl_type, ndf) keys the subscriber now holds.
+        """
+        keys = [
+            (symbol, settl_type, bool(ndf))
+            for symbol in symbols
+            for settl_type in settl_types
+        ]
+        with self._lock:
+            self.metrics["subscribe_calls"] += 1
+            for key in keys:
+                entry = self._subscriptions.get(key)
+                if entry is None:
+                    entry = {
+                        "subscribers": set(),
+                        "mdreq_id": None,
+                        "status": "pending",
+                        "since": time.time(),
+                    }
+                    self._subscriptions[key] = entry
+                    self._pending.add(key)
+                else:
+                    self.metrics["deduplicated"] += 1
+                    if entry["status"] == "idle":
+                        entry["status"] = (
+                            "subscribed" if entry["mdreq_id"] else "requesting"
+                        )
+                entry["subscribers"].add(subscriber)
+            if self._pending:
+                self._schedule_flush()
+        return keys
+
+    def unsubscribe(self, subscriber, keys=None):
+        """
+        Release subscriber's interest in keys (all of its keys if None).
+        Requests whose keys have no subscribers left are cancelled.
+        """
+        to_cancel = []
+        with self._lock:
+            if keys is None:
+                keys = [
+                    key
+                    for key, entry in self._subscriptions.items()
+                    if subscriber in entry["subscribers"]
+                ]
+            for key in keys:
+                entry = self._subscriptions.get(key)
+                if entry is None or subscriber not in entry["subscribers"]:
+                    continue
+                entry["subscribers"].discard(subscriber)
+                if entry["subscribers"]:
+                    continue
+                if entry["status"] == "pending":
+                    # Never sent; nothing to cancel at the venue
+                    self._pending.discard(key)
+                    del self._subscriptions[key]
+                    continue
+                entry["status"] = "idle"
+                mdreq_id = entry["mdreq_id"]
+                if mdreq_id is None:
+                    # Request in flight; flush() cancels it if it is still idle
+                    continue
+                request_keys = self._requests.get(mdreq_id, ())
+                if all(
+                    self._subscriptions[k]["status"] == "idle" for k in request_keys
+                ):
+                    for k in request_keys:
+                        del self._subscriptions[k]
+                    del self._requests[mdreq_id]
+                    to_cancel.append(mdreq_id)
+
+        for mdreq_id in to_cancel:
+            self._cancel(mdreq_id)
+
+    def flush(self):
+        """Send every pending key now, coalesced into batch requests."""
+        with self._lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            session = self._session
+            groups = {}
+            for key in self._pending:
+                symbol, settl_type, ndf = key
+                self._subscriptions[key]["status"] = "requesting"
+                groups.setdefault((settl_type, ndf), []).append(symbol)
+            self._pending = set()
+
+        sent = []
+        failed = []
+        for (settl_type, ndf), symbols in groups.items():
+            symbols.sort()
+            request_keys = {(symbol, settl_type, ndf) for symbol in symbols}
+            try:
+                mdreq_id = self.fix_connection.request_esp_prices_batch(
+                    symbols=symbols, settl_types=[settl_type], ndf=ndf
+                )
+            except Exception as e:
+                self.metrics["errors"] += 1
+                logger.warning(
+                    f"Market data request for {symbols} {settl_type} failed, "
+                    f"will retry in {self._next_retry_delay:g}s: {e}"
+                )
+                failed.append(request_keys)
+                continue
+            sent.append((mdreq_id, request_keys))
+
+        to_cancel = []
+        with self._lock:
+            for mdreq_id, request_keys in sent:
+                self.metrics["requests_sent"] += 1
+                self.metrics["keys_requested"] += len(request_keys)
+                if session != self._session:
+                    # Sent on a session that has since been replaced
+                    self.fix_connection.market_data_requests.pop(mdreq_id, None)
+                    self._requeue(request_keys)
+                    self._schedule_flush()
+                    continue
+                self._requests[mdreq_id] = request_keys
+                idle = True
+                for key in request_keys:
+                    entry = self._subscriptions[key]
+                    entry["mdreq_id"] = mdreq_id
+                    if entry["status"] == "requesting":
+                        entry["status"] = "subscribed"
+                    idle = idle and entry["status"] == "idle"
+                if idle:
+                    # Every subscriber left while the request was in flight
+                    for key in request_keys:
+                        del self._subscriptions[key]
+                    del self._requests[mdreq_id]
+                    to_cancel.append(mdreq_id)
+            if failed:
+                for request_keys in failed:
+                    self._requeue(request_keys)
+                self.metrics["retries"] += 1
+                self._schedule_flush(self._next_retry_delay)
+                self._next_retry_delay = min(
+                    self._next_retry_delay * 2, self.max_retry_delay
+                )
+            elif sent:
+                self._next_retry_delay = self.retry_delay
+
+        for mdreq_id in to_cancel:
+            self._cancel(mdreq_id)
+
+    def resubscribe_all(self):
+        """Request every subscribed key again on a new FIX session."""
+        with self._lock:
+            self._session += 1
+            self._next_retry_delay = self.retry_delay
+            for mdreq_id, request_keys in self._requests.items():
+                self.fix_connection.market_data_requests.pop(mdreq_id, None)
+                for key in request_keys:
+                    entry = self._subscriptions[key]
+                    if entry["status"] == "idle":
+                        del self._subscriptions[key]
+                        continue
+                    entry["mdreq_id"] = None
+                    entry["status"] = "pending"
+                    self._pending.add(key)
+            self._requests = {}
+            logger.info(f"Resubscribing {len(self._pending)} ESP market data keys")
+        self.flush()
+
+    def subscriptions(self):
+        """Live subscription table, one row per (symbol, settl_type, ndf)."""
+        with self._lock:
+            return [
+                {
+                    "symbol": symbol,
+                    "settl_type": settl_type,
+                    "ndf": ndf,
+                    "subscribers": len(entry["subscribers"]),
+                    "mdreq_id": entry["mdreq_id"],
+                    "status": entry["status"],
+                    "since": entry["since"],
+                }
+                for (symbol, settl_type, ndf), entry in self._subscriptions.items()
+            ]
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self.metrics,
+                "keys": len(self._subscriptions),
+                "pending": len(self._pending),
+                "requests": len(self._requests),
+            }
+
+    def _cancel(self, mdreq_id):
+        try:
+            self.fix_connection.unsubscribe_esp_prices(mdreq_id)
+            self.metrics["unsubscribes_sent"] += 1
+        except Exception as e:
+            # The session is gone, and with it the subscription
+            self.metrics["errors"] += 1
+            logger.warning(f"Could not unsubscribe MDReqID {mdreq_id}: {e}")
+
+    def _requeue(self, keys):
+        # Caller holds self._lock. Keys nobody wants any more are dropped.
+        for key in keys:
+            entry = self._subscriptions.get(key)
+            if entry is None or entry["mdreq_id"] is not None:
+                continue
+            if not entry["subscribers"]:
+                del self._subscriptions[key]
+                continue
+            entry["status"] = "pending"
+            self._pending.add(key)
+
+    def _schedule_flush(self, delay=None):
+        # Caller holds self._lock
+        if self._flush_timer is not None:
+            return
+        try:
+            self._flush_timer = self.fix_connection.fix_engine.call_later(
+                self.coalesce_delay if delay is None else delay, self._on_flush_timer
+            )
+        except Exception:
+            logger.error("Stack Trace:")
+            logger.error(traceback.format_exc())
+
+    def _on_flush_timer(self):
+        with self._lock:
+            self._flush_timer = None
+        self.flush()
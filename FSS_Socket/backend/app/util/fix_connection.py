@@ -7,14 +7,23 @@ import logging
 import traceback
 import uuid
 from simplefix import FixMessage, FixParser
-from threading import Lock
-import select
-import pandas as pd
-from dateutil.relativedelta import relativedelta
+from threading import Lock, RLock
 
 # from sqlalchemy import create_engine
 # from app.dao.fix_execution_report_dao import FixExecutionReportDAO
 from app.dao.redis_dao import RedisDAO
+from app.util.business_calendar import get_calendar
+from app.util.fix_engine import FixEngine
+from app.util.fix_message_log import FixMessageLog
+from app.util.fix_records import (
+    MARKET_DATA_TAGS,
+    QUOTE_TAGS,
+    FixFields,
+    MarketDataRecord,
+    QuoteRecord,
+)
+from app.util.quote_book import QuoteBook
+from app.util.seq_num_store import SeqNumStore
 
 # Create an empty DataFrame
 
@@ -22,6 +31,31 @@ from app.dao.redis_dao import RedisDAO
 logger = logging.getLogger(__name__)
 
 
+def _with_seq_num(data: bytes, seq_num: int) -> bytes:
+    """
+    Return an encoded FIX message with MsgSeqNum (34) set to seq_num, and
+    BodyLength (9) and CheckSum (10) recomputed if that changed it.
+    """
+    start = data.find(b"\x0134=")
+    if start < 0:
+        return data
+    start += 4
+    end = data.index(b"\x01", start)
+    value = b"%d" % seq_num
+    if data[start:end] == value:
+        return data
+    begin_end = data.index(b"\x019=") + 1
+    body_start = data.index(b"\x01", begin_end) + 1
+    trailer = data.rindex(b"\x0110=") + 1
+    body = data[body_start:start] + value + data[end:trailer]
+    message = data[:begin_end] + b"9=%d\x01" % len(body) + body
+    return message + b"10=%03d\x01" % (sum(message) % 256)
+
+
+def _or_na(value):
+    return value if value is not None else "N/A"
+
+
 class FixConnection:
     def __init__(
         self,
@@ -40,6 +74,16 @@ class FixConnection:
         redis_db=0,
         redis_password=None,
         redis_ssl=False,
+        quote_ttl_seconds=600,
+        redis_stream_maxlen=None,
+        log_format="text",
+        log_rotation=None,
+        log_max_bytes=None,
+        log_backup_count=7,
+        seq_num_durability="fsync",
+        seq_num_recovery_gap=0,
+        fix_engine=None,
+        max_write_buffer=4 * 1024 * 1024,
     ):
         self.host = host
         self.port = port
@@ -58,9 +102,36 @@ class FixConnection:
         self.connected = False
         self.heartbeat_interval = 60  # Default heartbeat interval in seconds
         self.msg_seq_num_file = msg_seq_num_file
+        self.seq_num_store = SeqNumStore(
+            msg_seq_num_file,
+            durability=seq_num_durability,
+            recovery_gap=seq_num_recovery_gap,
+        )
         self.reconnect_lock = Lock()
+        # Serialises MsgSeqNum allocation and socket writes across the engine,
+        # Flask and reconnect threads. Reentrant: a ResendRequest resets the
+        # sequence number and sends a gap fill under it.
+        self._send_lock = RLock()
+        # Outbound bytes the socket has not taken yet, flushed by the engine
+        self._write_buffer = bytearray()
+        self._watching_writable = False
+        self.max_write_buffer = max_write_buffer
+        # Socket reads and heartbeat timers run on a FixEngine shared with
+        # the other sessions in this process
+        self.fix_engine = fix_engine or FixEngine.default()
+        self._heartbeat_timer = None
+        self._test_request_id = None
+        self._last_received = time.monotonic()
+        self._last_sent = time.monotonic()
+        self._logout_received = threading.Event()
         self.msg_id = self.load_last_seq_num()
-        self.createFixLog(log_file)
+        self.createFixLog(
+            log_file,
+            log_format=log_format,
+            rotation=log_rotation,
+            max_bytes=log_max_bytes,
+            backup_count=log_backup_count,
+        )
         self.on_price_update = None
         self.on_trade_pending = None
         self.on_trade_partial_fill = None
@@ -68,29 +139,8 @@ class FixConnection:
         self.on_trade_cancel = None
         self.on_trade_reject = None
         self.on_trade_expired = None
-        self.quotes_df = pd.DataFrame(
-            columns=[
-                "quote_req_id",
-                "quote_id",
-                "symbol",
-                "type",
-                "currency",
-                "provider",
-                "bid",
-                "ask",
-                "net_price",
-                "forward_price",
-                "spot_price",
-                "fwd_points",
-                "md_entry_type",
-                "order_qty",
-                "side",
-                "depth",
-                "timestamp",
-                "settlement_type",
-                "value_date",
-            ]
-        )
+        self.on_reconnect = None
+        self.quote_book = QuoteBook(ttl_seconds=quote_ttl_seconds)
         self.quote_requests: dict[str, FixMessage] = {}
         self.market_data_requests: dict[
             str, dict
@@ -107,29 +157,36 @@ class FixConnection:
                 db=redis_db,
                 password=redis_password,
                 ssl=redis_ssl,
+                write_behind=True,
+                stream_maxlen=redis_stream_maxlen,
             )
 
     def load_last_seq_num(self):
-        try:
-            with open(self.msg_seq_num_file, "r") as file:
-                return int(file.read().strip())
-        except FileNotFoundError:
-            with open(self.msg_seq_num_file, "w") as file:
-                file.write("1")
-            return 1
+        return self.seq_num_store.load()
 
     def save_last_seq_num(self):
-        with open(self.msg_seq_num_file, "w") as file:
-            file.write(str(self.msg_id))
+        self.seq_num_store.save(self.msg_id)
 
-    def createFixLog(self, log_file):
+    def createFixLog(
+        self, log_file, log_format="text", rotation=None, max_bytes=None, backup_count=7
+    ):
+        """
+        Start the buffered FIX message log. The file is cleared on start; see
+        FixMessageLog for the formats and rotation options.
+        """
+        self.fix_log = None
         if log_file is None:
             self.log_file = None
             return
         self.log_file = log_file
         try:
-            with open(self.log_file, "w"):
-                pass
+            self.fix_log = FixMessageLog(
+                log_file,
+                log_format=log_format,
+                rotation=rotation,
+                max_bytes=max_bytes,
+                backup_count=backup_count,
+            )
             logger.info(f"Log file '{self.log_file}' initialized and cleared.")
         except Exception as e:
             logger.error(f"Failed to initialize log file '{self.log_file}': {e}")
@@ -165,7 +222,9 @@ class FixConnection:
                 f"""Connected to FIX gateway at {self.host}:{self.port} using TLS"""
             )
 
-            threading.Thread(target=self.listen, daemon=True).start()
+            self._last_received = time.monotonic()
+            self._test_request_id = None
+            self.fix_engine.register(self, self.sock)
         except ssl.SSLError as e:
             logger.error(f"SSL error during connection: {e}")
             self.connected = False
@@ -174,18 +233,24 @@ class FixConnection:
             self.connected = False
 
     def disconnect(self):
-        # Proceed to close the socket
-        if self.sock:
-            try:
-                self.sock.shutdown(
-                    socket.SHUT_RDWR
-                )  # Disable further send and receive operations
-                self.sock.close()
-                logger.info("Socket successfully closed")
-            except Exception as e:
-                logger.error(f"Error closing socket: {e}")
-        self.sock = None
-        self.connected = False
+        with self._send_lock:
+            # Proceed to close the socket
+            if self.sock:
+                self.fix_engine.unregister(self.sock)
+                try:
+                    self.sock.shutdown(
+                        socket.SHUT_RDWR
+                    )  # Disable further send and receive operations
+                    self.sock.close()
+                    logger.info("Socket successfully closed")
+                except Exception as e:
+                    logger.error(f"Error closing socket: {e}")
+            self.sock = None
+            self.connected = False
+            self._write_buffer.clear()
+            self._watching_writable = False
+        if self.fix_log is not None:
+            self.fix_log.flush()
         logger.info("Disconnected from FIX gateway")
 
     def logout(self):
@@ -193,9 +258,18 @@ class FixConnection:
             try:
                 # Construct and send the Logout message
                 logout_message = self.create_logout_message()
+                self._logout_received.clear()
                 self.send(logout_message.encode().decode())
                 logger.info("Logout message sent")
 
+                # The confirmation is read on the engine thread, so a logout
+                # from an engine callback must not wait for it: that would
+                # stall every session the engine multiplexes. Check it from a
+                # timer instead.
+                if self.fix_engine.in_engine_thread():
+                    self.fix_engine.call_later(5, self._check_logout_confirmation)
+                    return
+
                 # Wait for a confirming Logout message from the counterparty
                 if self.wait_for_logout_confirmation(
                     timeout=5
@@ -209,113 +283,135 @@ class FixConnection:
             except Exception as e:
                 logger.error(f"Error during logout process: {e}")
 
+    def _check_logout_confirmation(self):
+        # Engine timer scheduled by a logout() issued on the engine thread
+        if self._logout_received.is_set():
+            logger.info("Logout confirmation received")
+        else:
+            logger.warning(
+                "No logout confirmation received; proceeding with disconnection"
+            )
+
     def wait_for_logout_confirmation(self, timeout=5):
         """
         Waits for a confirming Logout message from the counterparty within the specified timeout.
         Returns True if a Logout confirmation is received; False otherwise.
+        On the engine thread, which is the thread that would receive the
+        confirmation, it only checks whether one has already arrived.
         """
-        end_time = time.time() + timeout
-        while time.time() < end_time:
-            try:
-                # Check if there's data to read on the socket
-                ready_to_read, _, _ = select.select(
-                    [self.sock], [], [], end_time - time.time()
-                )
-                if ready_to_read:
-                    assert self.sock is not None
-                    try:
-                        data = self.sock.recv(4096)
-                    except Exception as e:
-                        logger.error(f"Error in recv: {e}")
-                        logger.error("Stack Trace:")
-                        logger.error(traceback.format_exc())
-                        data = None
-                    if data:
-                        self.parser.append_buffer(data)
-                        while True:
-                            message = self.parser.get_message()
-                            if message is None:
-                                break
-                            msg_type = message.get(35)
-                            if msg_type == b"5":  # Logout message
-                                logger.info(
-                                    "Received Logout confirmation from counterparty."
-                                )
-                                return True
-                            else:
-                                # Handle other message types as needed
-                                self.handle_message(message)
-            except Exception as e:
-                logger.error(f"Error while waiting for Logout confirmation: {e}")
-                logger.error("Stack Trace:")
-                logger.error(traceback.format_exc())
-                break
+        if self.fix_engine.in_engine_thread():
+            received = self._logout_received.is_set()
+        else:
+            received = self._logout_received.wait(timeout)
+        if received:
+            logger.info("Received Logout confirmation from counterparty.")
+            return True
         logger.warning("Timeout waiting for Logout confirmation.")
         return False
 
     def send(self, message):
+        """
+        Stamp message with the next MsgSeqNum and write it without blocking.
+        Whatever the socket cannot take now is buffered and written by the
+        engine as the socket drains, so no thread (the shared engine thread
+        included) ever waits on a slow counterparty.
+        """
         if not self.connected:
             raise ConnectionError("Not connected to FIX gateway")
 
-        self.msg_id += 1
-        logger.debug(f"Sending FIX Message: {message}")
-        self.log_fix_message("OUT", message)
+        with self._send_lock:
+            # Builders read msg_id before taking the lock; stamping here keeps
+            # numbers unique and in write order when threads race
+            data = _with_seq_num(message.encode(), self.msg_id)
+            self.msg_id += 1
+            logger.debug(f"Sending FIX Message: {data}")
+            self.log_fix_message("OUT", data.decode())
 
-        try:
-            assert self.sock is not None
+            try:
+                assert self.sock is not None
+                if len(self._write_buffer) + len(data) > self.max_write_buffer:
+                    raise ConnectionError(
+                        f"FIX write buffer full ({len(self._write_buffer)} bytes); "
+                        "counterparty is not reading"
+                    )
+                self._write_buffer += data
+                self._flush_writes()
+                self._last_sent = time.monotonic()
 
-            # [MOD] Use select to check writability before sending to avoid 10054 errors
-            _, writable, _ = select.select([], [self.sock], [], 0)
-            if self.sock in writable:
-                self.sock.sendall(message.encode())
-            else:
-                logger.warning("Socket not writable. Skipping send.")
+            except (ConnectionError, ssl.SSLError, socket.error) as e:
+                # [MOD] More specific error handling and logging
+                logger.error(f"Socket send error: {e}")
+                logger.error("Stack Trace:")
+                logger.error(traceback.format_exc())
                 self.connected = False
-                self.disconnect()
-                return
+                self.disconnect()  # [MOD] Ensure clean socket close
+                raise
 
-        except (ConnectionResetError, ssl.SSLError, socket.error) as e:
-            # [MOD] More specific error handling and logging
-            logger.error(f"Socket send error: {e}")
-            logger.error("Stack Trace:")
-            logger.error(traceback.format_exc())
-            self.connected = False
-            self.disconnect()  # [MOD] Ensure clean socket close
-            raise
-
-        except Exception as e:
-            logger.error(f"Unexpected error while sending: {e}")
-            logger.error("Stack Trace:")
-            logger.error(traceback.format_exc())
-            raise
-
-        self.save_last_seq_num()
-
-    def listen(self):
-        while self.connected:
-            try:
-                assert self.sock is not None
-                try:
-                    data = self.sock.recv(4096)
-                except Exception as e:
-                    logger.error(f"Error in recv: {e}")
-                    logger.error("Stack Trace:")
-                    logger.error(traceback.format_exc())
-                    data = None
-                if data:
-                    self.parser.append_buffer(data)
-                    while True:
-                        message = self.parser.get_message()
-                        if message is None:
-                            break
-                        logger.debug(f"Received FIX Message: {str(message)}")
-                        self.log_fix_message("IN", message)
-                        self.handle_message(message)
             except Exception as e:
-                logger.error(f"Error receiving FIX messages: {e}")
+                logger.error(f"Unexpected error while sending: {e}")
                 logger.error("Stack Trace:")
                 logger.error(traceback.format_exc())
-                # self.disconnect()
+                raise
+
+            self.save_last_seq_num()
+
+    def _flush_writes(self):
+        """
+        Write as much of the buffer as the socket takes without blocking, and
+        have the engine call back when it can take the rest. Caller holds
+        self._send_lock.
+        """
+        want_read = False
+        while self._write_buffer:
+            try:
+                sent = self.sock.send(self._write_buffer)
+            except ssl.SSLWantReadError:
+                # TLS has to read first; on_socket_data retries the write
+                want_read = True
+                break
+            except (ssl.SSLWantWriteError, BlockingIOError):
+                break
+            del self._write_buffer[:sent]
+        waiting = bool(self._write_buffer) and not want_read
+        if waiting != self._watching_writable:
+            self._watching_writable = waiting
+            self.fix_engine.watch_writable(self.sock, self, waiting)
+
+    def on_socket_writable(self):
+        """Called by the engine when the socket can take more buffered data."""
+        with self._send_lock:
+            if self.sock is None:
+                return
+            try:
+                self._flush_writes()
+                return
+            except (ssl.SSLError, socket.error) as e:
+                logger.error(f"Socket send error: {e}")
+                error = e
+        self.on_socket_closed(error)
+
+    def on_socket_data(self, data):
+        """Called by the engine with bytes received on this session's socket."""
+        if self._write_buffer:
+            self.on_socket_writable()
+        self._last_received = time.monotonic()
+        self._test_request_id = None
+        self.parser.append_buffer(data)
+        while True:
+            message = self.parser.get_message()
+            if message is None:
+                break
+            logger.debug(f"Received FIX Message: {str(message)}")
+            self.log_fix_message("IN", message)
+            if message.get(35) == b"5":
+                self._logout_received.set()
+            self.handle_message(message)
+
+    def on_socket_closed(self, error):
+        """Called by the engine when the socket fails or the gateway closes it."""
+        if error is None:
+            logger.warning("FIX gateway closed the connection")
+        self.disconnect()
 
     def handle_message(self, message: FixMessage):
         msg_type = message.get(35)  # Message Type
@@ -328,14 +424,15 @@ class FixConnection:
         elif msg_type == b"2":  # Resend Request
             new_seq_num = int(message.get(7) or 1)
 
-            if new_seq_num != 1:
-                self.msg_id = new_seq_num
-                self.send_gap_fill(new_seq_num, self.msg_id + 1)
-                logger.info(f"Sequence reset to {self.msg_id + 1}")
-            else:
-                self.msg_id = 1
-                logger.info("Sequence reset to 1")
-            self.save_last_seq_num()
+            with self._send_lock:
+                if new_seq_num != 1:
+                    self.msg_id = new_seq_num
+                    self.send_gap_fill(new_seq_num, self.msg_id + 1)
+                    logger.info(f"Sequence reset to {self.msg_id + 1}")
+                else:
+                    self.msg_id = 1
+                    logger.info("Sequence reset to 1")
+                self.save_last_seq_num()
 
         elif msg_type == b"3":
             self.handle_reject_message(message)
@@ -807,7 +904,7 @@ class FixConnection:
         try:
             if not self.connected:
                 logger.warning("Connection lost. Attempting to reconnect...")
-                self.reconnect()
+                self._reconnect_in_background()
                 return
 
             if not self.sock:
@@ -815,7 +912,7 @@ class FixConnection:
                     "Socket is None before sending heartbeat. Reconnecting..."
                 )
                 self.connected = False
-                self.reconnect()
+                self._reconnect_in_background()
                 return
 
             heartbeat_message = FixMessage()
@@ -838,7 +935,7 @@ class FixConnection:
             logger.error("Stack Trace:")
             logger.error(traceback.format_exc())
             self.connected = False
-            self.reconnect()
+            self._reconnect_in_background()
 
     def reconnect(self):
         logger.info("Attempting to reconnect to FIX gateway...")
@@ -848,6 +945,9 @@ class FixConnection:
             self.connect()
             if hasattr(self, "username") and hasattr(self, "password"):
                 self.logon(self.username, self.password)
+                if self.on_reconnect:
+                    # The new session has no market data subscriptions
+                    self.on_reconnect()
             else:
                 logger.warning("No stored credentials found for logon after reconnect.")
         except Exception as e:
@@ -856,22 +956,71 @@ class FixConnection:
             logger.error(traceback.format_exc())
 
     def start_heartbeat_thread(self):
-        if (
-            hasattr(self, "_heartbeat_thread_running")
-            and self._heartbeat_thread_running
-        ):
-            logger.warning("Heartbeat thread is already running.")
+        """
+        Start the heartbeat timer on the engine. Once a second it sends a
+        Heartbeat when nothing has been sent for heartbeat_interval, sends a
+        TestRequest when nothing has been received for heartbeat_interval
+        plus a grace period, and reconnects if the TestRequest goes unanswered.
+        """
+        if self._heartbeat_timer is not None:
+            self._heartbeat_timer.cancel()
+        self._heartbeat_timer = self.fix_engine.call_later(1, self._on_heartbeat_timer)
+
+    def _on_heartbeat_timer(self):
+        if not self.connected:
+            logger.warning("Connection lost. Attempting to reconnect...")
+            self._heartbeat_timer = None
+            self._reconnect_in_background()
             return
 
-        self._heartbeat_thread_running = True
+        now = time.monotonic()
+        silence = now - self._last_received
+        grace = max(1.0, self.heartbeat_interval * 0.2)
+        if self._test_request_id is not None:
+            if silence >= 2 * self.heartbeat_interval + grace:
+                logger.warning(
+                    f"No response to TestRequest {self._test_request_id}. Reconnecting..."
+                )
+                self._heartbeat_timer = None
+                self.connected = False
+                self._reconnect_in_background()
+                return
+        elif silence >= self.heartbeat_interval + grace:
+            self.send_test_request()
+
+        if now - self._last_sent >= self.heartbeat_interval:
+            self.send_heartbeat()
+        self._heartbeat_timer = self.fix_engine.call_later(1, self._on_heartbeat_timer)
 
-        def send_heartbeat_task():
-            while self.connected:
-                time.sleep(self.heartbeat_interval)
-                self.send_heartbeat()
-            self._heartbeat_thread_running = False
+    def send_test_request(self):
+        test_request_id = f"TEST_{int(time.time())}"
+        try:
+            test_request = FixMessage()
+            test_request.append_pair(8, "FIX.4.4")  # BeginString
+            test_request.append_pair(35, "1")  # MsgType: Test Request
+            test_request.append_pair(49, self.sender_comp_id)  # SenderCompID
+            test_request.append_pair(56, self.target_comp_id)  # TargetCompID
+            test_request.append_pair(34, str(self.msg_id))  # MsgSeqNum
+            test_request.append_pair(52, self.get_current_timestamp())  # SendingTime
+            test_request.append_pair(112, test_request_id)  # TestReqID
+            self.send(test_request.encode().decode())
+            self._test_request_id = test_request_id
+            logger.info(f"Sent TestRequest {test_request_id}")
+        except Exception as e:
+            logger.error(f"Error sending TestRequest: {e}")
 
-        threading.Thread(target=send_heartbeat_task, daemon=True).start()
+    def _reconnect_in_background(self):
+        """Reconnect on a worker thread so the shared engine thread never blocks."""
+        if not self.reconnect_lock.acquire(blocking=False):
+            return
+
+        def reconnect_task():
+            try:
+                self.reconnect()
+            finally:
+                self.reconnect_lock.release()
+
+        threading.Thread(target=reconnect_task, daemon=True).start()
 
     def process_quote_response(self, message):
         try:
@@ -885,6 +1034,7 @@ class FixConnection:
                     quote_req_id = message.get(131)
                     logger.info(f"Quote Response for {symbol}: Canceled")
                     self.quote_requests.pop(quote_req_id.decode())
+                    self.quote_book.evict_quote_req_id(quote_req_id.decode())
                 case b"5":
                     reason = message.get(300)  # RejectReason
                     text = message.get(58)  # Text
@@ -895,6 +1045,10 @@ class FixConnection:
                     )
                 case b"7":
                     logger.info("Quote Response: Expired")
+                    quote_req_id = message.get(131)
+                    if quote_req_id is not None:
+                        self.quote_requests.pop(quote_req_id.decode(), None)
+                        self.quote_book.evict_quote_req_id(quote_req_id.decode())
                 case _:
                     logger.warning(f"Unhandled Quote Response status: {status}")
         except Exception as e:
@@ -904,37 +1058,34 @@ class FixConnection:
 
     def process_quote(self, message: FixMessage):
         try:
-            quote_req_id = message.get(131)
+            fields = FixFields(message, QUOTE_TAGS)
+            quote_req_id = fields.get(131)
             if quote_req_id is None:
                 logger.warning("No QuoteReqID found in message")
                 return
-            request_message = self.quote_requests.get(quote_req_id.decode())
+            request_message = self.quote_requests.get(quote_req_id)
             if request_message is None:
-                logger.warning(f"No request message found for {quote_req_id.decode()}")
+                logger.warning(f"No request message found for {quote_req_id}")
                 return
-            # logger.info(f"[SPOT] Processing spot quote for {quote_req_id.decode()}")
-            symbol = message.get(55)  # Symbol
-            security_type = message.get(167)
-            settlement_field = message.get(63)
-            settlement = (
-                settlement_field.decode() if settlement_field is not None else None
-            )
-            # if message.get(9999)is none try to get from request message
-            settlement2 = (
-                message.get(9999)
-                if message.get(9999) is not None
-                else request_message.get(9999)
-            )
-            timestamp = message.get(52)  # SendingTime
-            currency = message.get(15)  # Currency
-            fixing_date = message.get(6203)
+            # logger.info(f"[SPOT] Processing spot quote for {quote_req_id}")
+            symbol = fields.get(55)  # Symbol
+            security_type = fields.get(167)
+            settlement = fields.get(63)
+            # if tag 9999 is not in the quote try to get it from the request message
+            settlement2 = fields.get(9999)
+            if settlement2 is None:
+                far_leg_field = request_message.get(9999)
+                settlement2 = (
+                    far_leg_field.decode() if far_leg_field is not None else None
+                )
+            timestamp = fields.get(52)  # SendingTime
+            currency = fields.get(15)  # Currency
             # Settlement type
             type = "SPOT"
-            if security_type == b"FXNDF":
+            if security_type == "FXNDF":
                 if settlement2:
                     type = "NDS"
-                    far_leg = settlement2.decode() if settlement2 is not None else ""
-                    settlement = f"{settlement}_{far_leg} "
+                    settlement = f"{settlement}_{settlement2} "
                 else:
                     type = "NDF"
 
@@ -942,132 +1093,96 @@ class FixConnection:
                 type = "SPOT"
             elif settlement2:
                 type = "SWAP"
-                far_leg = settlement2.decode() if settlement2 is not None else ""
-                settlement = f"{settlement}_{far_leg} "
+                settlement = f"{settlement}_{settlement2} "
             else:
                 type = "FORWARD"
 
-            num_entries_field = message.get(295)
+            # Header values shared by every entry of this message
+            symbol_value = _or_na(symbol)
+            currency_value = _or_na(currency)
+            settlement_value = _or_na(settlement)
+            redis_timestamp = None
+
+            num_entries_field = fields.get(295)
             num_entries = int(num_entries_field) if num_entries_field is not None else 0
             for i in range(1, num_entries + 1):
-                quote_id = message.get(299, i)  # QuoteID
-                provider = message.get(282, i)  # Provider
-                bid_price = message.get(132, i)  # BidPx
-                ask_price = message.get(133, i)  # AskPx
-                bid_size = message.get(134, i)  # BidSize
-                ask_size = message.get(135, i)  # AskSize
-                bid_spot = message.get(188, i)
-                offer_spot = message.get(190, i)
-                bid_fwd = message.get(189, i)
-                offer_fwd = message.get(191, i)
-                forward_price_bid = message.get(7576, i)  # ForwardPrice
-                forward_price_ask = message.get(7577, i)  # ForwardPrice
-                forward_price = (
-                    forward_price_bid if forward_price_bid else forward_price_ask
-                )
-                spot_rate = message.get(190, i)
-                if type == "NDS":
-                    forward_price = bid_spot if bid_spot else offer_spot
-                    spot_rate = bid_price if bid_price else ask_price
-
-
-                side = message.get(54, i)  # Side
-                md_entry_type = message.get(269, i)
-
-                depth = message.get(268, i)
-                net_price = message.get(631, i)  # NetPrice
-                value_date = message.get(64, i)  # SettlDate
-
-                fwd_points = message.get(191, i)
+                md_entry_type = fields.get(269, i)
                 # [MOD] Filter only valid MDEntryTypes (0 = Bid, 1 = Offer)
-                if md_entry_type is None or md_entry_type.decode() not in (
-                    "0",
-                    "1",
-                    "H",
-                ):
+                if md_entry_type is None or md_entry_type not in ("0", "1", "H"):
                     logger.warning(f"Invalid MDEntryType: {md_entry_type}")
                     continue
 
-                entry_type = (
-                    md_entry_type.decode() if md_entry_type is not None else "Unknown"
+                bid_price = fields.get(132, i)  # BidPx
+                ask_price = fields.get(133, i)  # AskPx
+                bid_size = fields.get(134, i)  # BidSize
+                ask_size = fields.get(135, i)  # AskSize
+                forward_price_bid = fields.get(7576, i)  # ForwardPrice
+                forward_price = (
+                    forward_price_bid if forward_price_bid else fields.get(7577, i)
                 )
-                is_bid = side.decode() != "1" if side is not None else False
+                offer_spot = fields.get(190, i)
+                spot_rate = offer_spot
+                if type == "NDS":
+                    bid_spot = fields.get(188, i)
+                    forward_price = bid_spot if bid_spot else offer_spot
+                    spot_rate = bid_price if bid_price else ask_price
+                provider = fields.get(282, i)  # Provider
+                side = fields.get(54, i)  # Side
                 order_qty = (
                     bid_size if bid_size else ask_size
                 )  # bid or ask size is the quantity
-                self.update_quotes_df(
-                    symbol.decode() if symbol is not None else "N/A",
-                    type,
-                    (currency.decode() if currency is not None else "N/A"),
-                    (provider.decode() if provider is not None else "N/A"),
-                    (quote_req_id.decode() if quote_req_id is not None else "N/A"),
-                    (bid_price.decode() if bid_price is not None else "N/A"),
-                    (ask_price.decode() if ask_price is not None else "N/A"),
-                    (net_price.decode() if net_price is not None else "N/A"),
-                    (forward_price.decode() if forward_price is not None else "N/A"),
-                    (spot_rate.decode() if spot_rate is not None else "N/A"),
-                    (fwd_points.decode() if fwd_points is not None else "N/A"),
-                    (order_qty.decode() if order_qty is not None else "N/A"),
-                    (settlement if settlement is not None else "N/A"),
-                    side.decode() if side is not None else "N/A",
-                    entry_type,
-                    depth.decode() if depth is not None else "N/A",
-                    (timestamp.decode() if timestamp is not None else None),
-                    (quote_id.decode() if quote_id is not None else "N/A"),
-                    (value_date.decode() if value_date is not None else "N/A"),
+                fwd_points = fields.get(191, i)
+                price = bid_price if bid_price else (ask_price if ask_price else "N/A")
+
+                record = QuoteRecord(
+                    symbol=symbol_value,
+                    type=type,
+                    currency=currency_value,
+                    provider=_or_na(provider),
+                    quote_req_id=quote_req_id,
+                    bid=_or_na(bid_price),
+                    ask=_or_na(ask_price),
+                    net_price=_or_na(fields.get(631, i)),  # NetPrice
+                    forward_price=_or_na(forward_price),
+                    spot_price=_or_na(spot_rate),
+                    fwd_points=_or_na(fwd_points),
+                    order_qty=_or_na(order_qty),
+                    settlement_type=settlement_value,
+                    side=_or_na(side),
+                    md_entry_type=md_entry_type,
+                    depth=_or_na(fields.get(268, i)),
+                    timestamp=timestamp,
+                    quote_id=_or_na(fields.get(299, i)),  # QuoteID
+                    value_date=_or_na(fields.get(64, i)),  # SettlDate
+                    is_bid=side != "1" if side is not None else False,
+                    rate=f"{price}_{forward_price}" if forward_price else price,
                 )
+                args = record.as_args()
+                self.update_quotes_df(*args)
                 # Only save to Redis if we have valid data
                 if (
                     symbol is not None
                     and provider is not None
                     and timestamp is not None
                 ):
+                    if redis_timestamp is None:
+                        redis_timestamp = datetime.strptime(
+                            timestamp, "%Y%m%d-%H:%M:%S.%f"
+                        ).strftime("%Y-%m-%d %H-%M-%S")
                     self.redis_dao.save_exchange_rate(
-                        symbol=symbol.decode(),
-                        type=type,
-                        quantity=order_qty.decode() if order_qty is not None else "N/A",
-                        side="Bid" if is_bid else "Ask",
-                        settlement=settlement if settlement is not None else "N/A",
-                        provider=provider.decode(),
-                        timestamp=datetime.strptime(
-                            timestamp.decode(), "%Y%m%d-%H:%M:%S.%f"
-                        ).strftime("%Y-%m-%d %H-%M-%S"),
-                        exchange_rate=(
-                            f"{bid_price.decode() if bid_price else (ask_price.decode() if ask_price else 'N/A')}_{forward_price.decode()}"
-                            if forward_price
-                            else (
-                                bid_price.decode()
-                                if bid_price
-                                else (ask_price.decode() if ask_price else "N/A")
-                            )
-                        ),
+                        symbol=record.symbol,
+                        type=record.type,
+                        quantity=record.order_qty,
+                        side="Bid" if record.is_bid else "Ask",
+                        settlement=record.settlement_type,
+                        provider=record.provider,
+                        timestamp=redis_timestamp,
+                        exchange_rate=record.rate,
                     )
                 if callable(self.on_price_update):
-                    self.on_price_update(
-                        (symbol.decode() if symbol is not None else "N/A"),
-                        type,
-                        (currency.decode() if currency is not None else "N/A"),
-                        (provider.decode() if provider is not None else "N/A"),
-                        (quote_req_id.decode() if quote_req_id is not None else "N/A"),
-                        (bid_price.decode() if bid_price is not None else "N/A"),
-                        (ask_price.decode() if ask_price is not None else "N/A"),
-                        (net_price.decode() if net_price is not None else "N/A"),
-                        (
-                            forward_price.decode()
-                            if forward_price is not None
-                            else "N/A"
-                        ),
-                        (spot_rate.decode() if spot_rate is not None else "N/A"),
-                        (fwd_points.decode() if fwd_points is not None else "N/A"),
-                        (order_qty.decode() if order_qty is not None else "N/A"),
-                        (settlement if settlement is not None else "N/A"),
-                        side.decode() if side is not None else "N/A",
-                        entry_type,
-                        depth.decode() if depth is not None else "N/A",
-                        (timestamp.decode() if timestamp is not None else None),
-                        (quote_id.decode() if quote_id is not None else "N/A"),
-                        (value_date.decode() if value_date is not None else "N/A"),
-                    )
+                    self.on_price_update(*args)
+            # Push this message's rates to Redis in one pipeline off the listener thread
+            self.redis_dao.schedule_flush()
 
         except Exception as e:
             logger.error(f"Error processing Quote: {e}")
@@ -1075,33 +1190,22 @@ class FixConnection:
             logger.error(traceback.format_exc())
 
     def log_fix_message(self, direction, message):
-        """Log the given FIX message to a file."""
-        if self.log_file is None:
+        """Queue the given FIX message for the background log writer."""
+        if self.fix_log is None:
             return
-        try:
-            with open(self.log_file, "a") as log_file:
-                log_file.write(
-                    f"{time.strftime('%Y-%m-%d %H:%M:%S')} - {direction} - {message}\n"
-                )
-        except Exception as e:
-            logger.error(f"Error logging FIX message: {e}")
+        self.fix_log.write(direction, message)
 
-    def calculate_near_settl_date(self, settl_type: str, spot_lag_days: int = 2) -> str:
-        today = datetime.today()
-        spot_date = today + timedelta(days=spot_lag_days)
-
-        if settl_type == "SP":
-            return spot_date.strftime("%Y%m%d")
-
-        if settl_type.startswith("M"):
-            try:
-                months = int(settl_type[1:])
-                near_date = spot_date + relativedelta(months=months)
-                return near_date.strftime("%Y%m%d")
-            except ValueError:
-                raise ValueError(f"Invalid month-based SettlType: {settl_type}")
-
-        raise ValueError(f"Unsupported SettlType for date calculation: {settl_type}")
+    def calculate_near_settl_date(
+        self, settl_type: str, spot_lag_days: int = 2, symbol: str = None
+    ) -> str:
+        """Value date (YYYYMMDD) of a SettlType tenor, on symbol's business calendar."""
+        try:
+            value_date = get_calendar(symbol).tenor_date(
+                settl_type, datetime.today(), spot_lag=spot_lag_days
+            )
+        except ValueError:
+            raise ValueError(f"Unsupported SettlType for date calculation: {settl_type}")
+        return value_date.strftime("%Y%m%d")
 
     def request_quote(
         self,
@@ -1155,7 +1259,7 @@ class FixConnection:
                 quote_request.append_pair(448, "UBS")  # PartyID
                 quote_request.append_pair(447, "D")  # PartyIDSource
                 quote_request.append_pair(452, "35")  # PartyRole
-                near_settl_date = self.calculate_near_settl_date(settl_type)
+                near_settl_date = self.calculate_near_settl_date(settl_type, symbol=symbol)
                 quote_request.append_pair(6203, near_settl_date)
             # Send the message
             self.send(quote_request.encode().decode())
@@ -1283,7 +1387,11 @@ class FixConnection:
                         fifteenth_next_month = first_day_next_month.replace(day=15)
 
                         # Format as YYYYMMDD for FIX protocol
-                        settl_date = fifteenth_next_month.strftime("%Y%m%d")
+                        settl_date = (
+                            get_calendar(symbol)
+                            .modified_following(fifteenth_next_month)
+                            .strftime("%Y%m%d")
+                        )
 
                         # Append SettlDate (64) only if SettlType is "B"
                         market_data_request.append_pair(64, settl_date)
@@ -1368,7 +1476,11 @@ class FixConnection:
                         today = datetime.today()
                         first_day_next_month = today.replace(day=1) + timedelta(days=32)
                         fifteenth_next_month = first_day_next_month.replace(day=15)
-                        settl_date = fifteenth_next_month.strftime("%Y%m%d")
+                        settl_date = (
+                            get_calendar(symbol)
+                            .modified_following(fifteenth_next_month)
+                            .strftime("%Y%m%d")
+                        )
                         market_data_request.append_pair(64, settl_date)  # SettlDate
 
             # Store batch request details for later lookup
@@ -1395,81 +1507,127 @@ class FixConnection:
             logger.error(traceback.format_exc())
             raise
 
+    def unsubscribe_esp_prices(self, mdreq_id):
+        """
+        Cancel a Market Data Request sent by request_esp_prices or
+        request_esp_prices_batch (SubscriptionRequestType 263=2).
+
+        The cancel repeats the MDReqID and instruments of the original
+        request, and the request is forgotten once it has been sent.
+        """
+        if not self.connected:
+            raise ConnectionError("Not connected to FIX gateway")
+        request_details = self.market_data_requests.get(mdreq_id)
+        if request_details is None:
+            logger.warning(f"Unsubscribe for unknown MDReqID {mdreq_id}")
+            return
+        if request_details.get("batch", False):
+            instruments = [
+                (symbol, settl_type)
+                for symbol in request_details["symbols"]
+                for settl_type in request_details["settl_types"]
+            ]
+        else:
+            instruments = [(request_details["symbol"], request_details["settl_type"])]
+
+        try:
+            market_data_request = FixMessage()
+            market_data_request.append_pair(8, "FIX.4.4")  # BeginString
+            market_data_request.append_pair(35, "V")  # MsgType: Market Data Request
+            market_data_request.append_pair(49, self.sender_comp_id)  # SenderCompID
+            market_data_request.append_pair(56, self.target_comp_id)  # TargetCompID
+            market_data_request.append_pair(34, str(self.msg_id))  # MsgSeqNum
+            market_data_request.append_pair(
+                52, self.get_current_timestamp()
+            )  # SendingTime
+            market_data_request.append_pair(262, mdreq_id)  # MDReqID
+            market_data_request.append_pair(
+                263, "2"
+            )  # SubscriptionRequestType = 2 (disable previous snapshot + updates)
+            market_data_request.append_pair(264, "10")
+            market_data_request.append_pair(146, str(len(instruments)))  # NoRelatedSym
+            for symbol, settl_type in instruments:
+                market_data_request.append_pair(55, symbol)  # Symbol
+                market_data_request.append_pair(63, settl_type)  # SettlType
+                if request_details["ndf"]:
+                    market_data_request.append_pair(167, "FXNDF")
+
+            self.send(market_data_request.encode().decode())
+            self.market_data_requests.pop(mdreq_id, None)
+            logger.info(
+                f"Market Data Unsubscribe sent for MDReqID {mdreq_id} "
+                f"({len(instruments)} instruments)"
+            )
+        except Exception as e:
+            logger.error(f"Error sending Market Data Unsubscribe: {e}")
+            logger.error("Stack Trace:")
+            logger.error(traceback.format_exc())
+            raise
+
     def process_market_data_snapshot(self, message):
         """
         Process the Market Data Snapshot/Update message and send updates to WebSocket clients.
         """
         try:
-            symbol = message.get(55).decode() if message.get(55) is not None else None
+            fields = FixFields(message, MARKET_DATA_TAGS)
+            symbol = fields.get(55)
             if symbol is None:
                 return  # Symbol
-            settlement_type = (
-                message.get(64).decode() if message.get(64) else None
-            )  # Settlement type
-            number_of_entries = int(message.get(268).decode())  # Number of entries
+            settlement_type = fields.get(64) or None  # Settlement type
+            number_of_entries = int(fields.get(268))  # Number of entries
+            # Entries of one snapshot usually share a timestamp; format it once
+            last_time_stamp = None
+            redis_timestamp = None
             for i in range(1, number_of_entries + 1):
-                quote_id = (
-                    message.get(278, i).decode() if message.get(278, i) else None
-                )  # MDEntryID
-                entry_type = (
-                    message.get(269, i).decode() if message.get(269, i) else None
-                )  # MDEntryType
-                price = (
-                    message.get(270, i).decode() if message.get(270, i) else None
-                )  # Bid price
-                quantity = (
-                    message.get(271, i).decode() if message.get(271, i) else None
-                )  # Ask price
-                time_stamp = (
-                    message.get(273, i).decode() if message.get(273, i) else None
-                )  # TimeStamp
-                originator = (
-                    message.get(282, i).decode() if message.get(282, i) else None
-                )  # Originator
-                sec_type = (
-                    message.get(167, i).decode() if message.get(167, i) else None
-                )  # NDF
-                logger.debug(
-                    f"Market Data Snapshot for {symbol}: EntryType={entry_type}, Price={price}, Quantity={quantity}, TimeStamp={time_stamp}, Originator={originator}"
-                )
+                sec_type = fields.get(167, i) or None  # NDF
                 if sec_type == "FXNDF":
                     type = "NDF"
                 elif settlement_type in ("SP", "0", "1", "2"):
                     type = "SPOT"
                 else:
                     type = "FORWARD"
+                record = MarketDataRecord(
+                    quote_id=fields.get(278, i) or None,  # MDEntryID
+                    symbol=symbol,
+                    settlement_type=settlement_type,
+                    entry_type=fields.get(269, i) or None,  # MDEntryType
+                    price=fields.get(270, i) or None,  # Bid price
+                    quantity=fields.get(271, i) or None,  # Ask price
+                    time_stamp=fields.get(273, i) or None,  # TimeStamp
+                    originator=fields.get(282, i) or None,  # Originator
+                    type=type,
+                )
+                logger.debug(
+                    f"Market Data Snapshot for {symbol}: EntryType={record.entry_type}, Price={record.price}, Quantity={record.quantity}, TimeStamp={record.time_stamp}, Originator={record.originator}"
+                )
                 # check if all the fields are not None
                 if (
                     symbol
-                    and entry_type
-                    and price
-                    and quantity
-                    and time_stamp
-                    and originator
+                    and record.entry_type
+                    and record.price
+                    and record.quantity
+                    and record.time_stamp
+                    and record.originator
                 ):
+                    if record.time_stamp != last_time_stamp:
+                        last_time_stamp = record.time_stamp
+                        redis_timestamp = datetime.utcfromtimestamp(
+                            int(record.time_stamp) / 1_000_000
+                        ).strftime("%Y-%m-%d %H-%M-%S")
                     self.redis_dao.save_exchange_rate(
                         symbol=symbol,
                         type=type,
-                        quantity=quantity,
-                        side="Bid" if entry_type == "0" else "Ask",
+                        quantity=record.quantity,
+                        side="Bid" if record.entry_type == "0" else "Ask",
                         settlement=settlement_type,
-                        provider=originator,
-                        timestamp=datetime.utcfromtimestamp(
-                            int(time_stamp) / 1_000_000
-                        ).strftime("%Y-%m-%d %H-%M-%S"),
-                        exchange_rate=price,
+                        provider=record.originator,
+                        timestamp=redis_timestamp,
+                        exchange_rate=record.price,
                     )
                 if callable(self.on_price_update):
-                    self.on_price_update(
-                        quote_id,
-                        symbol,
-                        settlement_type,
-                        entry_type,
-                        price,
-                        quantity,
-                        time_stamp,
-                        originator,
-                    )
+                    self.on_price_update(*record.as_args())
+            # Push this message's rates to Redis in one pipeline off the listener thread
+            self.redis_dao.schedule_flush()
 
         except Exception as e:
             logger.error(f"Error processing Market Data Snapshot: {e}")
@@ -1508,7 +1666,7 @@ class FixConnection:
         value_date=None,
     ):
         """
-        Update the quotes DataFrame with a new or updated quote.
+        Update the quote book with a new or updated quote.
         """
         timestamp = timestamp or datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
         new_row = {
@@ -1532,34 +1690,20 @@ class FixConnection:
             "settlement_type": settlement_type,  # Default value
             "value_date": value_date,  # Default value is None
         }
-        # Ensure the DataFrame columns match the keys in `new_row`
-        assert set(new_row.keys()) == set(self.quotes_df.columns), (
-            f"Keys in new_row ({new_row.keys()}) do not match DataFrame columns ({self.quotes_df.columns})."
-        )
+        self.quote_book.upsert(new_row)
 
-        # Update if exists, else append
-        condition = (
-            (self.quotes_df["symbol"] == symbol)
-            & (self.quotes_df["type"] == type)
-            & (self.quotes_df["provider"] == provider)
-            & (self.quotes_df["quote_req_id"] == quote_req_id)
-            & (self.quotes_df["side"] == side)
-            & (self.quotes_df["order_qty"] == order_qty)
-        )
-        if condition.any():
-            for key, value in new_row.items():
-                self.quotes_df.loc[condition, key] = value
-        else:
-            self.quotes_df = pd.concat(
-                [self.quotes_df, pd.DataFrame([new_row])],
-                ignore_index=True,
-            )
+    @property
+    def quotes_df(self):
+        """
+        DataFrame view of the whole quote book, built on demand.
+        """
+        return self.quote_book.to_dataframe()
 
     def get_quotes_df(self, symbol):
         """
-        Return the quotes DataFrame.
+        Return the quotes for a symbol as a DataFrame.
         """
-        return self.quotes_df[self.quotes_df["symbol"] == symbol]
+        return self.quote_book.to_dataframe(symbol)
 
     def request_esp_trade(
         self,
@@ -1654,7 +1798,7 @@ class FixConnection:
             if type in ["NDF"]:
                 new_order.append_pair(167, "FXNDF")  # SecurityType for NDF
                 new_order.append_pair(190, price)
-                near_settl_date = self.calculate_near_settl_date(settl_type)
+                near_settl_date = self.calculate_near_settl_date(settl_type, symbol=symbol)
                 new_order.append_pair(6203, near_settl_date)
             else:
                 # new_order.append_pair(11, cl_ord_id)  # ClOrdID
@@ -0,0 +1,243 @@
+import heapq
+import itertools
+import logging
+import selectors
+import socket
+import ssl
+import threading
+import time
+import traceback
+
+logger = logging.getLogger(__name__)
+
+
+class FixTimer:
+    """Handle returned by FixEngine.call_later; cancel() stops it from firing."""
+
+    __slots__ = ("deadline", "callback", "cancelled")
+
+    def __init__(self, deadline, callback):
+        self.deadline = deadline
+        self.callback = callback
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class FixEngine:
+    """
+    Runs every FIX session's socket reads and timers on one thread.
+
+    Sessions register their connected socket; the engine waits on all of them
+    with a selector and calls session.on_socket_data(data) with whatever
+    arrived, reading up to recv_buffer_size bytes at a time until the socket
+    (and any TLS-buffered plaintext) is drained. Timers scheduled with
+    call_later run on the same thread between socket events, so heartbeats
+    and TestRequests need no threads of their own.
+
+    Callbacks run on the engine thread and must not block; anything slow
+    (reconnecting, logging on) should be handed to a worker thread. Sessions
+    never block on writes either: what a socket cannot take at once stays in
+    the session's write buffer, and watch_writable() has the engine call
+    session.on_socket_writable() once the socket can take more. Callbacks
+    slower than slow_callback_s are logged and counted.
+    """
+
+    _default = None
+    _default_lock = threading.Lock()
+
+    def __init__(self, recv_buffer_size=262144, slow_callback_s=0.1):
+        self.recv_buffer_size = recv_buffer_size
+        self.slow_callback_s = slow_callback_s
+        self._selector = selectors.DefaultSelector()
+        self._lock = threading.Lock()
+        self._timers = []
+        self._timer_seq = itertools.count()
+        self._wakeup_recv, self._wakeup_send = socket.socketpair()
+        self._wakeup_recv.setblocking(False)
+        self._wakeup_send.setblocking(False)
+        self._selector.register(self._wakeup_recv, selectors.EVENT_READ, None)
+        self._thread = None
+        self.metrics = {
+            "sessions": 0,
+            "reads": 0,
+            "bytes_read": 0,
+            "timers_fired": 0,
+            "writable_events": 0,
+            "slow_callbacks": 0,
+            "errors": 0,
+        }
+
+    @classmethod
+    def default(cls):
+        """Process-wide engine shared by every FixConnection that is not given one."""
+        with cls._default_lock:
+            if cls._default is None:
+                cls._default = cls()
+            return cls._default
+
+    def register(self, session, sock):
+        """Start delivering data from sock to session.on_socket_data()."""
+        sock.setblocking(False)
+        with self._lock:
+            self._selector.register(sock, selectors.EVENT_READ, session)
+            self.metrics["sessions"] += 1
+            self._ensure_running()
+        self._wakeup()
+
+    def unregister(self, sock):
+        """Stop watching sock. Must be called before the socket is closed."""
+        with self._lock:
+            try:
+                self._selector.unregister(sock)
+                self.metrics["sessions"] -= 1
+            except (KeyError, ValueError):
+                return
+        self._wakeup()
+
+    def watch_writable(self, sock, session, enabled):
+        """
+        Start (or stop) calling session.on_socket_writable() whenever sock
+        can take more data, in addition to delivering its reads.
+        """
+        events = selectors.EVENT_READ
+        if enabled:
+            events |= selectors.EVENT_WRITE
+        with self._lock:
+            try:
+                self._selector.modify(sock, events, session)
+            except (KeyError, ValueError):
+                return
+        self._wakeup()
+
+    def call_later(self, delay, callback):
+        """Run callback() on the engine thread after delay seconds."""
+        timer = FixTimer(time.monotonic() + delay, callback)
+        with self._lock:
+            heapq.heappush(self._timers, (timer.deadline, next(self._timer_seq), timer))
+            self._ensure_running()
+        self._wakeup()
+        return timer
+
+    def in_engine_thread(self):
+        return threading.current_thread() is self._thread
+
+    def stats(self):
+        with self._lock:
+            return {**self.metrics, "timers": len(self._timers)}
+
+    def _ensure_running(self):
+        # Caller holds self._lock
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(
+                target=self._run, name="fix-engine", daemon=True
+            )
+            self._thread.start()
+
+    def _wakeup(self):
+        if self.in_engine_thread():
+            return
+        try:
+            self._wakeup_send.send(b"\0")
+        except BlockingIOError:
+            # Buffer full: a wakeup is already pending
+            pass
+        except OSError:
+            pass
+
+    def _next_timeout(self):
+        with self._lock:
+            while self._timers and self._timers[0][2].cancelled:
+                heapq.heappop(self._timers)
+            if not self._timers:
+                return None
+            return max(0.0, self._timers[0][0] - time.monotonic())
+
+    def _run(self):
+        while True:
+            try:
+                events = self._selector.select(self._next_timeout())
+            except (OSError, ValueError) as e:
+                # A socket was closed while being waited on; the owner
+                # unregisters it, so just wait again.
+                logger.debug(f"FIX engine select interrupted: {e}")
+                time.sleep(0.01)
+                continue
+            for key, mask in events:
+                if key.data is None:
+                    self._drain_wakeup()
+                    continue
+                if mask & selectors.EVENT_READ:
+                    self._read(key.fileobj, key.data)
+                if mask & selectors.EVENT_WRITE and self._registered(key.fileobj):
+                    self.metrics["writable_events"] += 1
+                    self._dispatch(key.data.on_socket_writable)
+            self._run_due_timers()
+
+    def _registered(self, sock):
+        with self._lock:
+            try:
+                self._selector.get_key(sock)
+                return True
+            except (KeyError, ValueError):
+                return False
+
+    def _drain_wakeup(self):
+        try:
+            while self._wakeup_recv.recv(4096):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
+
+    def _read(self, sock, session):
+        while True:
+            try:
+                data = sock.recv(self.recv_buffer_size)
+            except (ssl.SSLWantReadError, ssl.SSLWantWriteError, BlockingIOError):
+                return
+            except Exception as e:
+                self.metrics["errors"] += 1
+                logger.error(f"Error in recv: {e}")
+                self.unregister(sock)
+                self._dispatch(session.on_socket_closed, e)
+                return
+            if not data:
+                self.unregister(sock)
+                self._dispatch(session.on_socket_closed, None)
+                return
+            self.metrics["reads"] += 1
+            self.metrics["bytes_read"] += len(data)
+            self._dispatch(session.on_socket_data, data)
+            # TLS may hold decrypted bytes the selector cannot see
+            pending = getattr(sock, "pending", None)
+            if pending is None or pending() == 0:
+                return
+
+    def _run_due_timers(self):
+        now = time.monotonic()
+        due = []
+        with self._lock:
+            while self._timers and self._timers[0][0] <= now:
+                due.append(heapq.heappop(self._timers)[2])
+        for timer in due:
+            if not timer.cancelled:
+                self.metrics["timers_fired"] += 1
+                self._dispatch(timer.callback)
+
+    def _dispatch(self, callback, *args):
+        start = time.monotonic()
+        try:
+            callback(*args)
+        except Exception as e:
+            self.metrics["errors"] += 1
+            logger.error(f"Error in FIX engine callback: {e}")
+            logger.error("Stack Trace:")
+            logger.error(traceback.format_exc())
+        elapsed = time.monotonic() - start
+        if elapsed >= self.slow_callback_s:
+            self.metrics["slow_callbacks"] += 1
+            logger.warning(
+                f"FIX engine callback {getattr(callback, '__qualname__', callback)} "
+                f"took {elapsed * 1000:.0f} ms; every session waited for it"
+            )
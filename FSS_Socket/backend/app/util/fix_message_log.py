@@ -0,0 +1,236 @@
+import atexit
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from datetime import date
+
+from simplefix import FixParser
+
+logger = logging.getLogger(__name__)
+
+LOG_FORMATS = ("text", "raw")
+
+
+class FixMessageLog:
+    """
+    Buffered FIX message audit log written by a background thread.
+
+    write() only appends (timestamp, direction, message) to an in-memory ring
+    buffer. It never touches the file, so logging cannot block the FIX
+    listener. A writer thread formats and writes the buffered messages when
+    flush_records of them are waiting or every flush_interval seconds,
+    whichever comes first. When the buffer is full the oldest message is
+    dropped and counted.
+
+    Formats:
+        text: "YYYY-mm-dd HH:MM:SS - IN - 8=FIX.4.4|9=...|" (human-readable)
+        raw:  "<epoch seconds> IN <wire FIX message>", one message per line,
+              replayable with read_fix_log()
+
+    Rotation:
+        rotation="daily" renames the file to <path>.YYYY-MM-DD when the
+        date changes. max_bytes renames it to <path>.1 (shifting older
+        files up) once it reaches that size. At most backup_count rotated
+        files are kept for each scheme.
+    """
+
+    def __init__(
+        self,
+        path,
+        log_format="text",
+        max_buffer=100000,
+        flush_records=1000,
+        flush_interval=1.0,
+        rotation=None,
+        max_bytes=None,
+        backup_count=7,
+    ):
+        if log_format not in LOG_FORMATS:
+            raise ValueError(f"Unknown FIX log format: {log_format}")
+        if rotation not in (None, "daily"):
+            raise ValueError(f"Unknown FIX log rotation: {rotation}")
+        self.path = path
+        self.log_format = log_format
+        self.max_buffer = max_buffer
+        self.flush_records = flush_records
+        self.flush_interval = flush_interval
+        self.rotation = rotation
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.metrics = {
+            "written": 0,
+            "dropped": 0,
+            "flushes": 0,
+            "rotations": 0,
+            "errors": 0,
+        }
+        self._buffer = deque()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._stamp_second = None
+        self._stamp = ""
+
+        # Truncate on start, as the per-message log always has
+        self._file = open(self.path, "wb")
+        self._size = 0
+        self._day = date.today()
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def write(self, direction, message):
+        """
+        Queue one message (a FixMessage, or an already encoded str/bytes).
+        Safe to call from any thread; never blocks on I/O.
+        """
+        if len(self._buffer) >= self.max_buffer:
+            try:
+                self._buffer.popleft()
+                self.metrics["dropped"] += 1
+            except IndexError:
+                pass
+        self._buffer.append((time.time(), direction, message))
+        if len(self._buffer) >= self.flush_records:
+            self._wakeup.set()
+
+    def flush(self):
+        """Ask the writer thread to write everything buffered now."""
+        self._wakeup.set()
+
+    def close(self):
+        """Write anything still buffered and close the file."""
+        if self._closed:
+            return
+        self._closed = True
+        self._wakeup.set()
+        self._thread.join(timeout=5)
+
+    def stats(self):
+        return {**self.metrics, "buffered": len(self._buffer)}
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self._drain()
+        self._drain()
+        try:
+            self._file.close()
+        except Exception as e:
+            logger.error(f"Error closing FIX log '{self.path}': {e}")
+
+    def _drain(self):
+        chunks = []
+        try:
+            while True:
+                try:
+                    timestamp, direction, message = self._buffer.popleft()
+                except IndexError:
+                    break
+                try:
+                    line = self._format(timestamp, direction, message)
+                except Exception as e:
+                    self.metrics["errors"] += 1
+                    logger.error(f"Could not format FIX message for '{self.path}': {e}")
+                    continue
+                if self._should_rotate(timestamp):
+                    self._write(chunks)
+                    chunks = []
+                    self._rotate(timestamp)
+                chunks.append(line)
+                self._size += len(line)
+            self._write(chunks)
+        except Exception as e:
+            self.metrics["errors"] += 1
+            logger.error(f"Error writing FIX log '{self.path}': {e}")
+
+    def _write(self, chunks):
+        if not chunks:
+            return
+        self._file.write(b"".join(chunks))
+        self._file.flush()
+        self.metrics["written"] += len(chunks)
+        self.metrics["flushes"] += 1
+
+    def _format(self, timestamp, direction, message):
+        if self.log_format == "raw":
+            if isinstance(message, str):
+                wire = message.encode()
+            elif isinstance(message, bytes):
+                wire = message
+            elif message.get(10) is not None:
+                # Inbound messages already carry BodyLength and CheckSum
+                wire = message.encode(raw=True)
+            else:
+                wire = message.encode()
+            return f"{timestamp:.6f} {direction} ".encode() + wire + b"\n"
+        second = int(timestamp)
+        if second != self._stamp_second:
+            self._stamp_second = second
+            self._stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(second))
+        return f"{self._stamp} - {direction} - {message}\n".encode()
+
+    def _should_rotate(self, timestamp):
+        if self.max_bytes and self._size >= self.max_bytes:
+            return True
+        if self.rotation == "daily":
+            return date.fromtimestamp(timestamp) != self._day
+        return False
+
+    def _rotate(self, timestamp):
+        self._file.close()
+        day = date.fromtimestamp(timestamp)
+        if self.rotation == "daily" and day != self._day:
+            target = f"{self.path}.{self._day.isoformat()}"
+            suffix = 1
+            while os.path.exists(target):
+                target = f"{self.path}.{self._day.isoformat()}.{suffix}"
+                suffix += 1
+            os.replace(self.path, target)
+            self._prune_daily()
+        else:
+            for index in range(self.backup_count - 1, 0, -1):
+                source = f"{self.path}.{index}"
+                if os.path.exists(source):
+                    os.replace(source, f"{self.path}.{index + 1}")
+            if self.backup_count > 0:
+                os.replace(self.path, f"{self.path}.1")
+        self._file = open(self.path, "wb")
+        self._size = 0
+        self._day = day
+        self.metrics["rotations"] += 1
+
+    def _prune_daily(self):
+        directory = os.path.dirname(self.path) or "."
+        dated_name = re.compile(
+            re.escape(os.path.basename(self.path)) + r"\.\d{4}-\d{2}-\d{2}(\.\d+)?$"
+        )
+        dated = sorted(
+            name for name in os.listdir(directory) if dated_name.match(name)
+        )
+        for name in dated[: max(0, len(dated) - self.backup_count)]:
+            os.remove(os.path.join(directory, name))
+
+
+def read_fix_log(path):
+    """
+    Replay a FIX log written with log_format="raw".
+
+    Yields:
+        (timestamp, direction, FixMessage) in the order the messages were logged.
+    """
+    with open(path, "rb") as log_file:
+        for line in log_file:
+            header_end = line.find(b" ", line.find(b" ") + 1)
+            if header_end < 0:
+                continue
+            timestamp, direction = line[:header_end].split(b" ")
+            parser = FixParser()
+            parser.append_buffer(line[header_end + 1:].rstrip(b"\n"))
+            message = parser.get_message()
+            if message is not None:
+                yield float(timestamp), direction.decode(), message
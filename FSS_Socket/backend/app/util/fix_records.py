@@ -0,0 +1,204 @@
+from simplefix import FixMessage
+
+# Tags read from Quote (35=i) messages
+QUOTE_TAGS = {
+    str(tag).encode(): tag
+    for tag in (
+        15, 52, 55, 63, 131, 167, 295, 9999,
+        54, 64, 132, 133, 134, 135, 188, 189, 190, 191,
+        268, 269, 282, 299, 631, 7576, 7577,
+    )
+}
+
+# Tags read from Market Data Snapshot (35=W) messages
+MARKET_DATA_TAGS = {
+    str(tag).encode(): tag
+    for tag in (55, 64, 167, 268, 269, 270, 271, 273, 278, 282)
+}
+
+
+class FixFields:
+    """
+    Decoded values of selected tags, collected in one pass over a message.
+
+    get(tag, nth) has the same meaning as FixMessage.get(tag, nth): the nth
+    occurrence of the tag anywhere in the message. It returns a str instead
+    of bytes. Each value is decoded exactly once, however often it is read.
+    """
+
+    __slots__ = ("_values",)
+
+    def __init__(self, message: FixMessage, tags: dict[bytes, int]):
+        values: dict[int, list[str]] = {}
+        for raw_tag, raw_value in message.pairs:
+            tag = tags.get(raw_tag)
+            if tag is None:
+                continue
+            bucket = values.get(tag)
+            if bucket is None:
+                values[tag] = [raw_value.decode()]
+            else:
+                bucket.append(raw_value.decode())
+        self._values = values
+
+    def get(self, tag, nth=1):
+        bucket = self._values.get(tag)
+        if bucket is None or nth > len(bucket):
+            return None
+        return bucket[nth - 1]
+
+
+class QuoteRecord:
+    """
+    One entry of a Quote (35=i) message.
+
+    A single record feeds the quote book, the Redis write and the
+    on_price_update callback. Missing fields are "N/A", as the quote book
+    has always stored them.
+    """
+
+    __slots__ = (
+        "symbol",
+        "type",
+        "currency",
+        "provider",
+        "quote_req_id",
+        "bid",
+        "ask",
+        "net_price",
+        "forward_price",
+        "spot_price",
+        "fwd_points",
+        "order_qty",
+        "settlement_type",
+        "side",
+        "md_entry_type",
+        "depth",
+        "timestamp",
+        "quote_id",
+        "value_date",
+        "is_bid",
+        "rate",
+    )
+
+    def __init__(
+        self,
+        symbol,
+        type,
+        currency,
+        provider,
+        quote_req_id,
+        bid,
+        ask,
+        net_price,
+        forward_price,
+        spot_price,
+        fwd_points,
+        order_qty,
+        settlement_type,
+        side,
+        md_entry_type,
+        depth,
+        timestamp,
+        quote_id,
+        value_date,
+        is_bid,
+        rate,
+    ):
+        self.symbol = symbol
+        self.type = type
+        self.currency = currency
+        self.provider = provider
+        self.quote_req_id = quote_req_id
+        self.bid = bid
+        self.ask = ask
+        self.net_price = net_price
+        self.forward_price = forward_price
+        self.spot_price = spot_price
+        self.fwd_points = fwd_points
+        self.order_qty = order_qty
+        self.settlement_type = settlement_type
+        self.side = side
+        self.md_entry_type = md_entry_type
+        self.depth = depth
+        self.timestamp = timestamp
+        self.quote_id = quote_id
+        self.value_date = value_date
+        # Redis side ("Bid"/"Ask") and rate string ("bid" or "bid_forward")
+        self.is_bid = is_bid
+        self.rate = rate
+
+    def as_args(self):
+        """Positional arguments for update_quotes_df and the on_price_update callback."""
+        return (
+            self.symbol,
+            self.type,
+            self.currency,
+            self.provider,
+            self.quote_req_id,
+            self.bid,
+            self.ask,
+            self.net_price,
+            self.forward_price,
+            self.spot_price,
+            self.fwd_points,
+            self.order_qty,
+            self.settlement_type,
+            self.side,
+            self.md_entry_type,
+            self.depth,
+            self.timestamp,
+            self.quote_id,
+            self.value_date,
+        )
+
+
+class MarketDataRecord:
+    """One entry of a Market Data Snapshot (35=W) message."""
+
+    __slots__ = (
+        "quote_id",
+        "symbol",
+        "settlement_type",
+        "entry_type",
+        "price",
+        "quantity",
+        "time_stamp",
+        "originator",
+        "type",
+    )
+
+    def __init__(
+        self,
+        quote_id,
+        symbol,
+        settlement_type,
+        entry_type,
+        price,
+        quantity,
+        time_stamp,
+        originator,
+        type,
+    ):
+        self.quote_id = quote_id
+        self.symbol = symbol
+        self.settlement_type = settlement_type
+        self.entry_type = entry_type
+        self.price = price
+        self.quantity = quantity
+        self.time_stamp = time_stamp
+        self.originator = originator
+        self.type = type
+
+    def as_args(self):
+        """Positional arguments for the on_price_update callback."""
+        return (
+            self.quote_id,
+            self.symbol,
+            self.settlement_type,
+            self.entry_type,
+            self.price,
+            self.quantity,
+            self.time_stamp,
+            self.originator,
+        )
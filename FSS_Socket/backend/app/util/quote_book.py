@@ -0,0 +1,138 @@
+import threading
+import time
+import logging
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+QUOTE_COLUMNS = [
+    "quote_req_id",
+    "quote_id",
+    "symbol",
+    "type",
+    "currency",
+    "provider",
+    "bid",
+    "ask",
+    "net_price",
+    "forward_price",
+    "spot_price",
+    "fwd_points",
+    "md_entry_type",
+    "order_qty",
+    "side",
+    "depth",
+    "timestamp",
+    "settlement_type",
+    "value_date",
+]
+
+# Fields that identify a single quote line in the book
+QUOTE_KEY_FIELDS = ("symbol", "type", "provider", "quote_req_id", "side", "order_qty")
+
+
+class QuoteBook:
+    """
+    In-memory RFS quote book.
+
+    Rows are stored in a dict keyed on (symbol, type, provider, quote_req_id,
+    side, order_qty) so an upsert is O(1). Secondary indexes by symbol and by
+    QuoteReqID keep per-symbol reads and per-request eviction proportional to
+    the rows involved rather than to the whole book.
+    """
+
+    def __init__(self, ttl_seconds=600, sweep_interval=30):
+        """
+        Args:
+            ttl_seconds: QuoteReqIDs with no quote for this long are evicted.
+                None disables time-based eviction.
+            sweep_interval: Minimum number of seconds between expiry sweeps.
+        """
+        self.ttl_seconds = ttl_seconds
+        self.sweep_interval = sweep_interval
+        self._rows: dict[tuple, dict] = {}
+        # dict used as an insertion-ordered set of keys
+        self._by_symbol: dict[str, dict[tuple, None]] = {}
+        self._by_quote_req_id: dict[str, dict[tuple, None]] = {}
+        self._last_seen: dict[str, float] = {}
+        self._last_sweep = time.monotonic()
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._rows)
+
+    def upsert(self, row: dict):
+        """Insert a quote row or overwrite the row with the same key."""
+        key = tuple(row[field] for field in QUOTE_KEY_FIELDS)
+        symbol = row["symbol"]
+        quote_req_id = row["quote_req_id"]
+        now = time.monotonic()
+        with self._lock:
+            if key not in self._rows:
+                self._by_symbol.setdefault(symbol, {})[key] = None
+                self._by_quote_req_id.setdefault(quote_req_id, {})[key] = None
+            self._rows[key] = row
+            self._last_seen[quote_req_id] = now
+            if (
+                self.ttl_seconds is not None
+                and now - self._last_sweep >= self.sweep_interval
+            ):
+                self._last_sweep = now
+                self._evict_older_than(now - self.ttl_seconds)
+
+    def rows(self, symbol=None):
+        """Return a snapshot list of rows, optionally restricted to one symbol."""
+        with self._lock:
+            if symbol is None:
+                return list(self._rows.values())
+            keys = self._by_symbol.get(symbol)
+            if not keys:
+                return []
+            return [self._rows[key] for key in keys]
+
+    def to_dataframe(self, symbol=None):
+        """Build a DataFrame view of the book (or of one symbol) on demand."""
+        return pd.DataFrame(self.rows(symbol), columns=QUOTE_COLUMNS)
+
+    def evict_quote_req_id(self, quote_req_id):
+        """Drop every row belonging to a QuoteReqID. Returns the number removed."""
+        with self._lock:
+            keys = self._by_quote_req_id.pop(quote_req_id, None)
+            self._last_seen.pop(quote_req_id, None)
+            if not keys:
+                return 0
+            for key in keys:
+                row = self._rows.pop(key, None)
+                if row is None:
+                    continue
+                symbol_keys = self._by_symbol.get(row["symbol"])
+                if symbol_keys is not None:
+                    symbol_keys.pop(key, None)
+                    if not symbol_keys:
+                        del self._by_symbol[row["symbol"]]
+            return len(keys)
+
+    def evict_expired(self):
+        """Evict QuoteReqIDs that have not been quoted within ttl_seconds."""
+        if self.ttl_seconds is None:
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            self._last_sweep = now
+            return self._evict_older_than(now - self.ttl_seconds)
+
+    def _evict_older_than(self, cutoff):
+        stale = [
+            quote_req_id
+            for quote_req_id, last_seen in self._last_seen.items()
+            if last_seen < cutoff
+        ]
+        removed = 0
+        for quote_req_id in stale:
+            removed += self.evict_quote_req_id(quote_req_id)
+        if stale:
+            logger.debug(
+                f"Evicted {len(stale)} expired QuoteReqIDs ({removed} quote rows)"
+            )
+        return removed
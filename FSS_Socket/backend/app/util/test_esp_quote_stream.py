@@ -0,0 +1,154 @@
+import json
+import threading
+import time
+
+import fakeredis
+import pytest
+
+from app.dao.redis_dao import RedisDAO
+from app.util.esp_snapshot_stream import EspSnapshotStream
+
+
+class _FakeWebSocket:
+    def __init__(self):
+        self.messages = []
+        self._lock = threading.Lock()
+
+    def send(self, message):
+        with self._lock:
+            self.messages.append(json.loads(message))
+
+    def received(self):
+        with self._lock:
+            return list(self.messages)
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def _save(dao, symbol, rate, timestamp=None):
+    dao.save_exchange_rate(
+        symbol, "SPOT", "1000000", "BID", "SPOT", "FSS",
+        timestamp or f"t{rate}", rate,
+    )
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+
+@pytest.fixture
+def dao(server):
+    dao = RedisDAO(quote_type="esp", stream_maxlen=50)
+    dao.redis = fakeredis.FakeRedis(server=server, decode_responses=True)
+    return dao
+
+
+def test_xadd_is_capped_by_maxlen(dao):
+    for i in range(1000):
+        _save(dao, "EURUSD", 1.0 + i / 10000)
+    # MAXLEN is approximate: Redis only trims whole stream nodes (100 entries
+    # by default), so allow one node of slack on top of the cap
+    assert dao.redis.xlen(RedisDAO.STREAM_KEY) <= dao.stream_maxlen + 100
+    _, updates = dao.get_recent_updates(1)
+    assert updates[0][1]["rate"] == 1.0 + 999 / 10000
+
+
+def test_xadd_disabled_without_maxlen(dao):
+    dao.stream_maxlen = None
+    _save(dao, "EURUSD", 1.1)
+    assert dao.redis.xlen(RedisDAO.STREAM_KEY) == 0
+
+
+def test_read_updates_resumes_from_last_id(dao):
+    _save(dao, "EURUSD", 1.1)
+    _save(dao, "GBPUSD", 1.3)
+    last_id, updates = dao.read_updates("0-0", block_ms=10)
+    assert [quote["rate"] for _, quote in updates] == [1.1, 1.3]
+
+    _save(dao, "USDJPY", 150.0)
+    next_id, updates = dao.read_updates(last_id, block_ms=10)
+    assert updates == [
+        (
+            "exchange_rate:esp:USDJPY:SPOT:1000000:BID:SPOT:FSS",
+            {"rate": 150.0, "timestamp": "t150.0"},
+        )
+    ]
+    assert next_id > last_id
+
+    # Nothing newer: the id is handed back unchanged
+    assert dao.read_updates(next_id, block_ms=10) == (next_id, [])
+
+
+def test_get_recent_updates_on_empty_stream(dao):
+    assert dao.get_recent_updates(5) == ("0-0", [])
+
+
+def _replays(ws):
+    return [message for message in ws.received() if message.get("replay")]
+
+
+def test_replay_returns_last_n_entries(dao):
+    for rate in (1.1, 1.2, 1.3, 1.4, 1.5):
+        _save(dao, "EURUSD", rate)
+    stream = EspSnapshotStream(dao, source="poll", interval=0.05)
+    ws = _FakeWebSocket()
+    stream.subscribe(ws)
+    try:
+        stream.replay(ws, 2)
+        assert _wait_for(lambda: len(_replays(ws)) == 2)
+        assert [message["price"] for message in _replays(ws)] == [1.4, 1.5]
+    finally:
+        stream.unsubscribe(ws)
+
+
+def test_replay_is_capped_at_max_replay(dao):
+    for rate in (1.1, 1.2, 1.3, 1.4, 1.5):
+        _save(dao, "EURUSD", rate)
+    stream = EspSnapshotStream(dao, source="poll", interval=0.05, max_replay=3)
+    ws = _FakeWebSocket()
+    stream.subscribe(ws)
+    try:
+        stream.replay(ws, 100)
+        assert _wait_for(lambda: len(_replays(ws)) >= 3)
+        time.sleep(0.05)
+        assert [message["price"] for message in _replays(ws)] == [1.3, 1.4, 1.5]
+    finally:
+        stream.unsubscribe(ws)
+
+
+def test_stream_handoff_loses_no_update_after_snapshot(dao, server):
+    _save(dao, "EURUSD", 1.1)
+    writer = RedisDAO(quote_type="esp", stream_maxlen=50)
+    writer.redis = fakeredis.FakeRedis(server=server, decode_responses=True)
+
+    # Write a new price after the producer has read the rate hashes but
+    # before its first XREAD: only the stream can deliver it
+    read_snapshot = dao.get_all_exchange_rates
+    snapshots = []
+
+    def get_all_exchange_rates(max_age=None):
+        rates = read_snapshot(max_age)
+        if not snapshots:
+            _save(writer, "EURUSD", 1.2)
+        snapshots.append(rates)
+        return rates
+
+    dao.get_all_exchange_rates = get_all_exchange_rates
+    stream = EspSnapshotStream(dao, source="stream", block_ms=50, interval=0.05)
+    ws = _FakeWebSocket()
+    stream.subscribe(ws)
+    try:
+        assert _wait_for(
+            lambda: any(message.get("price") == 1.2 for message in ws.received())
+        )
+        assert [quote["rate"] for quote in snapshots[0].values()] == [1.1]
+    finally:
+        stream.unsubscribe(ws)
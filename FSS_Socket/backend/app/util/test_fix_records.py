@@ -0,0 +1,131 @@
+import pytest
+from simplefix import FixMessage
+
+from bench_fix_parsing import (
+    legacy_process_market_data_snapshot,
+    legacy_process_quote,
+    make_connection,
+    register_quote_requests,
+    synthetic_market_data,
+    synthetic_quote,
+)
+
+
+class _RecordingRedisDAO:
+    def __init__(self, writes):
+        self.writes = writes
+
+    def save_exchange_rate(self, **kwargs):
+        self.writes.append(kwargs)
+
+    def schedule_flush(self):
+        pass
+
+
+def _edit(message, drop=(), replace=None, append=()):
+    """
+    Copy message, skipping the (tag, nth) occurrences in drop, substituting
+    replace[tag] for every value of tag, and adding the append pairs.
+    """
+    replace = replace or {}
+    seen = {}
+    edited = FixMessage()
+    for raw_tag, value in message.pairs:
+        tag = int(raw_tag)
+        seen[tag] = seen.get(tag, 0) + 1
+        if (tag, seen[tag]) in drop:
+            continue
+        edited.append_pair(tag, replace.get(tag, value))
+    for tag, value in append:
+        edited.append_pair(tag, value)
+    return edited
+
+
+def _outputs(handler, messages, request_tags=()):
+    """Quote-book rows, Redis writes and callbacks produced by handler."""
+    rows, writes, callbacks = [], [], []
+    connection = make_connection()
+    connection.redis_dao = _RecordingRedisDAO(writes)
+    connection.on_price_update = lambda *args: callbacks.append(args)
+    connection.update_quotes_df = lambda *args: rows.append(args)
+    register_quote_requests(
+        connection, [message for message in messages if message.get(35) == b"i"]
+    )
+    for request in connection.quote_requests.values():
+        for tag, value in request_tags:
+            request.append_pair(tag, value)
+    for message in messages:
+        handler(connection, message)
+    return rows, writes, callbacks
+
+
+def _new_quote(connection, message):
+    connection.process_quote(message)
+
+
+def _new_market_data(connection, message):
+    connection.process_market_data_snapshot(message)
+
+
+QUOTES = {
+    "forward": [synthetic_quote(f"QR{i}") for i in range(3)],
+    "spot": [_edit(synthetic_quote("QR1"), append=((63, "SP"),))],
+    # Group fields missing from some entries shift later occurrences, which
+    # FixMessage.get(tag, i) and FixFields.get(tag, i) must do identically
+    "missing_group_tags": [
+        _edit(
+            synthetic_quote("QR1"),
+            drop={(7576, 1), (7577, 1), (134, 3), (282, 4), (54, 2), (64, 10)},
+        )
+    ],
+    "invalid_entry_type": [
+        _edit(synthetic_quote("QR1"), drop={(269, 2)}, replace={269: "X"}),
+    ],
+    "missing_header_tags": [_edit(synthetic_quote("QR1"), drop={(55, 1), (52, 1)})],
+    "ndf": [_edit(synthetic_quote("QR1"), replace={167: "FXNDF"})],
+    "nds": [
+        _edit(
+            synthetic_quote("QR1"),
+            replace={167: "FXNDF"},
+            append=((63, "1M"), (9999, "3M")),
+        )
+    ],
+}
+
+
+@pytest.mark.parametrize("name", QUOTES)
+def test_process_quote_matches_per_tag_extraction(name):
+    messages = QUOTES[name]
+    expected = _outputs(legacy_process_quote, messages)
+    assert _outputs(_new_quote, messages) == expected
+    if name not in ("invalid_entry_type", "missing_header_tags"):
+        assert all(expected)
+
+
+def test_swap_far_leg_from_request_matches_per_tag_extraction():
+    messages = [_edit(synthetic_quote("QR1"), append=((63, "1M"),))]
+    request_tags = ((9999, "3M"),)
+    expected = _outputs(legacy_process_quote, messages, request_tags)
+    assert _outputs(_new_quote, messages, request_tags) == expected
+    assert expected[1][0]["type"] == "SWAP"
+
+
+MARKET_DATA = {
+    "levels": [synthetic_market_data()],
+    "forward": [_edit(synthetic_market_data(levels=3), replace={64: "1M"})],
+    "missing_group_tags": [
+        _edit(
+            synthetic_market_data(),
+            drop={(282, 1), (271, 4), (278, 7), (273, 12), (270, 20)},
+        )
+    ],
+    "ndf": [_edit(synthetic_market_data(levels=2), append=((167, "FXNDF"),))],
+}
+
+
+@pytest.mark.parametrize("name", MARKET_DATA)
+def test_process_market_data_snapshot_matches_per_tag_extraction(name):
+    messages = MARKET_DATA[name]
+    expected = _outputs(legacy_process_market_data_snapshot, messages)
+    assert _outputs(_new_market_data, messages) == expected
+    assert expected[1] and expected[2]
@@ -0,0 +1,111 @@
+import os
+
+import pytest
+
+from app.util.seq_num_store import SeqNumStore
+
+
+def _crash(store):
+    # Stop the store the way a killed process would: no final write, no marker
+    store._closed = True
+    store._wakeup.set()
+    if store._fd is not None:
+        os.close(store._fd)
+        store._fd = None
+
+
+def _write(path, data):
+    with open(path, "wb") as file:
+        file.write(data)
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "msg_seq_num.txt")
+
+
+def test_missing_file_starts_at_one(path):
+    store = SeqNumStore(path)
+    assert store.load() == 1
+    assert store.recovered_cleanly
+    store.close()
+
+
+@pytest.mark.parametrize("data", [b"42", b"42\n", b"42\r\n"])
+def test_legacy_single_value_is_clean(path, data):
+    _write(path, data)
+    store = SeqNumStore(path, durability="periodic", recovery_gap=100)
+    assert store.load() == 42
+    assert store.recovered_cleanly
+    store.close()
+
+
+def test_clean_restart_resumes_at_last_value(path):
+    store = SeqNumStore(path, durability="periodic", recovery_gap=100)
+    store.load()
+    store.save(57)
+    store.close()
+    with open(path, "rb") as file:
+        assert file.read() == b"57\nclean\n"
+
+    store = SeqNumStore(path, durability="periodic", recovery_gap=100)
+    assert store.load() == 57
+    assert store.recovered_cleanly
+    store.close()
+
+
+def test_fsync_crash_keeps_every_save(path):
+    store = SeqNumStore(path, compact_every=100)
+    store.load()
+    for value in range(2, 1001):
+        store.save(value)
+    _crash(store)
+
+    store = SeqNumStore(path, recovery_gap=100)
+    assert store.load() == 1000
+    assert not store.recovered_cleanly
+    store.close()
+
+
+def test_torn_tail_record_is_ignored(path):
+    _write(path, b"10\nopen\n11\n12\n1")
+    store = SeqNumStore(path)
+    assert store.load() == 12
+    assert not store.recovered_cleanly
+    store.close()
+
+
+def test_periodic_crash_adds_recovery_gap(path):
+    store = SeqNumStore(path, durability="periodic", flush_interval=60, recovery_gap=100)
+    store.load()
+    store.save(20)
+    store.flush()
+    store.save(50)  # lost: never flushed
+    _crash(store)
+
+    store = SeqNumStore(path, durability="periodic", recovery_gap=100)
+    assert store.load() == 120
+    assert not store.recovered_cleanly
+    store.close()
+
+
+def test_crash_right_after_open_is_unclean(path):
+    store = SeqNumStore(path, durability="periodic", flush_interval=60, recovery_gap=100)
+    store.load()
+    _crash(store)
+
+    store = SeqNumStore(path, durability="periodic", recovery_gap=100)
+    assert store.load() == 101
+    store.close()
+
+
+def test_fsync_mode_does_not_add_recovery_gap(path):
+    _write(path, b"10\nopen\n11\n")
+    store = SeqNumStore(path, durability="fsync", recovery_gap=100)
+    assert store.load() == 11
+    store.close()
+
+
+def test_unknown_durability_is_rejected(path):
+    with pytest.raises(ValueError):
+        SeqNumStore(path, durability="never")
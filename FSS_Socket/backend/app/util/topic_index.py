@@ -0,0 +1,164 @@
+"""
+Inverted index from quote topics to the WebSocket clients subscribed to them.
+
+A topic is (symbol, tenor, provider). A subscription names any of the three
+as lists; a missing or empty list means every value ("*"), so
+{"symbols": ["EUR/USD"]} is every tenor and provider of EUR/USD. Looking up a
+message's topic costs at most eight dict lookups (exact or wildcard per
+field), however many clients and topics there are.
+
+Clients added with add() receive everything until their first subscribe.
+Each field must be a string or a list of strings; anything else raises
+ValueError before the client's subscriptions change.
+
+The same module is in FSS_Socket and Main_Gateway (app/util); keep the two
+copies in step (scripts/check_shared_modules.py fails when they differ).
+"""
+
+import itertools
+import threading
+
+WILDCARD = "*"
+
+
+def _values(name: str, values) -> list[str]:
+    if values is None:
+        values = []
+    elif isinstance(values, str):
+        values = [values]
+    elif not isinstance(values, list) or not all(isinstance(v, str) for v in values):
+        raise ValueError(f"'{name}' must be a string or a list of strings")
+    return [v.strip().upper() or WILDCARD for v in values] or [WILDCARD]
+
+
+def _combinations(symbols, tenors, providers) -> list[tuple]:
+    return list(
+        itertools.product(
+            _values("symbols", symbols),
+            _values("tenors", tenors),
+            _values("providers", providers),
+        )
+    )
+
+
+def _norm(value) -> str:
+    return str(value).strip().upper() if value is not None else ""
+
+
+def _shape(topic: tuple) -> tuple:
+    return tuple(field != WILDCARD for field in topic)
+
+
+class TopicIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._topics: dict[tuple, set] = {}
+        self._client_topics: dict[object, set] = {}
+        self._everything: set = set()
+        # Subscriptions per exact/wildcard shape; lookups skip unused shapes
+        self._shapes: dict[tuple, int] = {}
+
+    def add(self, client):
+        """Register a client that gets every message until it subscribes."""
+        with self._lock:
+            if client not in self._client_topics:
+                self._everything.add(client)
+
+    def subscribe(self, client, symbols=None, tenors=None, providers=None) -> int:
+        """Add every (symbol, tenor, provider) combination. Returns the client's topic count."""
+        combinations = _combinations(symbols, tenors, providers)
+        with self._lock:
+            self._everything.discard(client)
+            topics = self._client_topics.setdefault(client, set())
+            for topic in combinations:
+                if topic in topics:
+                    continue
+                topics.add(topic)
+                self._topics.setdefault(topic, set()).add(client)
+                shape = _shape(topic)
+                self._shapes[shape] = self._shapes.get(shape, 0) + 1
+            return len(topics)
+
+    def unsubscribe(self, client, symbols=None, tenors=None, providers=None) -> int:
+        """
+        Remove the given combinations, or every topic when none of the three
+        is given. The client stays subscribed-only. Returns its topic count.
+        """
+        everything = symbols is None and tenors is None and providers is None
+        combinations = None if everything else _combinations(symbols, tenors, providers)
+        with self._lock:
+            topics = self._client_topics.get(client)
+            if not topics:
+                return 0
+            if combinations is None:
+                removed = list(topics)
+            else:
+                removed = [topic for topic in combinations if topic in topics]
+            for topic in removed:
+                self._drop(client, topic)
+                topics.discard(topic)
+            return len(topics)
+
+    def remove(self, client):
+        """Forget a client entirely, e.g. when its socket closes."""
+        with self._lock:
+            self._everything.discard(client)
+            for topic in self._client_topics.pop(client, ()):
+                self._drop(client, topic)
+
+    def match(self, symbol, tenor, provider) -> set:
+        """Clients that should get a message on this topic."""
+        key = (_norm(symbol), _norm(tenor), _norm(provider))
+        with self._lock:
+            matched = set(self._everything)
+            for shape in self._shapes:
+                clients = self._topics.get(
+                    tuple(k if exact else WILDCARD for k, exact in zip(key, shape))
+                )
+                if clients:
+                    matched |= clients
+        return matched
+
+    def accepts(self, client, symbol, tenor, provider) -> bool:
+        """Whether one client should get a message on this topic."""
+        key = (_norm(symbol), _norm(tenor), _norm(provider))
+        with self._lock:
+            if client in self._everything:
+                return True
+            topics = self._client_topics.get(client)
+            if not topics:
+                return False
+            return any(
+                tuple(k if exact else WILDCARD for k, exact in zip(key, shape)) in topics
+                for shape in self._shapes
+            )
+
+    def is_subscribed(self, client) -> bool:
+        """True once the client has subscribed (and so is filtered)."""
+        with self._lock:
+            return client in self._client_topics
+
+    def topics(self, client) -> list[dict]:
+        with self._lock:
+            topics = sorted(self._client_topics.get(client, ()))
+        return [{"symbol": s, "tenor": t, "provider": p} for s, t, p in topics]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "topics": len(self._topics),
+                "subscribed_clients": len(self._client_topics),
+                "unfiltered_clients": len(self._everything),
+            }
+
+    def _drop(self, client, topic):
+        # Caller holds self._lock
+        clients = self._topics.get(topic)
+        if clients is not None:
+            clients.discard(client)
+            if not clients:
+                del self._topics[topic]
+        shape = _shape(topic)
+        self._shapes[shape] -= 1
+        if not self._shapes[shape]:
+            del self._shapes[shape]
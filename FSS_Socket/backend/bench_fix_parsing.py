@@ -0,0 +1,428 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark for FixConnection quote (35=i) and market data (35=W) handling.
+
+Measures per-message CPU time of process_quote and
+process_market_data_snapshot with Redis writes and client callbacks
+replaced by no-ops, so only FIX field extraction and record building
+are timed. Each handler is timed next to legacy_process_quote and
+legacy_process_market_data_snapshot, reference copies of the earlier
+handlers that read every field with FixMessage.get(tag, i).
+
+Usage:
+    python bench_fix_parsing.py                  # synthetic messages
+    python bench_fix_parsing.py ws_fix_logs.txt  # messages recorded by log_fix_message
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import traceback
+from datetime import datetime
+
+from simplefix import FixMessage
+
+from app.util.fix_connection import FixConnection, logger
+
+
+class _NullRedisDAO:
+    def save_exchange_rate(self, **kwargs):
+        pass
+
+    def schedule_flush(self):
+        pass
+
+
+def make_connection():
+    seq_file = os.path.join(tempfile.mkdtemp(), "bench_seq_num.txt")
+    connection = FixConnection(
+        host="localhost",
+        port=0,
+        sender_comp_id="BENCH",
+        target_comp_id="FSS",
+        tls_cert="bench.pem",
+        tls_key="bench-key.pem",
+        log_file=None,
+        msg_seq_num_file=seq_file,
+    )
+    connection.redis_dao = _NullRedisDAO()
+    connection.on_price_update = lambda *args: None
+    return connection
+
+
+# --- Reference handlers: per-tag FixMessage.get(tag, i) extraction ---
+def legacy_process_quote(self, message: FixMessage):
+    """FixConnection.process_quote before single-pass extraction, kept for comparison."""
+    try:
+        quote_req_id = message.get(131)
+        if quote_req_id is None:
+            logger.warning("No QuoteReqID found in message")
+            return
+        request_message = self.quote_requests.get(quote_req_id.decode())
+        if request_message is None:
+            logger.warning(f"No request message found for {quote_req_id.decode()}")
+            return
+        symbol = message.get(55)  # Symbol
+        security_type = message.get(167)
+        settlement_field = message.get(63)
+        settlement = (
+            settlement_field.decode() if settlement_field is not None else None
+        )
+        # if message.get(9999)is none try to get from request message
+        settlement2 = (
+            message.get(9999)
+            if message.get(9999) is not None
+            else request_message.get(9999)
+        )
+        timestamp = message.get(52)  # SendingTime
+        currency = message.get(15)  # Currency
+        # Settlement type
+        type = "SPOT"
+        if security_type == b"FXNDF":
+            if settlement2:
+                type = "NDS"
+                far_leg = settlement2.decode() if settlement2 is not None else ""
+                settlement = f"{settlement}_{far_leg} "
+            else:
+                type = "NDF"
+
+        elif settlement in ("SP", "0", "1", "2"):
+            type = "SPOT"
+        elif settlement2:
+            type = "SWAP"
+            far_leg = settlement2.decode() if settlement2 is not None else ""
+            settlement = f"{settlement}_{far_leg} "
+        else:
+            type = "FORWARD"
+
+        num_entries_field = message.get(295)
+        num_entries = int(num_entries_field) if num_entries_field is not None else 0
+        for i in range(1, num_entries + 1):
+            quote_id = message.get(299, i)  # QuoteID
+            provider = message.get(282, i)  # Provider
+            bid_price = message.get(132, i)  # BidPx
+            ask_price = message.get(133, i)  # AskPx
+            bid_size = message.get(134, i)  # BidSize
+            ask_size = message.get(135, i)  # AskSize
+            bid_spot = message.get(188, i)
+            offer_spot = message.get(190, i)
+            forward_price_bid = message.get(7576, i)  # ForwardPrice
+            forward_price_ask = message.get(7577, i)  # ForwardPrice
+            forward_price = (
+                forward_price_bid if forward_price_bid else forward_price_ask
+            )
+            spot_rate = message.get(190, i)
+            if type == "NDS":
+                forward_price = bid_spot if bid_spot else offer_spot
+                spot_rate = bid_price if bid_price else ask_price
+
+            side = message.get(54, i)  # Side
+            md_entry_type = message.get(269, i)
+
+            depth = message.get(268, i)
+            net_price = message.get(631, i)  # NetPrice
+            value_date = message.get(64, i)  # SettlDate
+
+            fwd_points = message.get(191, i)
+            # [MOD] Filter only valid MDEntryTypes (0 = Bid, 1 = Offer)
+            if md_entry_type is None or md_entry_type.decode() not in (
+                "0",
+                "1",
+                "H",
+            ):
+                logger.warning(f"Invalid MDEntryType: {md_entry_type}")
+                continue
+
+            entry_type = (
+                md_entry_type.decode() if md_entry_type is not None else "Unknown"
+            )
+            is_bid = side.decode() != "1" if side is not None else False
+            order_qty = (
+                bid_size if bid_size else ask_size
+            )  # bid or ask size is the quantity
+            self.update_quotes_df(
+                symbol.decode() if symbol is not None else "N/A",
+                type,
+                (currency.decode() if currency is not None else "N/A"),
+                (provider.decode() if provider is not None else "N/A"),
+                (quote_req_id.decode() if quote_req_id is not None else "N/A"),
+                (bid_price.decode() if bid_price is not None else "N/A"),
+                (ask_price.decode() if ask_price is not None else "N/A"),
+                (net_price.decode() if net_price is not None else "N/A"),
+                (forward_price.decode() if forward_price is not None else "N/A"),
+                (spot_rate.decode() if spot_rate is not None else "N/A"),
+                (fwd_points.decode() if fwd_points is not None else "N/A"),
+                (order_qty.decode() if order_qty is not None else "N/A"),
+                (settlement if settlement is not None else "N/A"),
+                side.decode() if side is not None else "N/A",
+                entry_type,
+                depth.decode() if depth is not None else "N/A",
+                (timestamp.decode() if timestamp is not None else None),
+                (quote_id.decode() if quote_id is not None else "N/A"),
+                (value_date.decode() if value_date is not None else "N/A"),
+            )
+            # Only save to Redis if we have valid data
+            if (
+                symbol is not None
+                and provider is not None
+                and timestamp is not None
+            ):
+                self.redis_dao.save_exchange_rate(
+                    symbol=symbol.decode(),
+                    type=type,
+                    quantity=order_qty.decode() if order_qty is not None else "N/A",
+                    side="Bid" if is_bid else "Ask",
+                    settlement=settlement if settlement is not None else "N/A",
+                    provider=provider.decode(),
+                    timestamp=datetime.strptime(
+                        timestamp.decode(), "%Y%m%d-%H:%M:%S.%f"
+                    ).strftime("%Y-%m-%d %H-%M-%S"),
+                    exchange_rate=(
+                        f"{bid_price.decode() if bid_price else (ask_price.decode() if ask_price else 'N/A')}_{forward_price.decode()}"
+                        if forward_price
+                        else (
+                            bid_price.decode()
+                            if bid_price
+                            else (ask_price.decode() if ask_price else "N/A")
+                        )
+                    ),
+                )
+            if callable(self.on_price_update):
+                self.on_price_update(
+                    (symbol.decode() if symbol is not None else "N/A"),
+                    type,
+                    (currency.decode() if currency is not None else "N/A"),
+                    (provider.decode() if provider is not None else "N/A"),
+                    (quote_req_id.decode() if quote_req_id is not None else "N/A"),
+                    (bid_price.decode() if bid_price is not None else "N/A"),
+                    (ask_price.decode() if ask_price is not None else "N/A"),
+                    (net_price.decode() if net_price is not None else "N/A"),
+                    (
+                        forward_price.decode()
+                        if forward_price is not None
+                        else "N/A"
+                    ),
+                    (spot_rate.decode() if spot_rate is not None else "N/A"),
+                    (fwd_points.decode() if fwd_points is not None else "N/A"),
+                    (order_qty.decode() if order_qty is not None else "N/A"),
+                    (settlement if settlement is not None else "N/A"),
+                    side.decode() if side is not None else "N/A",
+                    entry_type,
+                    depth.decode() if depth is not None else "N/A",
+                    (timestamp.decode() if timestamp is not None else None),
+                    (quote_id.decode() if quote_id is not None else "N/A"),
+                    (value_date.decode() if value_date is not None else "N/A"),
+                )
+        self.redis_dao.schedule_flush()
+
+    except Exception as e:
+        logger.error(f"Error processing Quote: {e}")
+        logger.error("Stack Trace:")
+        logger.error(traceback.format_exc())
+
+
+def legacy_process_market_data_snapshot(self, message):
+    """FixConnection.process_market_data_snapshot before single-pass extraction, kept for comparison."""
+    try:
+        symbol = message.get(55).decode() if message.get(55) is not None else None
+        if symbol is None:
+            return  # Symbol
+        settlement_type = (
+            message.get(64).decode() if message.get(64) else None
+        )  # Settlement type
+        number_of_entries = int(message.get(268).decode())  # Number of entries
+        for i in range(1, number_of_entries + 1):
+            quote_id = (
+                message.get(278, i).decode() if message.get(278, i) else None
+            )  # MDEntryID
+            entry_type = (
+                message.get(269, i).decode() if message.get(269, i) else None
+            )  # MDEntryType
+            price = (
+                message.get(270, i).decode() if message.get(270, i) else None
+            )  # Bid price
+            quantity = (
+                message.get(271, i).decode() if message.get(271, i) else None
+            )  # Ask price
+            time_stamp = (
+                message.get(273, i).decode() if message.get(273, i) else None
+            )  # TimeStamp
+            originator = (
+                message.get(282, i).decode() if message.get(282, i) else None
+            )  # Originator
+            sec_type = (
+                message.get(167, i).decode() if message.get(167, i) else None
+            )  # NDF
+            logger.debug(
+                f"Market Data Snapshot for {symbol}: EntryType={entry_type}, Price={price}, Quantity={quantity}, TimeStamp={time_stamp}, Originator={originator}"
+            )
+            if sec_type == "FXNDF":
+                type = "NDF"
+            elif settlement_type in ("SP", "0", "1", "2"):
+                type = "SPOT"
+            else:
+                type = "FORWARD"
+            # check if all the fields are not None
+            if (
+                symbol
+                and entry_type
+                and price
+                and quantity
+                and time_stamp
+                and originator
+            ):
+                self.redis_dao.save_exchange_rate(
+                    symbol=symbol,
+                    type=type,
+                    quantity=quantity,
+                    side="Bid" if entry_type == "0" else "Ask",
+                    settlement=settlement_type,
+                    provider=originator,
+                    timestamp=datetime.utcfromtimestamp(
+                        int(time_stamp) / 1_000_000
+                    ).strftime("%Y-%m-%d %H-%M-%S"),
+                    exchange_rate=price,
+                )
+            if callable(self.on_price_update):
+                self.on_price_update(
+                    quote_id,
+                    symbol,
+                    settlement_type,
+                    entry_type,
+                    price,
+                    quantity,
+                    time_stamp,
+                    originator,
+                )
+        self.redis_dao.schedule_flush()
+
+    except Exception as e:
+        logger.error(f"Error processing Market Data Snapshot: {e}")
+        logger.error("Stack Trace:")
+        logger.error(traceback.format_exc())
+
+
+def synthetic_quote(quote_req_id, providers=5):
+    message = FixMessage()
+    for tag, value in (
+        (8, "FIX.4.4"), (35, "i"), (49, "FSS"), (56, "BENCH"), (34, 42),
+        (52, "20250101-12:00:00.123"), (131, quote_req_id), (55, "EUR/USD"),
+        (15, "EUR"), (63, "M1"), (167, "FXFWD"), (295, providers * 2),
+    ):
+        message.append_pair(tag, value)
+    for p in range(providers):
+        for side, entry_type in (("1", "0"), ("2", "1")):
+            for tag, value in (
+                (299, f"Q{p}{side}"), (282, f"LP{p}"), (132, "1.08123"),
+                (133, "1.08127"), (134, "1000000"), (135, "1000000"),
+                (188, "1.08101"), (190, "1.08105"), (189, "0.00022"),
+                (191, "0.00022"), (7576, "1.08123"), (7577, "1.08127"),
+                (54, side), (269, entry_type), (268, p + 1), (631, "1.08125"),
+                (64, "20250203"),
+            ):
+                message.append_pair(tag, value)
+    return message
+
+
+def synthetic_market_data(levels=10):
+    message = FixMessage()
+    for tag, value in (
+        (8, "FIX.4.4"), (35, "W"), (49, "FSS"), (56, "BENCH"), (34, 43),
+        (52, "20250101-12:00:00.123"), (262, "MD1"), (55, "EUR/USD"),
+        (64, "SP"), (268, levels * 2),
+    ):
+        message.append_pair(tag, value)
+    for level in range(levels):
+        for entry_type, price in (("0", "1.08123"), ("1", "1.08127")):
+            for tag, value in (
+                (269, entry_type), (270, price), (271, (level + 1) * 1000000),
+                (273, "1735732800123456"), (282, f"LP{level}"),
+                (278, f"E{level}{entry_type}"),
+            ):
+                message.append_pair(tag, value)
+    return message
+
+
+def register_quote_requests(connection, quotes):
+    """Add a Quote Request for every QuoteReqID so process_quote accepts the quotes."""
+    for message in quotes:
+        quote_req_id = message.get(131).decode()
+        request = FixMessage()
+        request.append_pair(131, quote_req_id)
+        connection.quote_requests[quote_req_id] = request
+
+
+def _load_recorded(path):
+    """Read messages written by FixConnection.log_fix_message ("... - IN - 8=...|35=W|...")."""
+    quotes, market_data = [], []
+    with open(path) as log_file:
+        for line in log_file:
+            _, sep, raw = line.partition(" - IN - ")
+            if not sep:
+                continue
+            message = FixMessage()
+            for pair in raw.strip().strip("|").split("|"):
+                tag, _, value = pair.partition("=")
+                if tag:
+                    message.append_pair(tag, value)
+            msg_type = message.get(35)
+            if msg_type == b"i":
+                quotes.append(message)
+            elif msg_type == b"W":
+                market_data.append(message)
+    return quotes, market_data
+
+
+def _bench(name, handler, messages, repeat):
+    if not messages:
+        print(f"{name}: no messages")
+        return
+    for message in messages:  # warm up
+        handler(message)
+    start = time.process_time()
+    for _ in range(repeat):
+        for message in messages:
+            handler(message)
+    elapsed = time.process_time() - start
+    count = repeat * len(messages)
+    print(f"{name}: {count} messages, {elapsed / count * 1e6:.1f} us CPU/message")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("log_file", nargs="?", help="FIX log recorded by log_fix_message")
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    connection = make_connection()
+    if args.log_file:
+        quotes, market_data = _load_recorded(args.log_file)
+    else:
+        quotes = [synthetic_quote(f"QR{i}") for i in range(10)]
+        market_data = [synthetic_market_data()]
+    register_quote_requests(connection, quotes)
+
+    _bench(
+        "35=i legacy_process_quote",
+        lambda message: legacy_process_quote(connection, message),
+        quotes,
+        args.repeat,
+    )
+    _bench("35=i process_quote", connection.process_quote, quotes, args.repeat)
+    _bench(
+        "35=W legacy_process_market_data_snapshot",
+        lambda message: legacy_process_market_data_snapshot(connection, message),
+        market_data,
+        args.repeat,
+    )
+    _bench(
+        "35=W process_market_data_snapshot",
+        connection.process_market_data_snapshot,
+        market_data,
+        args.repeat,
+    )
+
+
+if __name__ == "__main__":
+    sys.exit(main())
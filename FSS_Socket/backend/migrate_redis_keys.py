@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Migrate exchange rates from the flat exchange_rate:* keys to the hash layout.
+
+Copies every legacy rate into its exchange_rates:{quote_type}:{symbol} hash
+and sets the exchange_rates:legacy_migrated marker, after which no RedisDAO
+sharing this Redis scans for legacy keys again. Run it once every FIX
+listener writes the hash layout. Uses the REDIS_* environment variables.
+
+Usage:
+    python migrate_redis_keys.py           # copy, keep the legacy keys
+    python migrate_redis_keys.py --delete  # copy, then delete the legacy keys
+"""
+import argparse
+import os
+import sys
+
+from dotenv import load_dotenv
+
+from app.dao.redis_dao import RedisDAO
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--delete", action="store_true", help="delete each legacy key once copied"
+    )
+    args = parser.parse_args()
+
+    load_dotenv()
+    redis_dao = RedisDAO(
+        host=os.getenv("REDIS_HOST", "localhost"),
+        port=int(os.getenv("REDIS_PORT", "6379")),
+        db=int(os.getenv("REDIS_DB", "0")),
+        password=os.getenv("REDIS_PASSWORD"),
+        ssl=os.getenv("REDIS_SSL", "False") == "True",
+    )
+    migrated = redis_dao.migrate_legacy_keys(delete=args.delete)
+    print(f"Migrated {migrated} legacy exchange_rate keys; marker {RedisDAO.LEGACY_MIGRATED_KEY} set")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
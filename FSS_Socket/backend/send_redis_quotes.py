@@ -45,13 +45,8 @@ def send_redis_quotes_to_websocket():
                         "source": "redis"
                     }
                     
-                    # Send to all connected clients
-                    for client in connected_clients:
-                        try:
-                            client.send(json.dumps(message))
-                        except:
-                            # Remove disconnected clients
-                            connected_clients.remove(client)
+                    # Queue for all connected clients; failed sockets drop themselves
+                    connected_clients.broadcast(json.dumps(message))
                             
             except Exception as e:
                 print(f"Error fetching quote for {symbol}: {e}")
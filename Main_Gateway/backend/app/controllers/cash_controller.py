@@ -1,6 +1,8 @@
 from fastapi import APIRouter, Depends, Request, HTTPException
 from app.auth.azure_auth import validate_token
-from app.daos.cash_dao import CashDAO
+from app.daos.cash_dao import CashDAO, CASH_TRANSACTIONS_KEYSET
+from app.database.connection import run_db
+from app.util.pagination import ndjson_response, next_cursor
 import logging
 
 router = APIRouter(prefix="/api/cash", tags=["Cash"])
@@ -12,11 +14,13 @@ async def list_cash_transactions(
     current_user: dict = Depends(validate_token),
 ):
     """
-    Return raw cash transactions from public.gzc_cash_transactions.
+    Return raw cash transactions from public.gzc_cash_transactions, newest first.
+    Pass the next_cursor of one page as 'cursor' to get the next (keyset pagination).
     """
     try:
         limit_param = request.query_params.get("limit")
         offset_param = request.query_params.get("offset")
+        cursor = request.query_params.get("cursor")
         try:
             limit = int(limit_param) if limit_param is not None else 5000
             offset = int(offset_param) if offset_param is not None else 0
@@ -25,8 +29,21 @@ async def list_cash_transactions(
                 status_code=400, detail="'limit' and 'offset' must be integers"
             )
 
-        data = CashDAO().list_cash_transactions(limit=limit, offset=offset)
-        return {"status": "success", "count": len(data), "data": data}
+        try:
+            data = await run_db(
+                CashDAO().list_cash_transactions,
+                limit=limit,
+                offset=offset,
+                cursor=cursor,
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return {
+            "status": "success",
+            "count": len(data),
+            "data": data,
+            "next_cursor": next_cursor(data, limit, CASH_TRANSACTIONS_KEYSET),
+        }
     except HTTPException:
         raise
     except Exception as e:
@@ -34,3 +51,18 @@ async def list_cash_transactions(
         raise HTTPException(
             status_code=500, detail={"error": str(e), "type": e.__class__.__name__}
         )
+
+
+@router.get("/transactions/stream", status_code=200)
+async def stream_cash_transactions(
+    request: Request,
+    current_user: dict = Depends(validate_token),
+):
+    """
+    Stream every cash transaction (after 'cursor', if given) as NDJSON, newest first.
+    """
+    try:
+        cursor = request.query_params.get("cursor")
+        return ndjson_response(CashDAO().iter_cash_transactions(cursor=cursor))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
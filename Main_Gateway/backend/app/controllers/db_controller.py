@@ -1,7 +1,8 @@
 from fastapi import APIRouter, HTTPException, Query, Depends
 from app.auth.azure_auth import validate_token
 from app.daos.db_diagnostics_dao import DBDiagnosticsDAO
-from app.daos.fx_trades_dao import FXTradesDAO
+from app.daos.fx_trades_dao import FXTradesDAO, TRADES_KEYSET
+from app.util.pagination import next_cursor
 
 router = APIRouter(prefix="/api/db", tags=["DB Health"])
 
@@ -38,11 +39,19 @@ def db_describe():
 def db_fx_trades(
     limit: int = Query(100, ge=1, le=5000),
     offset: int = Query(0, ge=0),
+    cursor: str | None = Query(None),
     current_user: dict = Depends(validate_token),
 ):
     try:
-        data = FXTradesDAO().list_fx_trades(limit=limit, offset=offset)
-        return {"status": "ok", "count": len(data), "data": data}
+        data = FXTradesDAO().list_fx_trades(limit=limit, offset=offset, cursor=cursor)
+        return {
+            "status": "ok",
+            "count": len(data),
+            "data": data,
+            "next_cursor": next_cursor(data, limit, TRADES_KEYSET),
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -51,10 +60,18 @@ def db_fx_trades(
 def db_fx_option_trades(
     limit: int = Query(100, ge=1, le=5000),
     offset: int = Query(0, ge=0),
+    cursor: str | None = Query(None),
     current_user: dict = Depends(validate_token),
 ):
     try:
-        data = FXTradesDAO().list_fx_option_trades(limit=limit, offset=offset)
-        return {"status": "ok", "count": len(data), "data": data}
+        data = FXTradesDAO().list_fx_option_trades(limit=limit, offset=offset, cursor=cursor)
+        return {
+            "status": "ok",
+            "count": len(data),
+            "data": data,
+            "next_cursor": next_cursor(data, limit, TRADES_KEYSET),
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,12 +1,10 @@
 import asyncio
 import json
 import time
-import threading
 import os
 import requests
-import websocket
 
-from typing import Dict, List
+from typing import Dict, List, Optional
 from fastapi import (
     APIRouter,
     WebSocket,
@@ -18,6 +16,10 @@ from starlette.websockets import WebSocketState
 from fastapi.responses import JSONResponse
 
 from app.auth.azure_auth import validate_token_ws, validate_token
+from app.services.live_pnl import get_live_pnl_service
+from app.services.upstream_consumer import UpstreamConsumer
+from app.util.client_sender import CONFLATE, DROP_OLDEST, ClientSender
+from app.util.topic_index import TopicIndex
 from app.util.logger import get_logger
 
 logger = get_logger(__name__)
@@ -29,17 +31,30 @@ class FixController:
     RFS = "rfs"
     EXEC = "exec"
 
-    esp_clients: Dict[str, List[WebSocket]] = {}
-    rfs_clients: Dict[str, List[WebSocket]] = {}
-    exec_clients: Dict[str, List[WebSocket]] = {}
+    esp_clients: Dict[str, List[ClientSender]] = {}
+    rfs_clients: Dict[str, List[ClientSender]] = {}
+    exec_clients: Dict[str, List[ClientSender]] = {}
 
+    # quote_id -> {user_id: registration time}
     rfs_quote_registry: Dict[str, Dict[str, float]] = {}
 
-    event_loop = asyncio.get_event_loop()
+    # (symbol, tenor, provider) -> senders. ESP clients get everything until
+    # they subscribe; RFS clients get their own quote requests plus any topics
+    # they subscribe to.
+    topic_indexes = {ESP: TopicIndex(), RFS: TopicIndex()}
+
+    # ESP ticks conflate per price; RFS quotes and executions are never merged
+    send_policies = {ESP: CONFLATE, RFS: DROP_OLDEST, EXEC: DROP_OLDEST}
+    client_queue_size = int(os.getenv("WS_CLIENT_QUEUE_SIZE", "1000"))
+    # Default ESP flush cadence; a client can pick its own with ?conflate_ms=
+    # (e.g. 50 for a trading blotter, 1000 for a dashboard, 0 for every tick)
+    esp_conflate_ms = int(os.getenv("ESP_CONFLATE_MS", "50"))
+
+    upstreams: Dict[str, UpstreamConsumer] = {}
 
     # --- Client Management ---
     @classmethod
-    def get_client_dict(cls, stream: str) -> Dict[str, List[WebSocket]]:
+    def get_client_dict(cls, stream: str) -> Dict[str, List[ClientSender]]:
         return {
             cls.ESP: cls.esp_clients,
             cls.RFS: cls.rfs_clients,
@@ -47,143 +62,218 @@ class FixController:
         }[stream]
 
     @classmethod
-    def add_client(cls, stream: str, user_id: str, ws: WebSocket):
+    def add_client(
+        cls, stream: str, user_id: str, ws: WebSocket, flush_interval: float = 0.0
+    ) -> ClientSender:
         clients = cls.get_client_dict(stream)
-        clients.setdefault(user_id, []).append(ws)
+        sender = ClientSender(
+            ws,
+            f"{stream}:{user_id}",
+            policy=cls.send_policies[stream],
+            max_queue=cls.client_queue_size,
+            flush_interval=flush_interval,
+        ).start()
+        clients.setdefault(user_id, []).append(sender)
+        if stream == cls.ESP:
+            cls.topic_indexes[stream].add(sender)
+        return sender
 
     @classmethod
     def remove_client(cls, stream: str, user_id: str, ws: WebSocket):
         clients = cls.get_client_dict(stream)
-        if user_id in clients and ws in clients[user_id]:
-            clients[user_id].remove(ws)
-            if not clients[user_id]:
-                del clients[user_id]
+        for sender in clients.get(user_id, []):
+            if sender.ws is ws:
+                sender.close()
+        cls._prune(stream, clients, [user_id])
+
+    @classmethod
+    def _prune(
+        cls, stream: str, clients: Dict[str, List[ClientSender]], user_ids
+    ):
+        topics = cls.topic_indexes.get(stream)
+        for user_id in user_ids:
+            senders = []
+            for sender in clients.get(user_id, []):
+                if not sender.closed:
+                    senders.append(sender)
+                elif topics is not None:
+                    topics.remove(sender)
+            if senders:
+                clients[user_id] = senders
+            else:
+                clients.pop(user_id, None)
+
+    @classmethod
+    def handle_control(cls, stream: str, sender: ClientSender, message: str) -> Optional[dict]:
+        """
+        Apply a client's {"type": "subscribe" | "unsubscribe" | "topics",
+        "symbols": [...], "tenors": [...], "providers": [...]} message and
+        return the reply, or None if message is not a topic request. Invalid
+        fields get an {"type": "error"} reply and change nothing.
+        """
+        try:
+            request = json.loads(message)
+        except ValueError:
+            return None
+        if not isinstance(request, dict) or stream not in cls.topic_indexes:
+            return None
+        topics = cls.topic_indexes[stream]
+        kind = request.get("type")
+        fields = {
+            name: request.get(name) for name in ("symbols", "tenors", "providers")
+        }
+        try:
+            if kind == "subscribe":
+                topics.subscribe(sender, **fields)
+            elif kind == "unsubscribe":
+                topics.unsubscribe(sender, **fields)
+            elif kind != "topics":
+                return None
+        except ValueError as e:
+            return {"type": "error", "message": str(e)}
+        return {"type": "topics", "topics": topics.topics(sender)}
 
     # --- RFS Quote ID Registry ---
     @classmethod
     def register_rfs_quote_id(cls, user_id: str, quote_id: str):
-        cls.rfs_quote_registry.setdefault(user_id, {})[
-            quote_id
-        ] = time.time()
+        cls.rfs_quote_registry.setdefault(quote_id, {})[user_id] = time.time()
 
     @classmethod
     def expire_rfs_quote_ids(cls, expiry_seconds: int = 600):
         now = time.time()
-        for user_id in list(cls.rfs_quote_registry.keys()):
+        for quote_id in list(cls.rfs_quote_registry.keys()):
             valid = {
-                qid: ts
-                for qid, ts in cls.rfs_quote_registry[user_id].items()
+                user_id: ts
+                for user_id, ts in cls.rfs_quote_registry[quote_id].items()
                 if now - ts < expiry_seconds
             }
             if valid:
-                cls.rfs_quote_registry[user_id] = valid
+                cls.rfs_quote_registry[quote_id] = valid
             else:
-                del cls.rfs_quote_registry[user_id]
+                del cls.rfs_quote_registry[quote_id]
+
+    @classmethod
+    async def expire_rfs_quote_ids_periodically(cls, interval: float = 30):
+        while True:
+            await asyncio.sleep(interval)
+            cls.expire_rfs_quote_ids()
 
     # --- Broadcast Logic ---
+    @staticmethod
+    def _esp_key(data) -> Optional[tuple]:
+        # One pending update per price on a client's queue; quantity tiers are
+        # separate prices, so they are not merged
+        if not isinstance(data, dict) or data.get("type") != "quote":
+            return None
+        return (
+            data.get("symbol"),
+            data.get("quote_type"),
+            data.get("settlement"),
+            data.get("side"),
+            data.get("provider"),
+            data.get("quantity"),
+        )
+
+    @staticmethod
+    def _topic(data) -> Optional[tuple]:
+        # ESP from Redis says settlement/provider, raw FIX ticks and RFS quotes
+        # say settlement_type and originator/provider
+        if not isinstance(data, dict) or not data.get("symbol"):
+            return None
+        return (
+            data.get("symbol"),
+            data.get("settlement") or data.get("settlement_type"),
+            data.get("provider") or data.get("originator"),
+        )
+
     @classmethod
     async def broadcast(
         cls,
-        clients: Dict[str, List[WebSocket]],
+        clients: Dict[str, List[ClientSender]],
         message: str,
         stream: str,
     ):
-        cls.expire_rfs_quote_ids()
-        disconnected_users = []
-
-        for user_id, sockets in clients.items():
-            active_sockets = []
-
-            try:
-                if stream == cls.RFS:
-                    data = json.loads(message)
-                    quote_id = data.get("request_quote_id")
-                    if quote_id not in cls.rfs_quote_registry.get(
-                        user_id, {}
-                    ):
-                        continue
-
-                for ws in sockets:
-                    if ws.application_state == WebSocketState.CONNECTED:
-                        try:
-                            await ws.send_text(message)
-                            active_sockets.append(ws)
-                        except Exception as e:
-                            logger.warning(
-                                f"[broadcast:{stream}] Send failed for {user_id}: {e}"
-                            )
-                    else:
-                        logger.debug(
-                            f"[broadcast:{stream}] Skipping closed WebSocket ({user_id})"
-                        )
-
-            except Exception as e:
-                logger.error(
-                    f"[broadcast:{stream}] Error for {user_id}: {e}"
-                )
-
-            if active_sockets:
-                clients[user_id] = active_sockets
-            else:
-                disconnected_users.append(user_id)
+        """
+        Parse message once and queue it on every interested client's sender.
+        Nothing here waits on a socket; see ClientSender.
+        """
+        try:
+            data = json.loads(message)
+        except ValueError:
+            data = None
+
+        key = None
+        if stream == cls.ESP:
+            get_live_pnl_service().on_esp_quote(data)
+            key = cls._esp_key(data)
+        elif stream == cls.EXEC:
+            get_live_pnl_service().on_execution(data)
+
+        topic = cls._topic(data)
+        topics = cls.topic_indexes.get(stream)
+        if stream == cls.RFS:
+            quote_id = data.get("request_quote_id") if isinstance(data, dict) else None
+            senders = {
+                sender
+                for user_id in cls.rfs_quote_registry.get(quote_id, {})
+                for sender in clients.get(user_id, [])
+            }
+            if topic is not None:
+                senders |= topics.match(*topic)
+        elif topics is not None and topic is not None:
+            senders = topics.match(*topic)
+        else:
+            # Executions, and ESP messages that are not quotes (snapshot headers)
+            senders = [sender for group in clients.values() for sender in group]
+
+        if stream == cls.ESP and isinstance(data, dict) and data.get("type") == "snapshot":
+            # A resync/reconnect snapshot supersedes the quotes still queued;
+            # its entries must not take their place ahead of this header
+            for sender in senders:
+                sender.discard_keyed()
+        closed = [sender for sender in senders if not sender.put(message, key)]
+        if closed:
+            logger.debug(f"[broadcast:{stream}] Dropping {len(closed)} closed WebSocket(s)")
+            cls._prune(stream, clients, list(clients))
 
-        for user_id in disconnected_users:
-            clients.pop(user_id, None)
+    @classmethod
+    def client_stats(cls) -> dict:
+        return {
+            stream: [
+                sender.stats()
+                for senders in cls.get_client_dict(stream).values()
+                for sender in senders
+            ]
+            for stream in (cls.ESP, cls.RFS, cls.EXEC)
+        }
 
     # --- Microservice Streaming Connector ---
     @classmethod
     def start_microservice_stream(
         cls,
         microservice_url: str,
-        clients: Dict[str, List[WebSocket]],
+        clients: Dict[str, List[ClientSender]],
         stream: str,
-    ):
-        def run():
-            def on_message(ws, message):
-                logger.debug(f"[From {microservice_url}] {message}")
-                try:
-                    future = asyncio.run_coroutine_threadsafe(
-                        cls.broadcast(clients, message, stream),
-                        cls.event_loop,
-                    )
-                    future.result(timeout=2)
-                except Exception as e:
-                    logger.error(
-                        f"[broadcast:{stream}] Future failed: {e}"
-                    )
-
-            def on_error(ws, error):
-                logger.error(f"[{stream}] WebSocket error: {error}")
-
-            def on_close(ws, code, msg):
-                logger.warning(
-                    f"[{stream}] Closed: code={code}, msg={msg}. Reconnecting in 5s..."
-                )
-                time.sleep(5)
+    ) -> UpstreamConsumer:
+        """Consume a FIX service stream on the running loop and broadcast it to clients."""
 
-            def on_open(ws):
-                logger.info(
-                    f"[{stream}] Connected to {microservice_url}"
-                )
-
-            ws_app = websocket.WebSocketApp(
-                microservice_url,
-                on_open=on_open,
-                on_message=on_message,
-                on_error=on_error,
-                on_close=on_close,
-            )
+        async def handle(message: str):
+            await cls.broadcast(clients, message, stream)
 
-            while True:
-                try:
-                    ws_app.run_forever()
-                except Exception as e:
-                    logger.error(
-                        f"[{stream}] run_forever exception: {e}"
-                    )
-                    time.sleep(5)
+        consumer = UpstreamConsumer(
+            microservice_url,
+            stream,
+            handle,
+            max_queue=int(os.getenv("UPSTREAM_QUEUE_SIZE", "10000")),
+        ).start()
+        cls.upstreams[stream] = consumer
+        return consumer
 
-        threading.Thread(target=run, daemon=True).start()
+    @classmethod
+    async def stop_microservice_streams(cls):
+        for consumer in cls.upstreams.values():
+            await consumer.stop()
+        cls.upstreams.clear()
 
 
 # --- WebSocket Endpoints ---
@@ -198,13 +288,26 @@ async def esp_stream(
         # Handle different claim names from MSAL tokens
         user_id = user_info.get("preferred_username") or user_info.get("email") or user_info.get("sub", "unknown-user")
     await websocket.accept()
-    FixController.add_client(FixController.ESP, user_id, websocket)
+    try:
+        conflate_ms = int(
+            websocket.query_params.get("conflate_ms", FixController.esp_conflate_ms)
+        )
+    except ValueError:
+        await websocket.close(code=1008, reason="'conflate_ms' must be an integer")
+        return
+    sender = FixController.add_client(
+        FixController.ESP, user_id, websocket, flush_interval=max(0, conflate_ms) / 1000
+    )
     logger.info(f"WebSocket connected: /ws_esp ({user_id})")
     try:
         while True:
             msg = await websocket.receive_text()
             if msg == "ping" or msg.strip() == '{"type":"ping"}':
                 await websocket.send_text('{"type": "pong"}')
+                continue
+            reply = FixController.handle_control(FixController.ESP, sender, msg)
+            if reply is not None:
+                await websocket.send_text(json.dumps(reply))
     except WebSocketDisconnect as e:
         logger.info(
             f"WebSocket disconnected: /ws_esp ({user_id}), code={e.code}"
@@ -226,11 +329,15 @@ async def rfs_stream(
         # Handle different claim names from MSAL tokens
         user_id = user_info.get("preferred_username") or user_info.get("email") or user_info.get("sub", "unknown-user")
     await websocket.accept()
-    FixController.add_client(FixController.RFS, user_id, websocket)
+    sender = FixController.add_client(FixController.RFS, user_id, websocket)
     logger.info(f"WebSocket connected: /ws_rfs ({user_id})")
     try:
+        # Sends happen on the client's sender task; here only topic requests
         while True:
-            await asyncio.sleep(1)
+            msg = await websocket.receive_text()
+            reply = FixController.handle_control(FixController.RFS, sender, msg)
+            if reply is not None:
+                await websocket.send_text(json.dumps(reply))
     except WebSocketDisconnect as e:
         logger.info(
             f"WebSocket disconnected: /ws_rfs ({user_id}), code={e.code}"
@@ -255,8 +362,9 @@ async def exec_stream(
     FixController.add_client(FixController.EXEC, user_id, websocket)
     logger.info(f"WebSocket connected: /ws_exec ({user_id})")
     try:
+        # Sends happen on the client's sender task; this only waits for the close
         while True:
-            await asyncio.sleep(1)
+            await websocket.receive_text()
     except WebSocketDisconnect as e:
         logger.info(
             f"WebSocket disconnected: /ws_exec ({user_id}), code={e.code}"
@@ -267,6 +375,43 @@ async def exec_stream(
         )
 
 
+@router.websocket("/ws_pnl")
+async def pnl_stream(
+    websocket: WebSocket, user_info: dict = Depends(validate_token_ws)
+):
+    """Live FX forward PnL: a snapshot, then throttled per-position deltas."""
+    # Emergency bypass for authentication issues
+    if os.getenv("SKIP_AUTH_CHECK") == "true":
+        user_id = os.getenv("DEFAULT_USER", "system_user")
+    else:
+        # Handle different claim names from MSAL tokens
+        user_id = user_info.get("preferred_username") or user_info.get("email") or user_info.get("sub", "unknown-user")
+    await websocket.accept()
+    try:
+        fund_id = int(websocket.query_params.get("fundId") or 0)
+    except ValueError:
+        await websocket.close(code=1008, reason="'fundId' must be an integer")
+        return
+    live_pnl = get_live_pnl_service()
+    logger.info(f"WebSocket connected: /ws_pnl ({user_id}, fund {fund_id})")
+    try:
+        await live_pnl.subscribe(websocket, fund_id)
+        while True:
+            msg = await websocket.receive_text()
+            if msg == "ping" or msg.strip() == '{"type":"ping"}':
+                await websocket.send_text('{"type": "pong"}')
+    except WebSocketDisconnect as e:
+        logger.info(
+            f"WebSocket disconnected: /ws_pnl ({user_id}), code={e.code}"
+        )
+    except Exception as e:
+        logger.error(f"[ws_pnl] Stream failed for {user_id}: {e}")
+        if websocket.application_state == WebSocketState.CONNECTED:
+            await websocket.close(code=1011)
+    finally:
+        live_pnl.unsubscribe(websocket)
+
+
 # --- REST API Endpoints ---
 @router.get("/api/ws_status")
 async def get_websocket_status():
@@ -281,6 +426,16 @@ async def get_websocket_status():
             "exec": {
                 k: len(v) for k, v in FixController.exec_clients.items()
             },
+            "pnl": get_live_pnl_service().stats(),
+            "queues": FixController.client_stats(),
+            "topics": {
+                stream: index.stats()
+                for stream, index in FixController.topic_indexes.items()
+            },
+            "upstreams": {
+                stream: consumer.stats()
+                for stream, consumer in FixController.upstreams.items()
+            },
         }
     )
 
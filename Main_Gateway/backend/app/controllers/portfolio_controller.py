@@ -1,98 +1,51 @@
 # app/controllers/portfolio_controller.py
 
 from fastapi import APIRouter, Depends, Request, HTTPException, status
+import asyncio
 import os
-import requests
 from app.auth.azure_auth import validate_token
 from app.daos.portfolio_dao import PortfolioDAO
+from app.database.connection import run_db
+from app.services.business_calendar import get_calendar
+from app.services.position_valuation import (
+    FX_FORWARD,
+    FX_OPTION,
+    PositionValuationEngine,
+)
+from app.services.pricing_cache import get_pricing_cache
+from app.util.response_format import negotiate
 import logging
 
 router = APIRouter(prefix="/api/portfolio", tags=["Portfolio"])
 logger = logging.getLogger(__name__)
 
 # External pricer microservice configuration (inside VPN)
-# Configure via environment variables:
+# Configure via environment variables (see app.services.pricer_client):
 #  - PRICER_BASE_URL: base URL to the pricer service (e.g., https://pricer.internal:8443)
 #  - PRICER_TIMEOUT_MS: optional HTTP timeout in milliseconds (default 5000)
 PRICER_BASE_URL = os.getenv("PRICER_BASE_URL", "")
-try:
-    PRICER_TIMEOUT_MS = int(os.getenv("PRICER_TIMEOUT_MS", "5000"))
-except Exception:
-    PRICER_TIMEOUT_MS = 5000
 
+# Currencies whose holidays close the DTD/MTD/YTD reference dates
+# (see app.services.business_calendar for the holiday file)
+PORTFOLIO_CALENDAR = os.getenv("PORTFOLIO_CALENDAR", "USD")
 
-def _get_pricer_url(path: str) -> str:
-    base = (PRICER_BASE_URL or "").rstrip("/")
-    p = path.lstrip("/")
-    return f"{base}/{p}" if base else ""
 
-
-def _prev_business_day(d):
-    from datetime import timedelta
-
-    # Simple weekend-only logic; holidays can be added later
-    dtd = d - timedelta(days=1)
-    wd = dtd.weekday()
-    if wd == 6:  # Sunday -> Friday
-        dtd = dtd - timedelta(days=2)
-    elif wd == 5:  # Saturday -> Friday
-        dtd = dtd - timedelta(days=1)
-    return dtd
-
-
-def _last_business_day_of_month(d):
-    from datetime import date, timedelta
-
-    # Move to first day of next month, then step back to last day, then adjust for weekend
-    year = d.year + (1 if d.month == 12 else 0)
-    month = 1 if d.month == 12 else d.month + 1
-    first_next = date(year, month, 1)
-    last_day = first_next - timedelta(days=1)
-    return _prev_business_day(
-        last_day + timedelta(days=1)
-    )  # prev biz from next day of last_day
-
-
-def _last_business_day_of_year(d):
-    from datetime import date
-
-    dec31 = date(d.year - 1 if d.month == 1 and d.day == 1 else d.year, 12, 31)
-    # If the selected date is in year Y, we want last business day of previous year (Y-1)
-    prev_year_dec31 = date(d.year - 1, 12, 31)
-    return _prev_business_day(
-        prev_year_dec31 + __import__("datetime").timedelta(days=1)
-    )
-
-
-def _bulk_price(request_items: list[dict]) -> dict[str, dict[str, float]]:
+async def _bulk_price(request_items: list[dict]) -> dict[str, dict[str, float]]:
     """
     Call external pricer in bulk. Returns mapping: id -> { date -> price }.
+    Prices already fetched (or being fetched) for the same instrument and
+    date are served from the pricing cache.
     If PRICER_BASE_URL is not configured or request fails, returns empty dict.
     """
     if not PRICER_BASE_URL or not request_items:
         return {}
-    url = _get_pricer_url("api/price/bulk")
-    if not url:
-        return {}
-    try:
-        resp = requests.post(
-            url,
-            json={"requests": request_items},
-            timeout=max(1, PRICER_TIMEOUT_MS // 1000),
-        )
-        resp.raise_for_status()
-        data = resp.json() or {}
-        results = data.get("results") or []
-        out: dict[str, dict[str, float]] = {}
-        for r in results:
-            rid = str(r.get("id"))
-            prices = r.get("prices") or {}
-            # Normalize keys to ISO strings
-            norm = {str(k): v for k, v in prices.items()}
-            out[rid] = norm
-        return out
-    except Exception:
-        return {}
+    return await get_pricing_cache().bulk_price(request_items)
+
+
+@router.get("/pricing-cache", status_code=200)
+async def get_pricing_cache_stats(current_user: dict = Depends(validate_token)):
+    """Return pricing cache hit/miss counters."""
+    return {"status": "success", "data": get_pricing_cache().stats()}
 
 
 @router.get("/", status_code=200)
@@ -103,10 +56,15 @@ async def get_portfolio(request: Request, current_user: dict = Depends(validate_
     try:
         current_date = request.query_params.get("currentDate", None)
         dao = PortfolioDAO()
-        portfolio_df = dao.get_virtual_portfolio(current_date)
+        portfolio_df = await run_db(dao.get_virtual_portfolio, current_date)
 
-        return {"status": "success", "data": portfolio_df.to_dict(orient="records")}
+        return negotiate(
+            request,
+            {"status": "success", "data": portfolio_df.to_dict(orient="records")},
+        )
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.exception("[PortfolioController] Failed to fetch portfolio")
         raise HTTPException(status_code=500, detail=str(e))
@@ -117,7 +75,8 @@ async def get_fx_positions(
     request: Request, current_user: dict = Depends(validate_token)
 ):
     """
-    Return FX forward positions as JSON where maturity_date >= selected date.
+    Return FX forward positions as JSON where maturity_date >= selected date
+    (columnar JSON or Arrow on request, see app.util.response_format).
     If fundId is provided and not 0, also filter by fund.
     Query params:
       - date: ISO date (YYYY-MM-DD)
@@ -153,248 +112,37 @@ async def get_fx_positions(
                 )
 
         # Baseline: DB trade records only
-        data = PortfolioDAO().get_fx_positions(
-            selected_date=selected_date, fund_id=fund_id
+        data = await run_db(
+            PortfolioDAO().get_fx_positions,
+            selected_date=selected_date,
+            fund_id=fund_id,
         )
 
-        # Compute ref dates and attach placeholders; pricing integration will fill later
         from datetime import datetime
 
         today = datetime.strptime(selected_date, "%Y-%m-%d").date()
-        dtd = _prev_business_day(today)  # end of day previous business day
-        eom = _last_business_day_of_month(today)  # end of current month business day
-        eoy = _last_business_day_of_year(today)  # last business day of previous year
-
-        # Prepare bulk request to pricer (only for items needing pricing)
-        req_items: list[dict] = []
-        enriched = []
-        for t in data:
-            trade_date = t.get("trade_date") or today
-            try:
-                if isinstance(trade_date, str):
-                    trade_date = datetime.fromisoformat(trade_date[:10]).date()
-                elif hasattr(trade_date, "date"):
-                    trade_date = trade_date.date()
-            except Exception:
-                trade_date = today
-
-            def use_trade(ref_date):
-                return trade_date >= ref_date
-
-            # If pricer is not configured, return 0 for required ref dates; if trade_date >= ref_date use trade price
-            # Build pricer request id and fields when needed
-            request_id = f"fx-{t.get('trade_id')}"
-            need_dates: list[str] = []
-            if not use_trade(eoy):
-                need_dates.append(eoy.isoformat())
-            if not use_trade(eom):
-                need_dates.append(eom.isoformat())
-            if not use_trade(dtd):
-                need_dates.append(dtd.isoformat())
-            # Always include today for pricer-based pricing
-            need_dates.append(today.isoformat())
-            # Always include today for pricer-based pricing
-            need_dates.append(today.isoformat())
-
-            if need_dates and PRICER_BASE_URL:
-                symbol = f"{str(t.get('trade_currency')).upper()}/{str(t.get('settlement_currency')).upper()}"
-                # If tenor is derivable add it; else omit
-                req_items.append(
-                    {
-                        "type": "fx_forward",
-                        "id": request_id,
-                        "symbol": symbol,
-                        "maturityDate": str(t.get("maturity_date"))[:10]
-                        if t.get("maturity_date")
-                        else None,
-                        "dates": need_dates,
-                    }
-                )
-
-            def price_for(
-                ref_date, trade_price_value, fetched: dict[str, float] | None
-            ):
-                if use_trade(ref_date):
-                    return trade_price_value
-                if fetched is None:
-                    return 0 if not PRICER_BASE_URL else None
-                return fetched.get(ref_date.isoformat())
-
-            enriched.append(
-                {
-                    **t,
-                    "eoy_date": eoy.isoformat(),
-                    "eom_date": eom.isoformat(),
-                    "eod_date": dtd.isoformat(),
-                    "today_date": today.isoformat(),
-                    # keep DB price intact; store as trade_price for downstream use
-                    "trade_price": t.get("price"),
-                    "eoy_price": None,
-                    "eom_price": None,
-                    "eod_price": None,
-                }
-            )
-
-        # Fetch prices in bulk and populate
-        fetched_map = _bulk_price(req_items) if PRICER_BASE_URL else {}
-
-        # Group by ticker and concatenate trade_ids (works for both "all funds" and specific funds)
-        # This allows View/Edit submenu to work when multiple trades share the same ticker
-        from collections import defaultdict
-        grouped_by_ticker: dict[str, list[dict]] = defaultdict(list)
-        for t in enriched:
-            trade_ccy = str(t.get("trade_currency") or "").upper()
-            settle_ccy = str(t.get("settlement_currency") or "").upper()
-            maturity = str(t.get("maturity_date") or "")[:10]
-            underlying = f"{trade_ccy}-{settle_ccy}" if trade_ccy and settle_ccy else None
-            ticker = (
-                f"{underlying}-{maturity}" if underlying and maturity else underlying
-            )
-            grouped_by_ticker[ticker].append(t)
-
-        # Process grouped trades: aggregate quantities, concatenate trade_ids and original_trade_ids
-        enriched_grouped = []
-        for ticker, trades in grouped_by_ticker.items():
-            if len(trades) == 1:
-                # Single trade, no grouping needed
-                enriched_grouped.append(trades[0])
-            else:
-                # Multiple trades with same ticker - aggregate
-                base_trade = trades[0].copy()
-                # Aggregate quantities
-                total_qty = sum(float(t.get("quantity") or 0) for t in trades)
-                base_trade["quantity"] = total_qty
-                # Concatenate trade_ids (comma-separated, sorted)
-                trade_ids = [
-                    str(t.get("trade_id"))
-                    for t in trades
-                    if t.get("trade_id") is not None
-                ]
-                if trade_ids:
-                    # Remove duplicates and sort
-                    unique_trade_ids = sorted(set(trade_ids), key=lambda x: int(x) if x.isdigit() else 0)
-                    base_trade["trade_id"] = ",".join(unique_trade_ids)
-                # Concatenate original_trade_ids (comma-separated, sorted) - only when all funds
-                if fund_id == 0:
-                    original_ids = [
-                        str(t.get("original_trade_id"))
-                        for t in trades
-                        if t.get("original_trade_id") is not None
-                    ]
-                    if original_ids:
-                        # Remove duplicates and sort
-                        unique_ids = sorted(set(original_ids), key=lambda x: int(x) if x.isdigit() else 0)
-                        base_trade["original_trade_id"] = ",".join(unique_ids)
-                    else:
-                        base_trade["original_trade_id"] = None
-                # Store grouped trade details for View/Edit submenu
-                grouped_trades_info = []
-                for t in trades:
-                    trade_id = t.get("trade_id")
-                    qty = t.get("quantity")
-                    fund_id_val = t.get("fund_id")
-                    grouped_trades_info.append({
-                        "trade_id": trade_id,
-                        "quantity": qty,
-                        "fund_id": fund_id_val,
-                    })
-                base_trade["grouped_trades"] = grouped_trades_info
-                base_trade["trade_count"] = len(trades)
-                # Use first trade's price (or could average, but keeping first for now)
-                enriched_grouped.append(base_trade)
-        enriched = enriched_grouped
-
-        out = []
-        for t in enriched:
-            # For grouped trades with comma-separated trade_ids, use first ID for pricing lookup
-            trade_id_str = str(t.get('trade_id') or '')
-            first_trade_id = trade_id_str.split(',')[0] if ',' in trade_id_str else trade_id_str
-            rid = f"fx-{first_trade_id}"
-            fetched = fetched_map.get(rid)
-            # Use TRADE price as fallback when trade_date >= ref_date
-            eoy_price = (
-                t["eoy_price"]
-                if t["eoy_price"] is not None
-                else price_for(eoy, t.get("trade_price"), fetched)
-            )
-            eom_price = (
-                t["eom_price"]
-                if t["eom_price"] is not None
-                else price_for(eom, t.get("trade_price"), fetched)
-            )
-            eod_price = (
-                t["eod_price"]
-                if t["eod_price"] is not None
-                else price_for(dtd, t.get("trade_price"), fetched)
-            )
-            price = (
-                fetched.get(t["today_date"])
-                if fetched
-                else (0 if not PRICER_BASE_URL else None)
-            )
-
-            trade_price = t.get("trade_price")
-            qty = float(t.get("quantity") or 0)
-            side = str(t.get("position") or "").strip().lower()
-            dir_factor = 1.0 if side == "buy" else -1.0
-
-            def pnl_since(ref_p):
-                if ref_p is None or price is None:
-                    return None
-                return (float(price) - float(ref_p)) * qty * dir_factor
-
-            # Avoid duplicating DB price field; expose it as trade_price instead
-            base = {k: v for k, v in t.items() if k != "price"}
-            # Construct identifier columns for frontend grouping
-            trade_ccy = str(base.get("trade_currency") or "").upper()
-            settle_ccy = str(base.get("settlement_currency") or "").upper()
-            maturity = str(base.get("maturity_date") or "")[:10]
-            underlying = f"{trade_ccy}-{settle_ccy}" if trade_ccy and settle_ccy else None
-            ticker = (
-                f"{underlying}-{maturity}" if underlying and maturity else underlying
-            )
-            # Ensure original_trade_id is explicitly preserved from base
-            original_trade_id = base.get("original_trade_id")
-
-            # Debug: Log original_trade_id for USD-MXN trades
-            trade_ccy_check = str(base.get("trade_currency") or "").upper()
-            settle_ccy_check = str(base.get("settlement_currency") or "").upper()
-            if (trade_ccy_check == "USD" and settle_ccy_check == "MXN") or (
-                trade_ccy_check == "MXN" and settle_ccy_check == "USD"
-            ):
-                logger.info(
-                    f"[PortfolioController] USD-MXN trade: trade_id={base.get('trade_id')}, "
-                    f"original_trade_id={original_trade_id}, "
-                    f"has_original_trade_id_in_base={'original_trade_id' in base}"
-                )
-
-            out.append(
-                {
-                    **base,
-                    "trade_price": trade_price,
-                    "eoy_price": eoy_price,
-                    "eom_price": eom_price,
-                    "eod_price": eod_price,
-                    "price": price,
-                    # New columns for portfolio table
-                    "underlying": underlying,
-                    "ticker": ticker,
-                    "eoy_date": t["eoy_date"],
-                    "eom_date": t["eom_date"],
-                    "eod_date": t["eod_date"],
-                    "itd_pnl": pnl_since(trade_price),
-                    "ytd_pnl": pnl_since(eoy_price),
-                    "mtd_pnl": pnl_since(eom_price),
-                    "dtd_pnl": pnl_since(eod_price),
-                    # Explicitly ensure original_trade_id is included
-                    "original_trade_id": original_trade_id,
-                    # Explicitly preserve grouped_trades and trade_count if they exist
-                    "grouped_trades": base.get("grouped_trades"),
-                    "trade_count": base.get("trade_count"),
-                }
-            )
+        business_days = get_calendar(PORTFOLIO_CALENDAR)
+        engine = PositionValuationEngine(
+            FX_FORWARD,
+            today,
+            dtd=business_days.prev_business_day(today),  # end of day previous business day
+            eom=business_days.end_of_month(today),  # end of current month business day
+            eoy=business_days.end_of_previous_year(today),  # last business day of previous year
+            pricer_enabled=bool(PRICER_BASE_URL),
+        )
+        # Valuation is seconds of pandas work on a large book; keep it off the
+        # event loop like the queries
+        positions = await run_db(engine.load, data)
+        fetched_map = (
+            await _bulk_price(await run_db(engine.price_requests, positions))
+            if PRICER_BASE_URL
+            else {}
+        )
+        # Trades sharing a ticker are grouped with concatenated trade_ids so the
+        # View/Edit submenu works for both "all funds" and specific funds
+        out = await run_db(engine.value, positions, fetched_map, fund_id=fund_id)
 
-        return {"status": "success", "count": len(out), "data": out}
+        return negotiate(request, {"status": "success", "count": len(out), "data": out})
     except HTTPException:
         raise
     except Exception as e:
@@ -441,8 +189,14 @@ async def get_notional_summary(
                 )
 
         dao = PortfolioDAO()
-        fx = dao.get_fx_positions(selected_date=selected_date, fund_id=fund_id)
-        fxopt = dao.get_fx_option_positions(selected_date=selected_date, fund_id=fund_id)
+        fx, fxopt = await asyncio.gather(
+            run_db(dao.get_fx_positions, selected_date=selected_date, fund_id=fund_id),
+            run_db(
+                dao.get_fx_option_positions,
+                selected_date=selected_date,
+                fund_id=fund_id,
+            ),
+        )
 
         # Build pricer requests (today only) when available
         from datetime import datetime
@@ -500,7 +254,7 @@ async def get_notional_summary(
                     "dates": [today.isoformat()],
                 })
 
-        fetched = _bulk_price(need_prices) if PRICER_BASE_URL else {}
+        fetched = await _bulk_price(need_prices) if PRICER_BASE_URL else {}
 
         # Aggregate notionals
         from collections import defaultdict
@@ -627,7 +381,8 @@ async def get_fx_option_positions(
     request: Request, current_user: dict = Depends(validate_token)
 ):
     """
-    Return FX option positions as JSON where maturity_date >= selected date.
+    Return FX option positions as JSON where maturity_date >= selected date
+    (columnar JSON or Arrow on request, see app.util.response_format).
     If fundId is provided and not 0, also filter by fund.
     Query params:
       - date: ISO date (YYYY-MM-DD)
@@ -662,239 +417,33 @@ async def get_fx_option_positions(
                     status_code=400, detail="'fundId' must be an integer"
                 )
 
-        data = PortfolioDAO().get_fx_option_positions(
-            selected_date=selected_date, fund_id=fund_id
+        data = await run_db(
+            PortfolioDAO().get_fx_option_positions,
+            selected_date=selected_date,
+            fund_id=fund_id,
         )
 
         from datetime import datetime
 
         today = datetime.strptime(selected_date, "%Y-%m-%d").date()
-        dtd = _prev_business_day(today)
-        eom = _last_business_day_of_month(today)
-        eoy = _last_business_day_of_year(today)
-
-        req_items: list[dict] = []
-        enriched = []
-        for t in data:
-            trade_date = t.get("trade_date") or today
-            try:
-                if isinstance(trade_date, str):
-                    trade_date = datetime.fromisoformat(trade_date[:10]).date()
-                elif hasattr(trade_date, "date"):
-                    trade_date = trade_date.date()
-            except Exception:
-                trade_date = today
-
-            def use_trade(ref_date):
-                return trade_date >= ref_date
-
-            request_id = f"fxopt-{t.get('trade_id')}"
-            need_dates: list[str] = []
-            if not use_trade(eoy):
-                need_dates.append(eoy.isoformat())
-            if not use_trade(eom):
-                need_dates.append(eom.isoformat())
-            if not use_trade(dtd):
-                need_dates.append(dtd.isoformat())
-
-            if need_dates and PRICER_BASE_URL:
-                underlying = f"{str(t.get('underlying_trade_currency')).upper()}/{str(t.get('underlying_settlement_currency')).upper()}"
-                req_items.append(
-                    {
-                        "type": "fx_option",
-                        "id": request_id,
-                        "underlying": underlying,
-                        "optionType": t.get("option_type"),
-                        "style": t.get("option_style"),
-                        "strike": t.get("strike"),
-                        "strikeCurrency": t.get("strike_currency"),
-                        "maturityDate": str(t.get("maturity_date"))[:10]
-                        if t.get("maturity_date")
-                        else None,
-                        "cut": t.get("cut"),
-                        "dates": need_dates,
-                    }
-                )
-
-            def price_for(
-                ref_date, trade_price_value, fetched: dict[str, float] | None
-            ):
-                if use_trade(ref_date):
-                    return trade_price_value
-                if fetched is None:
-                    return 0 if not PRICER_BASE_URL else None
-                return fetched.get(ref_date.isoformat())
-
-            enriched.append(
-                {
-                    **t,
-                    "eoy_date": eoy.isoformat(),
-                    "eom_date": eom.isoformat(),
-                    "eod_date": dtd.isoformat(),
-                    "today_date": today.isoformat(),
-                    # keep DB premium intact; store as trade_price for downstream use
-                    "trade_price": t.get("premium"),
-                    "eoy_price": None,
-                    "eom_price": None,
-                    "eod_price": None,
-                }
-            )
-
-        fetched_map = _bulk_price(req_items) if PRICER_BASE_URL else {}
-
-        # Group by ticker and concatenate trade_ids (works for both "all funds" and specific funds)
-        # This allows View/Edit submenu to work when multiple trades share the same ticker
-        from collections import defaultdict
-        grouped_by_ticker: dict[str, list[dict]] = defaultdict(list)
-        for t in enriched:
-            u_trade_ccy = str(t.get("underlying_trade_currency") or "").upper()
-            u_settle_ccy = str(t.get("underlying_settlement_currency") or "").upper()
-            maturity = str(t.get("maturity_date") or "")[:10]
-            underlying = f"{u_trade_ccy}-{u_settle_ccy}" if u_trade_ccy and u_settle_ccy else None
-            opt_type_raw = str(t.get("option_type") or t.get("optionType") or "").strip().upper()
-            opt_code = ("P" if opt_type_raw.startswith("P") else ("C" if opt_type_raw.startswith("C") else (opt_type_raw[:1] if opt_type_raw else None)))
-            strike_val = t.get("strike")
-            strike_fmt = None
-            try:
-                if strike_val is not None and strike_val != "":
-                    strike_fmt = f"{float(strike_val):.8f}"
-            except Exception:
-                strike_fmt = None
-            ticker = None
-            if underlying and opt_code and strike_fmt and maturity:
-                ticker = f"{underlying}-{opt_code}-{strike_fmt}-{maturity}"
-            elif underlying and maturity:
-                ticker = f"{underlying}-{maturity}"
-            else:
-                ticker = underlying
-            grouped_by_ticker[ticker].append(t)
-
-        # Process grouped trades: aggregate quantities, concatenate trade_ids
-        enriched_grouped = []
-        for ticker, trades in grouped_by_ticker.items():
-            if len(trades) == 1:
-                # Single trade, no grouping needed
-                enriched_grouped.append(trades[0])
-            else:
-                # Multiple trades with same ticker - aggregate
-                base_trade = trades[0].copy()
-                # Aggregate quantities
-                total_qty = sum(float(t.get("quantity") or 0) for t in trades)
-                base_trade["quantity"] = total_qty
-                # Concatenate trade_ids (comma-separated, sorted)
-                trade_ids = [
-                    str(t.get("trade_id"))
-                    for t in trades
-                    if t.get("trade_id") is not None
-                ]
-                if trade_ids:
-                    # Remove duplicates and sort
-                    unique_trade_ids = sorted(set(trade_ids), key=lambda x: int(x) if x.isdigit() else 0)
-                    base_trade["trade_id"] = ",".join(unique_trade_ids)
-                # Store grouped trade details for View/Edit submenu
-                grouped_trades_info = []
-                for t in trades:
-                    trade_id = t.get("trade_id")
-                    qty = t.get("quantity")
-                    fund_id_val = t.get("fund_id")
-                    grouped_trades_info.append({
-                        "trade_id": trade_id,
-                        "quantity": qty,
-                        "fund_id": fund_id_val,
-                    })
-                base_trade["grouped_trades"] = grouped_trades_info
-                base_trade["trade_count"] = len(trades)
-                enriched_grouped.append(base_trade)
-        enriched = enriched_grouped
-
-        out = []
-        for t in enriched:
-            # For grouped trades with comma-separated trade_ids, use first ID for pricing lookup
-            trade_id_str = str(t.get('trade_id') or '')
-            first_trade_id = trade_id_str.split(',')[0] if ',' in trade_id_str else trade_id_str
-            rid = f"fxopt-{first_trade_id}"
-            fetched = fetched_map.get(rid)
-            # Use TRADE premium as fallback when trade_date >= ref_date
-            eoy_price = (
-                t["eoy_price"]
-                if t["eoy_price"] is not None
-                else price_for(eoy, t.get("trade_price"), fetched)
-            )
-            eom_price = (
-                t["eom_price"]
-                if t["eom_price"] is not None
-                else price_for(eom, t.get("trade_price"), fetched)
-            )
-            eod_price = (
-                t["eod_price"]
-                if t["eod_price"] is not None
-                else price_for(dtd, t.get("trade_price"), fetched)
-            )
-            price = (
-                fetched.get(t["today_date"])
-                if fetched
-                else (0 if not PRICER_BASE_URL else None)
-            )
-
-            trade_price = t.get("trade_price")
-            qty = float(t.get("quantity") or 0)
-            side = str(t.get("position") or "").strip().lower()
-            dir_factor = 1.0 if side == "buy" else -1.0
-
-            def pnl_since(ref_p):
-                if ref_p is None or price is None:
-                    return None
-                return (float(price) - float(ref_p)) * qty * dir_factor
-
-            # Avoid duplicating DB premium field; expose it as trade_price instead
-            base = {k: v for k, v in t.items() if k != "premium"}
-            # Construct identifier columns for frontend grouping (use underlying CCYs)
-            u_trade_ccy = str(base.get("underlying_trade_currency") or "").upper()
-            u_settle_ccy = str(base.get("underlying_settlement_currency") or "").upper()
-            maturity = str(base.get("maturity_date") or "")[:10]
-            underlying = f"{u_trade_ccy}-{u_settle_ccy}" if u_trade_ccy and u_settle_ccy else None
-            # FX Option ticker format: TRADE-SETTLE-<P|C>-<strike:8dp>-YYYY-MM-DD
-            opt_type_raw = str(base.get("option_type") or base.get("optionType") or "").strip().upper()
-            opt_code = ("P" if opt_type_raw.startswith("P") else ("C" if opt_type_raw.startswith("C") else (opt_type_raw[:1] if opt_type_raw else None)))
-            strike_val = base.get("strike")
-            strike_fmt = None
-            try:
-                if strike_val is not None and strike_val != "":
-                    strike_fmt = f"{float(strike_val):.8f}"
-            except Exception:
-                strike_fmt = None
-            ticker = None
-            if underlying and opt_code and strike_fmt and maturity:
-                ticker = f"{underlying}-{opt_code}-{strike_fmt}-{maturity}"
-            elif underlying and maturity:
-                ticker = f"{underlying}-{maturity}"
-            else:
-                ticker = underlying
-            out.append(
-                {
-                    **base,
-                    # Ensure FX Option uses underlying CCYs as trade/settlement currencies
-                    "trade_currency": u_trade_ccy,
-                    "settlement_currency": u_settle_ccy,
-                    "trade_price": trade_price,
-                    "eoy_price": eoy_price,
-                    "eom_price": eom_price,
-                    "eod_price": eod_price,
-                    "price": price,
-                    # New columns for portfolio table
-                    "underlying": underlying,
-                    "ticker": ticker,
-                    "itd_pnl": pnl_since(trade_price),
-                    "ytd_pnl": pnl_since(eoy_price),
-                    "mtd_pnl": pnl_since(eom_price),
-                    "dtd_pnl": pnl_since(eod_price),
-                    # Explicitly preserve grouped_trades and trade_count if they exist
-                    "grouped_trades": base.get("grouped_trades"),
-                    "trade_count": base.get("trade_count"),
-                }
-            )
+        business_days = get_calendar(PORTFOLIO_CALENDAR)
+        engine = PositionValuationEngine(
+            FX_OPTION,
+            today,
+            dtd=business_days.prev_business_day(today),
+            eom=business_days.end_of_month(today),
+            eoy=business_days.end_of_previous_year(today),
+            pricer_enabled=bool(PRICER_BASE_URL),
+        )
+        positions = await run_db(engine.load, data)
+        fetched_map = (
+            await _bulk_price(await run_db(engine.price_requests, positions))
+            if PRICER_BASE_URL
+            else {}
+        )
+        out = await run_db(engine.value, positions, fetched_map, fund_id=fund_id)
 
-        return {"status": "success", "count": len(out), "data": out}
+        return negotiate(request, {"status": "success", "count": len(out), "data": out})
     except HTTPException:
         raise
     except Exception as e:
@@ -918,6 +467,7 @@ async def get_trade_lineage(
     Query params:
       - original_trade_id: integer or comma-separated integers (required)
       - fundId: integer (optional) - if provided and not 0, filter by fund_id
+      - includeAncestors: boolean (optional) - also return each record's parent lineage chain
     """
     try:
         original_trade_id_param = request.query_params.get("original_trade_id")
@@ -962,26 +512,28 @@ async def get_trade_lineage(
                     status_code=400, detail="'fundId' must be an integer"
                 )
 
-        dao = PortfolioDAO()
-        # Fetch lineage for all original_trade_ids and combine
-        all_lineage_data: list[dict] = []
-        for orig_id in original_trade_ids:
-            lineage_data = dao.get_trade_lineage(
-                original_trade_id=orig_id, fund_id=fund_id
-            )
-            all_lineage_data.extend(lineage_data)
+        include_ancestors = request.query_params.get(
+            "includeAncestors", ""
+        ).lower() in ("1", "true", "yes")
 
-        # Sort combined results by current_trade_id DESC (newest first, eldest at bottom)
-        all_lineage_data.sort(
-            key=lambda x: (x.get("current_trade_id") or 0, x.get("id") or 0),
-            reverse=True,
+        # One query for every id; sorted by current_trade_id DESC (newest first,
+        # eldest at bottom) in the database
+        dao = PortfolioDAO()
+        all_lineage_data = await run_db(
+            dao.get_trade_lineage_batch,
+            original_trade_ids=list(dict.fromkeys(original_trade_ids)),
+            fund_id=fund_id,
+            include_ancestors=include_ancestors,
         )
 
-        return {
-            "status": "success",
-            "count": len(all_lineage_data),
-            "data": all_lineage_data,
-        }
+        return negotiate(
+            request,
+            {
+                "status": "success",
+                "count": len(all_lineage_data),
+                "data": all_lineage_data,
+            },
+        )
     except HTTPException:
         raise
     except Exception as e:
@@ -1006,7 +558,7 @@ async def get_fx_trade_by_id(
     """
     try:
         dao = PortfolioDAO()
-        trade = dao.get_fx_trade_by_id(trade_id)
+        trade = await run_db(dao.get_fx_trade_by_id, trade_id)
         if not trade:
             raise HTTPException(
                 status_code=404, detail=f"FX Forward trade {trade_id} not found"
@@ -1036,7 +588,7 @@ async def get_fx_option_trade_by_id(
     """
     try:
         dao = PortfolioDAO()
-        trade = dao.get_fx_option_trade_by_id(trade_id)
+        trade = await run_db(dao.get_fx_option_trade_by_id, trade_id)
         if not trade:
             raise HTTPException(
                 status_code=404, detail=f"FX Option trade {trade_id} not found"
@@ -3,7 +3,10 @@
 from fastapi import APIRouter, Depends, Request, HTTPException, Query
 from app.auth.azure_auth import validate_token
 from app.daos.transactions_dao import TransactionsDAO
-from app.daos.fx_trades_dao import FXTradesDAO
+from app.daos.fx_trades_dao import FXTradesDAO, POSITIONS_KEYSET, TRADES_KEYSET
+from app.database.connection import run_db
+from app.util.pagination import ndjson_response, next_cursor
+from app.util.response_format import negotiate
 import logging
 
 router = APIRouter(prefix="/transactions", tags=["Transactions"])
@@ -21,7 +24,12 @@ async def get_unmatched_transactions(
         current_date = request.query_params.get("currentDate")
         dao = TransactionsDAO()
         unmatched_df = dao.get_unmatched_transactions(current_date)
-        return {"status": "success", "data": unmatched_df.to_dict(orient="records")}
+        return negotiate(
+            request,
+            {"status": "success", "data": unmatched_df.to_dict(orient="records")},
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.exception(
             "[TransactionsController] Failed to fetch unmatched transactions"
@@ -40,7 +48,11 @@ async def get_all_transactions(
         current_date = request.query_params.get("currentDate")
         dao = TransactionsDAO()
         all_df = dao.get_all_transactions(current_date)
-        return {"status": "success", "data": all_df.to_dict(orient="records")}
+        return negotiate(
+            request, {"status": "success", "data": all_df.to_dict(orient="records")}
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.exception("[TransactionsController] Failed to fetch all transactions")
         raise HTTPException(status_code=500, detail=str(e))
@@ -52,25 +64,216 @@ async def get_fx_trades(
     current_user: dict = Depends(validate_token),
     limit: int = Query(100, ge=1, le=5000),
     offset: int = Query(0, ge=0),
+    cursor: str | None = Query(None),
 ):
+    """
+    Page through FX trades, latest trade_date first. Pass the next_cursor of
+    one page as cursor to get the next (keyset pagination).
+    """
     try:
-        data = FXTradesDAO().list_fx_trades(limit=limit, offset=offset)
-        return {"status": "success", "count": len(data), "data": data}
+        data = await run_db(
+            FXTradesDAO().list_fx_trades, limit=limit, offset=offset, cursor=cursor
+        )
+        return negotiate(
+            request,
+            {
+                "status": "success",
+                "count": len(data),
+                "data": data,
+                "next_cursor": next_cursor(data, limit, TRADES_KEYSET),
+            },
+        )
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.exception("[TransactionsController] Failed to fetch fx trades")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/fx-trades/stream", status_code=200)
+async def stream_fx_trades(
+    request: Request,
+    current_user: dict = Depends(validate_token),
+    cursor: str | None = Query(None),
+):
+    """Stream every FX trade (after cursor, if given) as NDJSON."""
+    try:
+        return ndjson_response(FXTradesDAO().iter_fx_trades(cursor=cursor))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @router.get("/fx-option-trades", status_code=200)
 async def get_fx_option_trades(
     request: Request,
     current_user: dict = Depends(validate_token),
     limit: int = Query(100, ge=1, le=5000),
     offset: int = Query(0, ge=0),
+    cursor: str | None = Query(None),
 ):
+    """
+    Page through FX option trades, latest trade_date first. Pass the
+    next_cursor of one page as cursor to get the next (keyset pagination).
+    """
     try:
-        data = FXTradesDAO().list_fx_option_trades(limit=limit, offset=offset)
-        return {"status": "success", "count": len(data), "data": data}
+        data = await run_db(
+            FXTradesDAO().list_fx_option_trades,
+            limit=limit,
+            offset=offset,
+            cursor=cursor,
+        )
+        return negotiate(
+            request,
+            {
+                "status": "success",
+                "count": len(data),
+                "data": data,
+                "next_cursor": next_cursor(data, limit, TRADES_KEYSET),
+            },
+        )
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.exception("[TransactionsController] Failed to fetch fx option trades")
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/fx-option-trades/stream", status_code=200)
+async def stream_fx_option_trades(
+    request: Request,
+    current_user: dict = Depends(validate_token),
+    cursor: str | None = Query(None),
+):
+    """Stream every FX option trade (after cursor, if given) as NDJSON."""
+    try:
+        return ndjson_response(FXTradesDAO().iter_fx_option_trades(cursor=cursor))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/fx-trades/positions", status_code=200)
+async def get_fx_trades_positions(
+    request: Request,
+    current_user: dict = Depends(validate_token),
+    selected_date: str = Query(..., alias="date"),
+    fund_id: int | None = Query(None, alias="fundId"),
+    limit: int = Query(1000, ge=1, le=5000),
+    offset: int = Query(0, ge=0),
+    cursor: str | None = Query(None),
+):
+    """
+    Page through FX trades maturing on or after date (fundId 0 = all funds),
+    earliest maturity first. Pass the next_cursor of one page as cursor to
+    get the next (keyset pagination).
+    """
+    try:
+        data = await run_db(
+            FXTradesDAO().list_fx_trades_positions,
+            selected_date=selected_date,
+            fund_id=fund_id,
+            limit=limit,
+            offset=offset,
+            cursor=cursor,
+        )
+        return negotiate(
+            request,
+            {
+                "status": "success",
+                "count": len(data),
+                "data": data,
+                "next_cursor": next_cursor(data, limit, POSITIONS_KEYSET),
+            },
+        )
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.exception("[TransactionsController] Failed to fetch fx trade positions")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/fx-trades/positions/stream", status_code=200)
+async def stream_fx_trades_positions(
+    request: Request,
+    current_user: dict = Depends(validate_token),
+    selected_date: str = Query(..., alias="date"),
+    fund_id: int | None = Query(None, alias="fundId"),
+    cursor: str | None = Query(None),
+):
+    """Stream every FX trade maturing on or after date (after cursor, if given) as NDJSON."""
+    try:
+        return ndjson_response(
+            FXTradesDAO().iter_fx_trades_positions(
+                selected_date=selected_date, fund_id=fund_id, cursor=cursor
+            )
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/fx-option-trades/positions", status_code=200)
+async def get_fx_option_trades_positions(
+    request: Request,
+    current_user: dict = Depends(validate_token),
+    selected_date: str = Query(..., alias="date"),
+    fund_id: int | None = Query(None, alias="fundId"),
+    limit: int = Query(1000, ge=1, le=5000),
+    offset: int = Query(0, ge=0),
+    cursor: str | None = Query(None),
+):
+    """
+    Page through FX option trades maturing on or after date (fundId 0 = all
+    funds), earliest maturity first. Pass the next_cursor of one page as
+    cursor to get the next (keyset pagination).
+    """
+    try:
+        data = await run_db(
+            FXTradesDAO().list_fx_option_trades_positions,
+            selected_date=selected_date,
+            fund_id=fund_id,
+            limit=limit,
+            offset=offset,
+            cursor=cursor,
+        )
+        return negotiate(
+            request,
+            {
+                "status": "success",
+                "count": len(data),
+                "data": data,
+                "next_cursor": next_cursor(data, limit, POSITIONS_KEYSET),
+            },
+        )
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.exception(
+            "[TransactionsController] Failed to fetch fx option trade positions"
+        )
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/fx-option-trades/positions/stream", status_code=200)
+async def stream_fx_option_trades_positions(
+    request: Request,
+    current_user: dict = Depends(validate_token),
+    selected_date: str = Query(..., alias="date"),
+    fund_id: int | None = Query(None, alias="fundId"),
+    cursor: str | None = Query(None),
+):
+    """Stream every FX option trade maturing on or after date (after cursor, if given) as NDJSON."""
+    try:
+        return ndjson_response(
+            FXTradesDAO().iter_fx_option_trades_positions(
+                selected_date=selected_date, fund_id=fund_id, cursor=cursor
+            )
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
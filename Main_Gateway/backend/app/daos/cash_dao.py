@@ -1,4 +1,5 @@
-from app.database.connection import engine
+from app.database.connection import engine, stream_rows
+from app.util.pagination import check_offset, decode_cursor
 from sqlalchemy import text
 import pandas as pd
 from app.util.logger import get_logger
@@ -7,6 +8,9 @@ import random
 
 logger = get_logger(__name__)
 
+# Sort key for keyset pagination of list_cash_transactions
+CASH_TRANSACTIONS_KEYSET = ("id",)
+
 
 class CashDAO:
     """Handles database operations for cash using raw SQL.
@@ -96,13 +100,10 @@ class CashDAO:
                 pt.price AS parent_trade_price,
                 pt.quantity AS parent_trade_quantity
             FROM public.gzc_fx_trade t
-            LEFT JOIN LATERAL (
-                SELECT l.*
-                FROM public.gzc_fx_trade_lineage l
-                WHERE l.current_trade_id = t.trade_id
-                ORDER BY l.operation_timestamp DESC, l.id DESC
-                LIMIT 1
-            ) ln ON TRUE
+            LEFT JOIN public.gzc_fx_trade_latest_lineage latest
+                ON latest.current_trade_id = t.trade_id
+            LEFT JOIN public.gzc_fx_trade_lineage ln
+                ON ln.id = latest.lineage_id
             LEFT JOIN public.gzc_fx_trade ot
                 ON ot.trade_id = ln.original_trade_id
             LEFT JOIN public.gzc_fx_trade_lineage pln
@@ -155,13 +156,10 @@ class CashDAO:
                 pt.premium AS parent_trade_price,
                 pt.quantity AS parent_trade_quantity
             FROM public.gzc_fx_option_trade t
-            LEFT JOIN LATERAL (
-                SELECT l.*
-                FROM public.gzc_fx_option_trade_lineage l
-                WHERE l.current_trade_id = t.trade_id
-                ORDER BY l.operation_timestamp DESC, l.id DESC
-                LIMIT 1
-            ) ln ON TRUE
+            LEFT JOIN public.gzc_fx_option_trade_latest_lineage latest
+                ON latest.current_trade_id = t.trade_id
+            LEFT JOIN public.gzc_fx_option_trade_lineage ln
+                ON ln.id = latest.lineage_id
             LEFT JOIN public.gzc_fx_option_trade ot
                 ON ot.trade_id = ln.original_trade_id
             LEFT JOIN public.gzc_fx_option_trade_lineage pln
@@ -246,20 +244,38 @@ class CashDAO:
         self,
         limit: int = 5000,
         offset: int = 0,
+        cursor: str | None = None,
     ):
         """
         Return raw cash transactions from public.gzc_cash_transactions.
         Keeping selection generic (SELECT *) to avoid schema coupling.
+        cursor is a keyset cursor on CASH_TRANSACTIONS_KEYSET (see app.util.pagination).
         """
-        query = text("""
-            SELECT *
-            FROM public.gzc_cash_transactions
-            ORDER BY id DESC
-            LIMIT :limit OFFSET :offset
-        """)
-        params = {"limit": limit, "offset": offset}
+        query, params = self._cash_transactions_query(cursor, limit, offset)
         with self.engine.connect() as conn:
             rows = conn.execute(query, params).mappings().all()
             return [dict(r) for r in rows]
 
+    def iter_cash_transactions(self, cursor: str | None = None):
+        """Stream every cash transaction after cursor from a server-side cursor."""
+        query, params = self._cash_transactions_query(cursor)
+        return stream_rows(query, params)
+
+    @staticmethod
+    def _cash_transactions_query(cursor: str | None, limit=None, offset: int = 0):
+        check_offset(cursor, offset)
+        sql = """
+            SELECT *
+            FROM public.gzc_cash_transactions
+        """
+        params: dict[str, object] = {}
+        if cursor:
+            params.update(decode_cursor(cursor, CASH_TRANSACTIONS_KEYSET))
+            sql += " WHERE id < :after_id"
+        sql += " ORDER BY id DESC"
+        if limit is not None:
+            sql += " LIMIT :limit OFFSET :offset"
+            params.update(limit=limit, offset=offset)
+        return text(sql), params
+
 
@@ -1,64 +1,118 @@
 from sqlalchemy import text
-from app.database.connection import engine
+from app.database.connection import engine, stream_rows
+from app.util.pagination import check_offset, decode_cursor
 
+# Sort keys for keyset pagination; each matches its query's ORDER BY and an
+# index from migrations/009_create_keyset_pagination_indexes.sql
+TRADES_KEYSET = ("trade_date", "trade_id")
+POSITIONS_KEYSET = ("maturity_date", "trade_id")
 
-class FXTradesDAO:
-    def list_fx_trades(self, limit: int = 1000, offset: int = 0):
-        query = text(
-            """
-            SELECT * FROM public.gzc_fx_trade
-            ORDER BY trade_date DESC, trade_id DESC
-            LIMIT :limit OFFSET :offset
-            """
+
+def _trades_query(table: str, limit, offset: int, cursor: str | None):
+    check_offset(cursor, offset)
+    sql = f"SELECT * FROM public.{table}"
+    params: dict[str, object] = {}
+    if cursor:
+        params.update(decode_cursor(cursor, TRADES_KEYSET, nullable=("trade_date",)))
+        if params["after_trade_date"] is None:
+            # Still among the undated trades, which sort first
+            sql += (
+                " WHERE (trade_date IS NULL AND trade_id < :after_trade_id)"
+                " OR trade_date IS NOT NULL"
+            )
+        else:
+            # Undated trades sort before any dated cursor, so the row
+            # comparison rightly leaves them out
+            sql += (
+                " WHERE (trade_date, trade_id) < (:after_trade_date, :after_trade_id)"
+            )
+    sql += " ORDER BY trade_date DESC NULLS FIRST, trade_id DESC"
+    if limit is not None:
+        sql += " LIMIT :limit OFFSET :offset"
+        params.update(limit=limit, offset=offset)
+    return text(sql), params
+
+
+def _positions_query(
+    table: str,
+    selected_date: str,
+    fund_id: int | None,
+    limit,
+    offset: int,
+    cursor: str | None,
+):
+    # maturity_date >= :selected_date excludes NULL maturities, so the
+    # cursor's maturity_date is never null
+    check_offset(cursor, offset)
+    sql = f"""
+        SELECT *
+        FROM public.{table}
+        WHERE maturity_date >= :selected_date
+    """
+    params: dict[str, object] = {"selected_date": selected_date}
+    if fund_id is not None and fund_id != 0:
+        sql += " AND fund_id = :fund_id"
+        params["fund_id"] = fund_id
+    if cursor:
+        # maturity_date ASC, trade_id DESC: mixed directions, so no row comparison
+        params.update(decode_cursor(cursor, POSITIONS_KEYSET))
+        sql += (
+            " AND (maturity_date > :after_maturity_date"
+            " OR (maturity_date = :after_maturity_date AND trade_id < :after_trade_id))"
         )
+    sql += " ORDER BY maturity_date ASC, trade_id DESC"
+    if limit is not None:
+        sql += " LIMIT :limit OFFSET :offset"
+        params.update(limit=limit, offset=offset)
+    return text(sql), params
+
+
+class FXTradesDAO:
+    """
+    List methods page with limit/offset and/or a keyset cursor (see
+    app.util.pagination); iter_* methods stream every matching row from a
+    server-side cursor. A malformed cursor raises ValueError.
+    """
+
+    def list_fx_trades(
+        self, limit: int = 1000, offset: int = 0, cursor: str | None = None
+    ):
+        query, params = _trades_query("gzc_fx_trade", limit, offset, cursor)
         with engine.connect() as conn:
-            rows = (
-                conn.execute(query, {"limit": limit, "offset": offset}).mappings().all()
-            )
+            rows = conn.execute(query, params).mappings().all()
             return [dict(r) for r in rows]
 
-    def list_fx_option_trades(self, limit: int = 1000, offset: int = 0):
-        query = text(
-            """
-            SELECT * FROM public.gzc_fx_option_trade
-            ORDER BY trade_date DESC, trade_id DESC
-            LIMIT :limit OFFSET :offset
-            """
-        )
+    def list_fx_option_trades(
+        self, limit: int = 1000, offset: int = 0, cursor: str | None = None
+    ):
+        query, params = _trades_query("gzc_fx_option_trade", limit, offset, cursor)
         with engine.connect() as conn:
-            rows = (
-                conn.execute(query, {"limit": limit, "offset": offset}).mappings().all()
-            )
+            rows = conn.execute(query, params).mappings().all()
             return [dict(r) for r in rows]
 
+    def iter_fx_trades(self, cursor: str | None = None):
+        query, params = _trades_query("gzc_fx_trade", None, 0, cursor)
+        return stream_rows(query, params)
+
+    def iter_fx_option_trades(self, cursor: str | None = None):
+        query, params = _trades_query("gzc_fx_option_trade", None, 0, cursor)
+        return stream_rows(query, params)
+
     def list_fx_trades_positions(
         self,
         selected_date: str,
         fund_id: int | None = None,
         limit: int = 5000,
         offset: int = 0,
+        cursor: str | None = None,
     ):
         """
         Return FX trades where maturity_date >= selected_date.
         If fund_id is provided and not 0, filter by fund_id as well.
         """
-        base_sql = """
-            SELECT *
-            FROM public.gzc_fx_trade
-            WHERE maturity_date >= :selected_date
-        """
-        params: dict[str, object] = {
-            "selected_date": selected_date,
-            "limit": limit,
-            "offset": offset,
-        }
-        if fund_id is not None and fund_id != 0:
-            base_sql += " AND fund_id = :fund_id"
-            params["fund_id"] = fund_id
-        base_sql += (
-            " ORDER BY maturity_date ASC, trade_id DESC LIMIT :limit OFFSET :offset"
+        query, params = _positions_query(
+            "gzc_fx_trade", selected_date, fund_id, limit, offset, cursor
         )
-        query = text(base_sql)
         with engine.connect() as conn:
             rows = conn.execute(query, params).mappings().all()
             return [dict(r) for r in rows]
@@ -69,28 +123,39 @@ class FXTradesDAO:
         fund_id: int | None = None,
         limit: int = 5000,
         offset: int = 0,
+        cursor: str | None = None,
     ):
         """
         Return FX option trades where maturity_date >= selected_date.
         If fund_id is provided and not 0, filter by fund_id as well.
         """
-        base_sql = """
-            SELECT *
-            FROM public.gzc_fx_option_trade
-            WHERE maturity_date >= :selected_date
-        """
-        params: dict[str, object] = {
-            "selected_date": selected_date,
-            "limit": limit,
-            "offset": offset,
-        }
-        if fund_id is not None and fund_id != 0:
-            base_sql += " AND fund_id = :fund_id"
-            params["fund_id"] = fund_id
-        base_sql += (
-            " ORDER BY maturity_date ASC, trade_id DESC LIMIT :limit OFFSET :offset"
+        query, params = _positions_query(
+            "gzc_fx_option_trade", selected_date, fund_id, limit, offset, cursor
         )
-        query = text(base_sql)
         with engine.connect() as conn:
             rows = conn.execute(query, params).mappings().all()
             return [dict(r) for r in rows]
+
+    def iter_fx_trades_positions(
+        self,
+        selected_date: str,
+        fund_id: int | None = None,
+        cursor: str | None = None,
+    ):
+        """Stream every FX trade list_fx_trades_positions would page through."""
+        query, params = _positions_query(
+            "gzc_fx_trade", selected_date, fund_id, None, 0, cursor
+        )
+        return stream_rows(query, params)
+
+    def iter_fx_option_trades_positions(
+        self,
+        selected_date: str,
+        fund_id: int | None = None,
+        cursor: str | None = None,
+    ):
+        """Stream every FX option trade list_fx_option_trades_positions would page through."""
+        query, params = _positions_query(
+            "gzc_fx_option_trade", selected_date, fund_id, None, 0, cursor
+        )
+        return stream_rows(query, params)
@@ -149,14 +149,11 @@ class PortfolioDAO:
                 pt.price AS parent_trade_price,
                 pt.quantity AS parent_trade_quantity
             FROM public.gzc_fx_trade t
-            -- Latest lineage row for this trade (if any) by current_trade_id
-            LEFT JOIN LATERAL (
-                SELECT l.*
-                FROM public.gzc_fx_trade_lineage l
-                WHERE l.current_trade_id = t.trade_id
-                ORDER BY l.operation_timestamp DESC, l.id DESC
-                LIMIT 1
-            ) ln ON TRUE
+            -- Latest lineage row for this trade (if any), maintained by trigger (migration 008)
+            LEFT JOIN public.gzc_fx_trade_latest_lineage latest
+                ON latest.current_trade_id = t.trade_id
+            LEFT JOIN public.gzc_fx_trade_lineage ln
+                ON ln.id = latest.lineage_id
             -- Original trade referenced by lineage (if present)
             LEFT JOIN public.gzc_fx_trade ot
                 ON ot.trade_id = ln.original_trade_id
@@ -212,14 +209,11 @@ class PortfolioDAO:
                 pt.premium AS parent_trade_price,
                 pt.quantity AS parent_trade_quantity
             FROM public.gzc_fx_option_trade t
-            -- Latest lineage row for this option trade (if any) by current_trade_id
-            LEFT JOIN LATERAL (
-                SELECT l.*
-                FROM public.gzc_fx_option_trade_lineage l
-                WHERE l.current_trade_id = t.trade_id
-                ORDER BY l.operation_timestamp DESC, l.id DESC
-                LIMIT 1
-            ) ln ON TRUE
+            -- Latest lineage row for this trade (if any), maintained by trigger (migration 008)
+            LEFT JOIN public.gzc_fx_option_trade_latest_lineage latest
+                ON latest.current_trade_id = t.trade_id
+            LEFT JOIN public.gzc_fx_option_trade_lineage ln
+                ON ln.id = latest.lineage_id
             -- Original option trade referenced by lineage (if present)
             LEFT JOIN public.gzc_fx_option_trade ot
                 ON ot.trade_id = ln.original_trade_id
@@ -281,53 +275,64 @@ class PortfolioDAO:
         """
         Return all trade lineage records for a given original_trade_id.
         If fund_id is provided and not 0, filter by fund_id.
-        Results are sorted by operation_timestamp DESC (latest first).
         """
-        params: dict[str, object] = {"original_trade_id": original_trade_id}
+        return self.get_trade_lineage_batch([original_trade_id], fund_id=fund_id)
 
+    def get_trade_lineage_batch(
+        self,
+        original_trade_ids: list[int],
+        fund_id: int | None = None,
+        include_ancestors: bool = False,
+    ):
+        """
+        Return trade lineage records for any of original_trade_ids in one query.
+        If fund_id is provided and not 0, filter by fund_id.
+        If include_ancestors is set, the parent_lineage_id chain of every matching
+        record is followed to its root (recursive CTE) and included as well,
+        whatever its original_trade_id or fund.
+        Results are sorted by current_trade_id DESC, id DESC (newest first,
+        records without a current trade last).
+        """
+        params: dict[str, object] = {"original_trade_ids": list(original_trade_ids)}
+        seed_sql = """
+                    SELECT l.*
+                    FROM public.gzc_fx_trade_lineage l
+                    WHERE l.original_trade_id = ANY(:original_trade_ids)"""
         # Filter by fund_id if provided and not 0 (0 means "all funds")
         if fund_id is not None and fund_id != 0:
-            query = text("""
-                SELECT
-                    l.id,
-                    l.current_trade_id,
-                    l.parent_lineage_id,
-                    l.original_trade_id,
-                    l.operation,
-                    l.operation_timestamp,
-                    l.quantity_delta,
-                    l.notes,
-                    l.fund_id,
-                    l.mod_user,
-                    l.mod_timestamp,
-                    f."FundNameShort" AS fund_short_name
-                FROM public.gzc_fx_trade_lineage l
-                LEFT JOIN public.gzc_fund f ON f."Id" = l.fund_id
-                WHERE l.original_trade_id = :original_trade_id
-                  AND l.fund_id = :fund_id
-                ORDER BY l.current_trade_id DESC, l.id DESC
-            """)
+            seed_sql += " AND l.fund_id = :fund_id"
             params["fund_id"] = fund_id
+
+        if include_ancestors:
+            # UNION (not UNION ALL) drops rows already reached, which also ends cycles
+            source_sql = f"""WITH RECURSIVE chain AS ({seed_sql}
+                    UNION
+                    SELECT p.*
+                    FROM public.gzc_fx_trade_lineage p
+                    JOIN chain c ON p.id = c.parent_lineage_id
+                )"""
         else:
-            query = text("""
-                SELECT
-                    l.id,
-                    l.current_trade_id,
-                    l.parent_lineage_id,
-                    l.original_trade_id,
-                    l.operation,
-                    l.operation_timestamp,
-                    l.quantity_delta,
-                    l.notes,
-                    l.fund_id,
-                    l.mod_user,
-                    l.mod_timestamp,
-                    f."FundNameShort" AS fund_short_name
-                FROM public.gzc_fx_trade_lineage l
-                LEFT JOIN public.gzc_fund f ON f."Id" = l.fund_id
-                WHERE l.original_trade_id = :original_trade_id
-                ORDER BY l.current_trade_id DESC, l.id DESC
-            """)
+            source_sql = f"WITH chain AS ({seed_sql}\n                )"
+
+        query = text(f"""
+            {source_sql}
+            SELECT
+                l.id,
+                l.current_trade_id,
+                l.parent_lineage_id,
+                l.original_trade_id,
+                l.operation,
+                l.operation_timestamp,
+                l.quantity_delta,
+                l.notes,
+                l.fund_id,
+                l.mod_user,
+                l.mod_timestamp,
+                f."FundNameShort" AS fund_short_name
+            FROM chain l
+            LEFT JOIN public.gzc_fund f ON f."Id" = l.fund_id
+            ORDER BY COALESCE(l.current_trade_id, 0) DESC, l.id DESC
+        """)
 
         with self.engine.connect() as conn:
             rows = conn.execute(query, params).mappings().all()
@@ -0,0 +1,95 @@
+"""
+Plan checks for the position queries joined on the latest-lineage tables
+(migrations/008_create_latest_lineage_tables.sql).
+
+Each query is run through EXPLAIN (FORMAT JSON) against the gateway database
+and must not fetch the latest lineage row per trade: no Sort or Limit over a
+lineage table may run once per outer row. Skipped unless a database is
+configured through the POSTGRES_* environment variables.
+"""
+import os
+from datetime import date
+
+import pytest
+
+if not any(
+    os.getenv(name)
+    for name in ("POSTGRES_PLATFORM_HOST", "POSTGRES_STAGING_HOST", "POSTGRES_HOST")
+):
+    pytest.skip("no PostgreSQL database configured", allow_module_level=True)
+
+from sqlalchemy import event
+
+from app.daos.cash_dao import CashDAO
+from app.daos.portfolio_dao import PortfolioDAO
+from app.database.connection import engine
+
+QUERIES = [
+    (PortfolioDAO, "get_fx_positions", "gzc_fx_trade"),
+    (PortfolioDAO, "get_fx_option_positions", "gzc_fx_option_trade"),
+    (CashDAO, "get_fx_positions", "gzc_fx_trade"),
+    (CashDAO, "get_fx_option_positions", "gzc_fx_option_trade"),
+]
+
+
+@pytest.fixture
+def explain():
+    """Run every statement on engine as EXPLAIN (FORMAT JSON) while active."""
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        return f"EXPLAIN (FORMAT JSON) {statement}", parameters
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute, retval=True)
+    yield
+    event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def _relations(node):
+    """Relation names scanned anywhere under node."""
+    names = {node["Relation Name"]} if "Relation Name" in node else set()
+    for child in node.get("Plans", ()):
+        names |= _relations(child)
+    return names
+
+
+def _per_trade_lineage_nodes(node, trade_table, repeated=False):
+    """
+    Sort and Limit nodes that read only lineage tables and run once per outer
+    row: any such Limit, or a Sort on the inner side of a Nested Loop or in a
+    SubPlan.
+    """
+    found = []
+    if node["Node Type"] in ("Sort", "Limit"):
+        relations = _relations(node)
+        lineage_only = trade_table not in relations and any(
+            name.endswith("_lineage") for name in relations
+        )
+        if lineage_only and (node["Node Type"] == "Limit" or repeated):
+            found.append(node)
+    for child in node.get("Plans", ()):
+        child_repeated = (
+            repeated
+            or child.get("Parent Relationship") == "SubPlan"
+            or (
+                node["Node Type"] == "Nested Loop"
+                and child.get("Parent Relationship") == "Inner"
+            )
+        )
+        found += _per_trade_lineage_nodes(child, trade_table, child_repeated)
+    return found
+
+
+@pytest.mark.parametrize(
+    "dao_class, method, trade_table",
+    QUERIES,
+    ids=[f"{dao.__name__}.{method}" for dao, method, _ in QUERIES],
+)
+@pytest.mark.parametrize("fund_id", [None, 1])
+def test_latest_lineage_join_has_no_per_trade_sort(
+    explain, dao_class, method, trade_table, fund_id
+):
+    rows = getattr(dao_class(), method)(date.today().isoformat(), fund_id=fund_id)
+    plan = rows[0]["QUERY PLAN"][0]["Plan"]
+
+    assert f"{trade_table}_latest_lineage" in _relations(plan)
+    assert _per_trade_lineage_nodes(plan, trade_table) == []
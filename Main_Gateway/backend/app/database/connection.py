@@ -1,6 +1,9 @@
 from sqlalchemy import create_engine
 from sqlalchemy.engine import Engine
+import asyncio
+import functools
 import os
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -40,4 +43,44 @@ DATABASE_URL = f"postgresql+psycopg2://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{
 print(
     f"Connecting to PostgreSQL as: {DB_USER.split('@')[0] if '@' in DB_USER else DB_USER}"
 )
-engine: Engine = create_engine(DATABASE_URL)
+
+# Connection pool and the executor that runs blocking queries for async
+# endpoints are sized together: one worker per connection the pool can open,
+# so queries wait in the executor queue rather than for a connection.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "5"))
+engine: Engine = create_engine(
+    DATABASE_URL,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_pre_ping=True,
+)
+db_executor = ThreadPoolExecutor(
+    max_workers=DB_POOL_SIZE + DB_MAX_OVERFLOW, thread_name_prefix="db"
+)
+
+
+async def run_db(func, *args, **kwargs):
+    """
+    Run a blocking DAO call (or other blocking work on its results, such as
+    position valuation) on db_executor and await its result, so the event
+    loop keeps serving other requests and WebSockets meanwhile.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        db_executor, functools.partial(func, *args, **kwargs)
+    )
+
+
+def stream_rows(query, params: dict | None = None, batch_size: int = 1000):
+    """
+    Yield the rows of query as dicts from a server-side cursor, fetching
+    batch_size rows at a time, so memory stays flat however many rows match.
+    The connection is held until the generator is exhausted or closed.
+    """
+    with engine.connect() as conn:
+        result = conn.execution_options(yield_per=batch_size).execute(
+            query, params or {}
+        )
+        for row in result.mappings():
+            yield dict(row)
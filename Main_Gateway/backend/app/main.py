@@ -14,6 +14,7 @@ from app.controllers import (
 )
 from app.util.logger import configure_logging, get_logger
 from app.services.azure_managed_identity import get_azure_service
+from app.services.pricer_client import close_pricer_client
 import os
 from dotenv import load_dotenv
 import asyncio
@@ -41,8 +42,6 @@ async def lifespan(app: FastAPI):
     else:
         logger.warning("Database initialization had issues - continuing anyway")
 
-    # Delay to ensure event loop is fully initialized
-    await asyncio.sleep(0.5)
     fix_controller.FixController.start_microservice_stream(
         os.getenv("ESP_STREAM_URL", "ws://localhost:5100/ws_esp"),
         fix_controller.FixController.esp_clients,
@@ -58,13 +57,20 @@ async def lifespan(app: FastAPI):
         fix_controller.FixController.exec_clients,
         stream=fix_controller.FixController.EXEC,
     )
+    rfs_expiry = asyncio.create_task(
+        fix_controller.FixController.expire_rfs_quote_ids_periodically()
+    )
     logger.info("FastAPI application initialized")
     yield
 
+    rfs_expiry.cancel()
+    await fix_controller.FixController.stop_microservice_streams()
+
     # Cleanup on shutdown
     if hasattr(app.state, "azure_service"):
         await app.state.azure_service.close()
         logger.info("Azure Managed Identity Service closed")
+    await close_pricer_client()
 
 
 app = FastAPI(title="GZC Portfolio API", version="1.0", lifespan=lifespan)
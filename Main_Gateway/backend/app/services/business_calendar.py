@@ -0,0 +1,260 @@
+"""
+Business-day calendars per currency, precomputed as arrays so every lookup
+is a couple of array reads.
+
+Holidays come from the CSV file named by HOLIDAY_CALENDAR_FILE, one
+"currency,date" row per holiday (date as YYYY-MM-DD, header optional). The file
+is read once per process; without it, calendars are weekends-only. A currency
+pair's calendar closes on either currency's holidays.
+
+The same module is in FSS_Socket (app/util) and Main_Gateway (app/services);
+keep the two copies in step (scripts/check_shared_modules.py fails when they
+differ).
+"""
+
+import csv
+import logging
+import os
+import threading
+from calendar import monthrange
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_FIRST_DAY = date(1970, 1, 1)
+_END_DAY = date(2200, 1, 1)
+_EPOCH = np.datetime64(_FIRST_DAY.isoformat(), "D")
+_EPOCH_ORDINAL = _FIRST_DAY.toordinal()
+_DAYS = _END_DAY.toordinal() - _EPOCH_ORDINAL
+
+
+def _to_date(value) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if isinstance(value, np.datetime64):
+        return date.fromordinal(int(value.astype("datetime64[D]").astype(np.int64)) + _EPOCH_ORDINAL)
+    text = str(value).strip()
+    if len(text) == 8 and text.isdigit():  # FIX LocalMktDate, YYYYMMDD
+        return datetime.strptime(text, "%Y%m%d").date()
+    return datetime.strptime(text[:10].replace("/", "-"), "%Y-%m-%d").date()
+
+
+class BusinessCalendar:
+    """
+    Business days between 1970 and 2199 for one set of holidays.
+
+    Rolls and business-day offsets are O(1); the bulk_* methods take and
+    return numpy datetime64[D] arrays for whole position lists.
+    """
+
+    def __init__(self, holidays=(), weekend=(5, 6)):
+        # 1970-01-01 was a Thursday (weekday 3)
+        weekday = (np.arange(_DAYS, dtype=np.int64) + 3) % 7
+        is_business = ~np.isin(weekday, weekend)
+        for holiday in holidays:
+            day = _to_date(holiday).toordinal() - _EPOCH_ORDINAL
+            if 0 <= day < _DAYS:
+                is_business[day] = False
+        self.holidays = frozenset(_to_date(h) for h in holidays)
+        self._is_business = is_business
+        # Business days on or before each day, and the day number of the n-th business day
+        self._count = np.cumsum(is_business, dtype=np.int32)
+        self._business_days = np.flatnonzero(is_business).astype(np.int32)
+
+    # -- single dates --
+
+    def is_business_day(self, d) -> bool:
+        return bool(self._is_business[self._day(d)])
+
+    def roll_back(self, d) -> date:
+        """d if it is a business day, else the business day before it."""
+        return self._date(self._business_days[self._count[self._day(d)] - 1])
+
+    def roll_forward(self, d) -> date:
+        """d if it is a business day, else the business day after it."""
+        day = self._day(d)
+        return self._date(self._business_days[self._count[day] - self._is_business[day]])
+
+    def modified_following(self, d) -> date:
+        """Roll forward, unless that leaves the month; then roll back."""
+        d = _to_date(d)
+        rolled = self.roll_forward(d)
+        return rolled if rolled.month == d.month else self.roll_back(d)
+
+    def add_business_days(self, d, n: int) -> date:
+        """The n-th business day after d (before it, if n is negative)."""
+        day = self._day(d)
+        if n >= 0:
+            return self._date(self._business_days[self._count[day] - 1 + n])
+        return self._date(self._business_days[self._count[day] - self._is_business[day] + n])
+
+    def prev_business_day(self, d) -> date:
+        return self.add_business_days(d, -1)
+
+    def next_business_day(self, d) -> date:
+        return self.add_business_days(d, 1)
+
+    def end_of_month(self, d) -> date:
+        """Last business day of d's month."""
+        d = _to_date(d)
+        return self.roll_back(date(d.year, d.month, monthrange(d.year, d.month)[1]))
+
+    def end_of_previous_year(self, d) -> date:
+        """Last business day of the year before d's."""
+        return self.roll_back(date(_to_date(d).year - 1, 12, 31))
+
+    def spot_date(self, trade_date, spot_lag: int = 2) -> date:
+        return self.add_business_days(self.roll_forward(trade_date), spot_lag)
+
+    def tenor_date(self, tenor: str, trade_date, spot_lag: int = 2) -> date:
+        """
+        Value date of a tenor traded on trade_date:
+        TD/ON today, TOM/TN T+1, SP spot, SN spot+1, then Wn, Mn and Yn from
+        spot (M1, 1M, ...). Month and year tenors are modified following,
+        and a spot on its month's last business day maps to month end.
+        """
+        tenor = tenor.upper().strip()
+        today = self.roll_forward(trade_date)
+        if tenor in ("TD", "ON"):
+            return today
+        if tenor in ("TOM", "TN"):
+            return self.add_business_days(today, 1)
+        spot = self.add_business_days(today, spot_lag)
+        if tenor in ("SP", "SPOT"):
+            return spot
+        if tenor == "SN":
+            return self.add_business_days(spot, 1)
+
+        unit, count = _parse_tenor(tenor)
+        if unit == "D":
+            return self.add_business_days(spot, count)
+        if unit == "W":
+            return self.roll_forward(spot + timedelta(weeks=count))
+        months = count * (12 if unit == "Y" else 1)
+        year, month = divmod(spot.month - 1 + months, 12)
+        year += spot.year
+        month += 1
+        if spot == self.end_of_month(spot):
+            return self.end_of_month(date(year, month, 1))
+        day = min(spot.day, monthrange(year, month)[1])
+        return self.modified_following(date(year, month, day))
+
+    def fixing_date(self, settlement_date, fixing_lag: int = 2) -> date:
+        """NDF fixing date: fixing_lag business days before settlement."""
+        return self.add_business_days(settlement_date, -fixing_lag)
+
+    # -- bulk --
+
+    def bulk_roll_back(self, dates) -> np.ndarray:
+        days = self._days(dates)
+        return self._dates(self._business_days[self._count[days] - 1])
+
+    def bulk_prev_business_day(self, dates) -> np.ndarray:
+        days = self._days(dates)
+        return self._dates(self._business_days[self._count[days] - self._is_business[days] - 1])
+
+    def bulk_add_business_days(self, dates, n) -> np.ndarray:
+        days = self._days(dates)
+        n = np.asarray(n, dtype=np.int64)
+        base = np.where(n >= 0, self._count[days] - 1, self._count[days] - self._is_business[days])
+        return self._dates(self._business_days[base + n])
+
+    def bulk_end_of_month(self, dates) -> np.ndarray:
+        month = np.asarray(dates, dtype="datetime64[D]").astype("datetime64[M]")
+        last = (month + 1).astype("datetime64[D]") - 1
+        return self.bulk_roll_back(last)
+
+    # -- helpers --
+
+    @staticmethod
+    def _day(d) -> int:
+        day = _to_date(d).toordinal() - _EPOCH_ORDINAL
+        if not 0 < day < _DAYS - 31:
+            raise ValueError(f"Date outside business calendar range: {d}")
+        return day
+
+    @staticmethod
+    def _days(dates) -> np.ndarray:
+        days = (np.asarray(dates, dtype="datetime64[D]") - _EPOCH).astype(np.int64)
+        if days.size and (days.min() <= 0 or days.max() >= _DAYS - 31):
+            raise ValueError("Dates outside business calendar range")
+        return days
+
+    @staticmethod
+    def _date(day) -> date:
+        return date.fromordinal(int(day) + _EPOCH_ORDINAL)
+
+    @staticmethod
+    def _dates(days) -> np.ndarray:
+        return _EPOCH + days.astype("timedelta64[D]")
+
+
+def _parse_tenor(tenor: str) -> tuple[str, int]:
+    # FIX SettlType style ("M1", "W2", "Y1") or market style ("1M", "2W", "1Y")
+    if tenor[:1] in "DWMY" and tenor[1:].isdigit():
+        return tenor[0], int(tenor[1:])
+    if tenor[-1:] in "DWMY" and tenor[:-1].isdigit():
+        return tenor[-1], int(tenor[:-1])
+    raise ValueError(f"Unsupported tenor: {tenor}")
+
+
+_holidays: dict[str, set] | None = None
+_calendars: dict[frozenset, BusinessCalendar] = {}
+_lock = threading.Lock()
+
+
+def _load_holidays() -> dict[str, set]:
+    path = os.getenv("HOLIDAY_CALENDAR_FILE", "")
+    holidays: dict[str, set] = {}
+    if not path:
+        return holidays
+    try:
+        with open(path, newline="") as f:
+            for row in csv.reader(f):
+                if len(row) < 2 or not row[0].strip() or row[0].strip().lower() == "currency":
+                    continue
+                holidays.setdefault(row[0].strip().upper(), set()).add(_to_date(row[1].strip()))
+        logger.info(
+            f"Loaded {sum(len(v) for v in holidays.values())} holidays "
+            f"for {len(holidays)} currencies from {path}"
+        )
+    except Exception as e:
+        logger.warning(f"Could not load holiday calendar {path}, using weekends only: {e}")
+    return holidays
+
+
+def get_calendar(currencies=None) -> BusinessCalendar:
+    """
+    Business calendar closed on the holidays of every currency given, built
+    once per set and kept in memory. currencies is a pair ("EUR/USD",
+    "EURUSD"), a currency code, comma-separated codes, or an iterable of
+    codes; None is weekends only.
+    """
+    global _holidays
+
+    if currencies is None:
+        codes = frozenset()
+    elif isinstance(currencies, str) and "," in currencies:
+        codes = frozenset(c.strip().upper() for c in currencies.split(",") if c.strip())
+    elif isinstance(currencies, str):
+        s = currencies.replace("/", "").replace("-", "").upper().strip()
+        codes = frozenset({s[:3], s[3:6]}) if len(s) == 6 else frozenset({s})
+    else:
+        codes = frozenset(c.upper() for c in currencies)
+
+    calendar = _calendars.get(codes)
+    if calendar is not None:
+        return calendar
+    with _lock:
+        if _holidays is None:
+            _holidays = _load_holidays()
+        calendar = _calendars.get(codes)
+        if calendar is None:
+            holidays = set().union(*(_holidays.get(c, ()) for c in codes))
+            calendar = BusinessCalendar(holidays)
+            _calendars[codes] = calendar
+        return calendar
@@ -0,0 +1,427 @@
+"""
+Live FX forward PnL driven by the ESP quote stream.
+
+Positions are valued once per fund the same way as /api/portfolio/fx-positions,
+with reference prices (trade, EOY, EOM, EOD) and today's pricer price. After
+that each ESP spot quote moves the live price of the positions on its currency
+pair by the change in spot since the first quote seen, and their
+ITD/YTD/MTD/DTD PnL is recomputed for those positions only.
+
+Quotes are cached per (symbol, provider, quantity), so a bid and an ask are
+only ever paired when they come from the same provider and size tier. The
+spot mid of a symbol is taken from its tightest two-sided pair quoted within
+the last max_quote_age_s seconds, optionally restricted to one provider
+and/or tier (LIVE_PNL_PROVIDER, LIVE_PNL_QUANTITY). A symbol with no such pair
+leaves its positions where they are. Subscribers of
+/ws_pnl get one snapshot and then, at most every throttle interval, the rows
+that changed.
+"""
+
+import asyncio
+import json
+import os
+import time
+from datetime import date
+from typing import Optional
+
+import numpy as np
+from fastapi import WebSocket
+
+from app.daos.portfolio_dao import PortfolioDAO
+from app.database.connection import run_db
+from app.services.business_calendar import get_calendar
+from app.services.position_valuation import FX_FORWARD, PositionValuationEngine
+from app.services.pricing_cache import get_pricing_cache
+from app.util.client_sender import DROP_OLDEST, ClientSender
+from app.util.logger import get_logger
+
+logger = get_logger(__name__)
+
+_PNL_FIELDS = ("price", "itd_pnl", "ytd_pnl", "mtd_pnl", "dtd_pnl")
+_REF_FIELDS = {
+    "itd_pnl": "trade_price",
+    "ytd_pnl": "eoy_price",
+    "mtd_pnl": "eom_price",
+    "dtd_pnl": "eod_price",
+}
+_SPOT_SETTLEMENTS = ("SP", "SPOT")
+
+
+def _floats(rows: list[dict], field: str) -> np.ndarray:
+    values = np.full(len(rows), np.nan)
+    for i, row in enumerate(rows):
+        try:
+            values[i] = float(row.get(field))
+        except (TypeError, ValueError):
+            pass
+    return values
+
+
+def _pnl(value: float):
+    return None if np.isnan(value) else float(value)
+
+
+class _PositionBook:
+    """Valued positions of one fund, with per-symbol row indexes for tick updates."""
+
+    def __init__(self, fund_id: int, today: date, rows: list[dict]):
+        self.fund_id = fund_id
+        self.today = today
+        self.rows = rows
+        self.loaded_at = time.monotonic()
+        self.dirty: set[int] = set()
+
+        # Signed exposure: the engine's PnL is (price - ref) * quantity * direction
+        direction = np.array(
+            [1.0 if str(r.get("position") or "").strip().lower() == "buy" else -1.0 for r in rows]
+        )
+        self.exposure = np.nan_to_num(_floats(rows, "quantity")) * direction
+        self.refs = {field: _floats(rows, ref) for field, ref in _REF_FIELDS.items()}
+        base = _floats(rows, "price")
+        self.base_price = np.where(base > 0, base, np.nan)
+
+        # "EUR/USD" -> (row indexes, True where the row is quoted the other way round)
+        by_symbol: dict[str, tuple[list[int], list[bool]]] = {}
+        for i, row in enumerate(rows):
+            trade_ccy = str(row.get("trade_currency") or "").upper()
+            settle_ccy = str(row.get("settlement_currency") or "").upper()
+            if not trade_ccy or not settle_ccy:
+                continue
+            for symbol, inverted in (
+                (f"{trade_ccy}/{settle_ccy}", False),
+                (f"{settle_ccy}/{trade_ccy}", True),
+            ):
+                indexes, flags = by_symbol.setdefault(symbol, ([], []))
+                indexes.append(i)
+                flags.append(inverted)
+        self.by_symbol = {
+            symbol: (np.array(indexes), np.array(flags)) for symbol, (indexes, flags) in by_symbol.items()
+        }
+        self.anchor: dict[str, float] = {}
+
+    def apply(self, symbol: str, mid: float) -> int:
+        """Revalue the positions on symbol at spot mid. Returns the number of rows changed."""
+        entry = self.by_symbol.get(symbol)
+        if entry is None:
+            return 0
+        indexes, inverted = entry
+        anchor = self.anchor.setdefault(symbol, mid)
+        spot = np.where(inverted, 1.0 / mid, mid)
+        spot_anchor = np.where(inverted, 1.0 / anchor, anchor)
+        # Keep the pricer's forward points: move today's forward price by the spot move.
+        # Without a pricer price, spot is the best live price there is.
+        base = self.base_price[indexes]
+        live = np.where(np.isnan(base), spot, base + (spot - spot_anchor))
+        exposure = self.exposure[indexes]
+        pnl = {
+            field: (live - ref[indexes]) * exposure for field, ref in self.refs.items()
+        }
+        for k, i in enumerate(indexes.tolist()):
+            row = self.rows[i]
+            row["price"] = float(live[k])
+            for field, values in pnl.items():
+                row[field] = _pnl(values[k])
+            self.dirty.add(i)
+        return len(indexes)
+
+    def take_deltas(self) -> list[dict]:
+        deltas = [
+            {
+                "ticker": self.rows[i].get("ticker"),
+                "trade_id": self.rows[i].get("trade_id"),
+                **{field: self.rows[i].get(field) for field in _PNL_FIELDS},
+            }
+            for i in sorted(self.dirty)
+        ]
+        self.dirty.clear()
+        return deltas
+
+
+def _snapshot(book: _PositionBook) -> dict:
+    return {
+        "type": "pnl_snapshot",
+        "fundId": book.fund_id,
+        "date": book.today.isoformat(),
+        "data": book.rows,
+    }
+
+
+class LivePnlService:
+    """
+    Position books per fund, revalued on ESP quotes and pushed to /ws_pnl
+    subscribers. Books are loaded when a fund's first subscriber arrives,
+    reloaded after executions (coalesced) and every reload_s seconds; a failed
+    reload is retried after retry_s, doubling up to reload_s. Quotes are
+    applied on the event loop; database reads and valuation run on the
+    database executor. Each subscriber has its own ClientSender, and one that
+    falls queue_size messages behind gets a fresh snapshot instead of the
+    deltas it missed.
+    """
+
+    def __init__(
+        self,
+        throttle_s: float = 0.25,
+        reload_s: float = 300,
+        retry_s: float = 5.0,
+        queue_size: int = 100,
+        provider: Optional[str] = None,
+        quantity: Optional[str] = None,
+        max_quote_age_s: float = 30.0,
+    ):
+        self.throttle_s = throttle_s
+        self.reload_s = reload_s
+        self.retry_s = retry_s
+        self.queue_size = queue_size
+        # Only quotes from this provider / size tier price positions, when set
+        self.provider = provider
+        self.quantity = quantity
+        self.max_quote_age_s = max_quote_age_s
+        self._books: dict[int, _PositionBook] = {}
+        self._loading: dict[int, asyncio.Task] = {}
+        # ws -> (fund id, sender)
+        self._subscribers: dict[WebSocket, tuple[int, ClientSender]] = {}
+        # symbol -> (provider, quantity) -> {"bid", "ask", "at"}
+        self._quotes: dict[str, dict[tuple[str, str], dict[str, float]]] = {}
+        self._reload_requested = False
+        self._retry_at = 0.0
+        self._retry_delay = retry_s
+        self._flusher: Optional[asyncio.Task] = None
+        self.metrics = {
+            "quotes": 0,
+            "rows_revalued": 0,
+            "deltas_sent": 0,
+            "reloads": 0,
+            "resyncs": 0,
+            "errors": 0,
+        }
+
+    # -- subscribers --
+
+    async def subscribe(self, ws: WebSocket, fund_id: int = 0):
+        book = await self._book(fund_id)
+        sender = ClientSender(
+            ws, f"pnl:{fund_id}", policy=DROP_OLDEST, max_queue=self.queue_size
+        ).start()
+        sender.put(json.dumps(_snapshot(book), default=str))
+        self._subscribers[ws] = (fund_id, sender)
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_loop())
+
+    def unsubscribe(self, ws: WebSocket):
+        entry = self._subscribers.pop(ws, None)
+        if entry is not None:
+            entry[1].close()
+
+    # -- feeds --
+
+    def on_esp_quote(self, data):
+        """Apply one parsed /ws_esp message from the FIX service."""
+        if not self._books:
+            return
+        if not isinstance(data, dict) or data.get("type") != "quote":
+            return
+        if str(data.get("settlement") or "").upper() not in _SPOT_SETTLEMENTS:
+            return
+        symbol = str(data.get("symbol") or "").upper()
+        try:
+            price = float(data.get("price"))
+        except (TypeError, ValueError):
+            return
+        provider = str(data.get("provider") or "")
+        quantity = str(data.get("quantity") or "")
+        if self.provider and provider != self.provider:
+            return
+        if self.quantity and quantity != self.quantity:
+            return
+        side = "bid" if str(data.get("side") or "").lower().startswith("b") else "ask"
+        quote = self._quotes.setdefault(symbol, {}).setdefault((provider, quantity), {})
+        quote[side] = price
+        quote["at"] = time.monotonic()
+
+        self.metrics["quotes"] += 1
+        mid = self._mid(symbol)
+        if mid is None:
+            return
+        for book in self._books.values():
+            self.metrics["rows_revalued"] += book.apply(symbol, mid)
+
+    def on_execution(self, data):
+        """A fill on /ws_exec changes positions: reload every book on the next flush."""
+        if not self._books:
+            return
+        exec_type = data.get("exec_type") if isinstance(data, dict) else None
+        if exec_type in (None, "1", "2"):  # partial or full fill, or unknown
+            self._reload_requested = True
+
+    def stats(self) -> dict:
+        return {
+            **self.metrics,
+            "funds": sorted(self._books),
+            "positions": sum(len(b.rows) for b in self._books.values()),
+            "subscribers": len(self._subscribers),
+            "queues": [sender.stats() for _, sender in self._subscribers.values()],
+            "symbols": len(self._quotes),
+        }
+
+    # -- internals --
+
+    def _mid(self, symbol: str) -> Optional[float]:
+        """Mid of the tightest fresh two-sided (provider, quantity) quote on symbol."""
+        cutoff = time.monotonic() - self.max_quote_age_s
+        best = None
+        for quote in self._quotes.get(symbol, {}).values():
+            bid, ask = quote.get("bid"), quote.get("ask")
+            if bid is None or ask is None or quote["at"] < cutoff:
+                continue
+            spread = ask - bid
+            if best is None or spread < best[0]:
+                best = (spread, (bid + ask) / 2)
+        return None if best is None else best[1]
+
+    async def _book(self, fund_id: int) -> _PositionBook:
+        book = self._books.get(fund_id)
+        if book is not None:
+            return book
+        task = self._loading.get(fund_id)
+        if task is None:
+            task = asyncio.create_task(self._load(fund_id))
+            self._loading[fund_id] = task
+        try:
+            return await asyncio.shield(task)
+        finally:
+            if task.done():
+                self._loading.pop(fund_id, None)
+
+    async def _load(self, fund_id: int) -> _PositionBook:
+        today = date.today()
+        pricer_enabled = bool(os.getenv("PRICER_BASE_URL", ""))
+        business_days = get_calendar(os.getenv("PORTFOLIO_CALENDAR", "USD"))
+        data = await run_db(
+            PortfolioDAO().get_fx_positions,
+            selected_date=today.isoformat(),
+            fund_id=fund_id,
+        )
+        engine = PositionValuationEngine(
+            FX_FORWARD,
+            today,
+            dtd=business_days.prev_business_day(today),
+            eom=business_days.end_of_month(today),
+            eoy=business_days.end_of_previous_year(today),
+            pricer_enabled=pricer_enabled,
+        )
+        positions = await run_db(engine.load, data)
+        requests = await run_db(engine.price_requests, positions)
+        fetched_map = (
+            await get_pricing_cache().bulk_price(requests)
+            if pricer_enabled and requests
+            else {}
+        )
+        rows = await run_db(engine.value, positions, fetched_map, fund_id=fund_id)
+        book = await run_db(_PositionBook, fund_id, today, rows)
+        # Apply the latest quotes so a reloaded book starts live
+        for symbol in self._quotes:
+            mid = self._mid(symbol)
+            if mid is not None:
+                book.apply(symbol, mid)
+        book.dirty.clear()
+        self._books[fund_id] = book
+        self.metrics["reloads"] += 1
+        logger.info(f"[LivePnl] Loaded {len(book.rows)} FX positions for fund {fund_id}")
+        return book
+
+    async def _reload(self):
+        self._reload_requested = False
+        failed = False
+        for fund_id in list(self._books):
+            if fund_id not in {fund for fund, _ in self._subscribers.values()}:
+                # Nobody is watching; load again on the next subscriber
+                del self._books[fund_id]
+                continue
+            try:
+                book = await self._load(fund_id)
+            except Exception:
+                failed = True
+                self.metrics["errors"] += 1
+                logger.exception(
+                    f"[LivePnl] Reload failed for fund {fund_id}, "
+                    f"retrying in {self._retry_delay:g}s"
+                )
+                continue
+            self._send(fund_id, _snapshot(book))
+        if failed:
+            # Keep the old books live and back off, rather than retrying (and
+            # logging) on every flush while the database is down
+            self._reload_requested = True
+            self._retry_at = time.monotonic() + self._retry_delay
+            self._retry_delay = min(self._retry_delay * 2, self.reload_s)
+        else:
+            self._retry_delay = self.retry_s
+
+    async def _flush_loop(self):
+        while self._subscribers:
+            await asyncio.sleep(self.throttle_s)
+            try:
+                stale = any(
+                    b.today != date.today() or time.monotonic() - b.loaded_at > self.reload_s
+                    for b in self._books.values()
+                )
+                if (self._reload_requested or stale) and time.monotonic() >= self._retry_at:
+                    await self._reload()
+                    continue
+                for fund_id, book in list(self._books.items()):
+                    if book.dirty:
+                        deltas = book.take_deltas()
+                        self.metrics["deltas_sent"] += len(deltas)
+                        self._send(
+                            fund_id, {"type": "pnl", "fundId": fund_id, "data": deltas}
+                        )
+            except Exception:
+                self.metrics["errors"] += 1
+                logger.exception("[LivePnl] Flush failed")
+
+    def _send(self, fund_id: int, message: dict):
+        """Queue message on the fund's subscribers without waiting on any socket."""
+        payload = json.dumps(message, default=str)
+        snapshot = None
+        for ws, (subscribed_fund, sender) in list(self._subscribers.items()):
+            if subscribed_fund != fund_id:
+                continue
+            dropped = sender.dropped
+            if not sender.put(payload):
+                logger.debug(f"[LivePnl] Dropping closed subscriber of fund {fund_id}")
+                self._subscribers.pop(ws, None)
+                continue
+            if sender.dropped != dropped and message["type"] == "pnl":
+                # The client missed deltas: replace its backlog with the full book
+                if snapshot is None:
+                    snapshot = json.dumps(_snapshot(self._books[fund_id]), default=str)
+                sender.replace(snapshot)
+                self.metrics["resyncs"] += 1
+
+
+# Global singleton instance
+_live_pnl_service: Optional[LivePnlService] = None
+
+
+def get_live_pnl_service() -> LivePnlService:
+    """
+    Get or create the global live PnL service.
+
+    Configure via environment variables:
+     - LIVE_PNL_THROTTLE_MS: minimum interval between PnL pushes (default 250)
+     - LIVE_PNL_RELOAD_S: positions are reloaded from the database this often (default 300)
+     - LIVE_PNL_PROVIDER / LIVE_PNL_QUANTITY: only price off quotes from this
+       provider / size tier (default: any, tightest two-sided pair wins)
+     - LIVE_PNL_QUOTE_AGE_S: ignore pairs not quoted for this long (default 30)
+    """
+    global _live_pnl_service
+
+    if _live_pnl_service is None:
+        _live_pnl_service = LivePnlService(
+            throttle_s=int(os.getenv("LIVE_PNL_THROTTLE_MS", "250")) / 1000,
+            reload_s=float(os.getenv("LIVE_PNL_RELOAD_S", "300")),
+            provider=os.getenv("LIVE_PNL_PROVIDER") or None,
+            quantity=os.getenv("LIVE_PNL_QUANTITY") or None,
+            max_quote_age_s=float(os.getenv("LIVE_PNL_QUOTE_AGE_S", "30")),
+        )
+    return _live_pnl_service
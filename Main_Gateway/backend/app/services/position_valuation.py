@@ -0,0 +1,366 @@
+"""
+Columnar valuation of FX forward and FX option positions.
+
+Turns PortfolioDAO rows and the pricer map into the rows served by
+/fx-positions and /fx-option-positions: trades sharing a ticker are grouped,
+reference prices are chosen and ITD/YTD/MTD/DTD PnL is computed with
+pandas/NumPy column operations instead of per-trade Python.
+"""
+
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+FX_FORWARD = "fx_forward"
+FX_OPTION = "fx_option"
+
+_KINDS = {
+    FX_FORWARD: {
+        "prefix": "fx",
+        "price_column": "price",
+        "ccy_columns": ("trade_currency", "settlement_currency"),
+    },
+    FX_OPTION: {
+        "prefix": "fxopt",
+        "price_column": "premium",
+        "ccy_columns": ("underlying_trade_currency", "underlying_settlement_currency"),
+    },
+}
+
+# Reference points, in the order their dates are requested from the pricer
+_REFS = ("eoy", "eom", "eod")
+
+
+def _column(df: pd.DataFrame, name: str) -> pd.Series:
+    if name in df.columns:
+        return df[name]
+    return pd.Series([None] * len(df), index=df.index, dtype=object)
+
+
+def _per_distinct(columns: list[pd.Series], func) -> list[np.ndarray]:
+    """
+    Evaluate func(*values) once per distinct combination of column values and
+    broadcast its results (a tuple) to every row, one object array per result.
+
+    Tickers, currencies and dates repeat heavily across trades, so the
+    per-value Python runs over a few thousand combinations, not every trade.
+    """
+    key = None
+    for col in columns:
+        codes, uniques = pd.factorize(col.to_numpy(dtype=object), use_na_sentinel=False)
+        key = codes if key is None else pd.factorize(key * len(uniques) + codes)[0]
+    _, first = np.unique(key, return_index=True)
+    values = [col.to_numpy(dtype=object)[first] for col in columns]
+    results = [func(*args) for args in zip(*values)]
+    arrays = []
+    for field in zip(*results):
+        array = np.empty(len(field), dtype=object)
+        array[:] = field
+        arrays.append(array[key])
+    return arrays
+
+
+def _parse_trade_date(value, today):
+    trade_date = value or today
+    try:
+        if isinstance(trade_date, str):
+            trade_date = datetime.fromisoformat(trade_date[:10]).date()
+        elif hasattr(trade_date, "date"):
+            trade_date = trade_date.date()
+    except Exception:
+        trade_date = today
+    return (np.datetime64(trade_date, "D"),)
+
+
+def _fx_ticker(trade_ccy, settle_ccy, maturity_date):
+    trade_ccy = str(trade_ccy or "").upper()
+    settle_ccy = str(settle_ccy or "").upper()
+    maturity = str(maturity_date or "")[:10]
+    underlying = f"{trade_ccy}-{settle_ccy}" if trade_ccy and settle_ccy else None
+    ticker = f"{underlying}-{maturity}" if underlying and maturity else underlying
+    return trade_ccy, settle_ccy, underlying, ticker
+
+
+def _fx_option_ticker(trade_ccy, settle_ccy, maturity_date, option_type, option_type_alt, strike):
+    trade_ccy, settle_ccy, underlying, _ = _fx_ticker(trade_ccy, settle_ccy, None)
+    maturity = str(maturity_date or "")[:10]
+    # FX Option ticker format: TRADE-SETTLE-<P|C>-<strike:8dp>-YYYY-MM-DD
+    opt_type_raw = str(option_type or option_type_alt or "").strip().upper()
+    opt_code = (
+        "P"
+        if opt_type_raw.startswith("P")
+        else ("C" if opt_type_raw.startswith("C") else (opt_type_raw[:1] or None))
+    )
+    strike_fmt = None
+    try:
+        if strike is not None and strike != "":
+            strike_fmt = f"{float(strike):.8f}"
+    except Exception:
+        strike_fmt = None
+    if underlying and opt_code and strike_fmt and maturity:
+        ticker = f"{underlying}-{opt_code}-{strike_fmt}-{maturity}"
+    elif underlying and maturity:
+        ticker = f"{underlying}-{maturity}"
+    else:
+        ticker = underlying
+    return trade_ccy, settle_ccy, underlying, ticker
+
+
+def _numeric(values: np.ndarray, fill: float = np.nan) -> np.ndarray:
+    """Object values as float64; None and non-numeric values become fill."""
+    numbers = pd.to_numeric(pd.Series(values, dtype=object), errors="coerce")
+    return numbers.fillna(fill).to_numpy(dtype=float)
+
+
+def _sorted_ids(values) -> str:
+    """Comma-separated unique ids in numeric order, as the position tables expect."""
+    ids = {str(v) for v in values if v is not None}
+    return ",".join(sorted(ids, key=lambda x: (int(x) if x.isdigit() else 0, x)))
+
+
+class PositionValuationEngine:
+    """
+    Values one kind of position (FX_FORWARD or FX_OPTION) as of `today`.
+
+    Usage:
+        engine = PositionValuationEngine(FX_FORWARD, today, dtd, eom, eoy, pricer_enabled)
+        positions = engine.load(rows)
+        fetched = await bulk_price(engine.price_requests(positions))
+        data = engine.value(positions, fetched, fund_id)
+
+    A reference price is the trade price when the trade was done on or after
+    the reference date, otherwise the pricer's price for that date (0 when no
+    pricer is configured, None when it has no price).
+    """
+
+    def __init__(self, kind, today, dtd, eom, eoy, pricer_enabled: bool):
+        if kind not in _KINDS:
+            raise ValueError(f"Unknown position kind: {kind}")
+        self.kind = kind
+        self.today = today
+        self.ref_dates = {"eoy": eoy, "eom": eom, "eod": dtd}
+        self.pricer_enabled = pricer_enabled
+        self._config = _KINDS[kind]
+
+    def load(self, rows: list[dict]) -> pd.DataFrame:
+        """DAO rows as a frame, DB values untouched, plus derived "_" columns."""
+        df = pd.DataFrame(rows, dtype=object)
+        if df.empty:
+            return df
+
+        (trade_date,) = _per_distinct(
+            [_column(df, "trade_date")],
+            lambda value: _parse_trade_date(value, self.today),
+        )
+        df["_trade_date"] = trade_date.astype("datetime64[D]")
+
+        trade_ccy_col, settle_ccy_col = self._config["ccy_columns"]
+        columns = [
+            _column(df, trade_ccy_col),
+            _column(df, settle_ccy_col),
+            _column(df, "maturity_date"),
+        ]
+        if self.kind == FX_FORWARD:
+            derived = _per_distinct(columns, _fx_ticker)
+        else:
+            columns += [
+                _column(df, "option_type"),
+                _column(df, "optionType"),
+                _column(df, "strike"),
+            ]
+            derived = _per_distinct(columns, _fx_option_ticker)
+        trade_ccy, settle_ccy, underlying, ticker = derived
+
+        df["_trade_ccy"] = trade_ccy
+        df["_settle_ccy"] = settle_ccy
+        df["_underlying"] = underlying
+        df["_ticker"] = ticker
+        return df
+
+    def price_requests(self, df: pd.DataFrame) -> list[dict]:
+        """Bulk pricer request items, one per trade, for the dates it needs."""
+        if df.empty:
+            return []
+        # Which reference dates each trade needs, as a bitmask into the
+        # 8 possible date lists
+        trade_date = df["_trade_date"].to_numpy()
+        need = np.zeros(len(df), dtype=np.int64)
+        for bit, ref in enumerate(_REFS):
+            need |= (trade_date < np.datetime64(self.ref_dates[ref])).astype(np.int64) << bit
+        ref_isos = [self.ref_dates[ref].isoformat() for ref in _REFS]
+        date_lists = [
+            [d for bit, d in enumerate(ref_isos) if mask & (1 << bit)] for mask in range(8)
+        ]
+        need = need.tolist()
+        today_iso = self.today.isoformat()
+        prefix = self._config["prefix"]
+        ids = _column(df, "trade_id").tolist()
+        trade_ccy_col, settle_ccy_col = self._config["ccy_columns"]
+        symbols, maturities = _per_distinct(
+            [_column(df, trade_ccy_col), _column(df, settle_ccy_col), _column(df, "maturity_date")],
+            lambda trade_ccy, settle_ccy, maturity: (
+                f"{str(trade_ccy).upper()}/{str(settle_ccy).upper()}",
+                str(maturity)[:10] if maturity else None,
+            ),
+        )
+        symbols = symbols.tolist()
+        maturities = maturities.tolist()
+
+        items = []
+        if self.kind == FX_FORWARD:
+            # Today's price is always needed for pricer-based valuation
+            date_lists = [dates + [today_iso] for dates in date_lists]
+            for trade_id, symbol, maturity, mask in zip(ids, symbols, maturities, need):
+                items.append(
+                    {
+                        "type": "fx_forward",
+                        "id": f"{prefix}-{trade_id}",
+                        "symbol": symbol,
+                        "maturityDate": maturity,
+                        "dates": list(date_lists[mask]),
+                    }
+                )
+        else:
+            option_fields = [
+                _column(df, name).tolist()
+                for name in ("option_type", "option_style", "strike", "strike_currency", "cut")
+            ]
+            for trade_id, underlying, maturity, mask, opt_type, style, strike, strike_ccy, cut in zip(
+                ids, symbols, maturities, need, *option_fields
+            ):
+                if not mask:
+                    continue
+                items.append(
+                    {
+                        "type": "fx_option",
+                        "id": f"{prefix}-{trade_id}",
+                        "underlying": underlying,
+                        "optionType": opt_type,
+                        "style": style,
+                        "strike": strike,
+                        "strikeCurrency": strike_ccy,
+                        "maturityDate": maturity,
+                        "cut": cut,
+                        "dates": list(date_lists[mask]),
+                    }
+                )
+        return items
+
+    def value(
+        self,
+        df: pd.DataFrame,
+        fetched_map: dict[str, dict[str, float]],
+        fund_id: int | None = None,
+    ) -> list[dict]:
+        """Grouped position rows with reference prices and PnL columns."""
+        if df.empty:
+            return []
+        price_column = self._config["price_column"]
+
+        # Group by ticker in order of first appearance
+        codes, _ = pd.factorize(df["_ticker"], use_na_sentinel=False)
+        counts = np.bincount(codes)
+        _, first = np.unique(codes, return_index=True)
+        out = df.iloc[first].reset_index(drop=True)
+        n = len(out)
+
+        quantity = _column(out, "quantity").to_numpy(dtype=object, copy=True)
+        trade_ids = _column(out, "trade_id").to_numpy(dtype=object, copy=True)
+        original_ids = _column(out, "original_trade_id").to_numpy(dtype=object, copy=True)
+        grouped_trades = np.full(n, None, dtype=object)
+        trade_count = np.full(n, None, dtype=object)
+
+        multi = np.flatnonzero(counts > 1)
+        if len(multi):
+            qty_all = _numeric(_column(df, "quantity").to_numpy(dtype=object), fill=0.0)
+            qty_sums = np.bincount(codes, weights=qty_all, minlength=n)
+            order = np.argsort(codes, kind="stable")
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+            all_ids = _column(df, "trade_id").tolist()
+            all_qty = _column(df, "quantity").tolist()
+            all_funds = _column(df, "fund_id").tolist()
+            all_original = _column(df, "original_trade_id").tolist()
+            for g in multi:
+                members = order[starts[g]:starts[g] + counts[g]]
+                quantity[g] = float(qty_sums[g])
+                joined = _sorted_ids(all_ids[m] for m in members)
+                if joined:
+                    trade_ids[g] = joined
+                if self.kind == FX_FORWARD and fund_id == 0:
+                    original_ids[g] = _sorted_ids(all_original[m] for m in members) or None
+                grouped_trades[g] = [
+                    {"trade_id": all_ids[m], "quantity": all_qty[m], "fund_id": all_funds[m]}
+                    for m in members
+                ]
+                trade_count[g] = int(counts[g])
+
+        # Pricer results for the first (lowest) trade id of each row
+        prefix = self._config["prefix"]
+        fetched = [
+            fetched_map.get(f"{prefix}-{str(tid or '').split(',')[0]}") for tid in trade_ids
+        ]
+
+        trade_date = out["_trade_date"].to_numpy()
+        trade_price = _column(out, price_column).to_numpy(dtype=object)
+        ref_prices = {}
+        for ref in _REFS:
+            ref_date = self.ref_dates[ref]
+            use_trade = trade_date >= np.datetime64(ref_date)
+            if self.pricer_enabled:
+                key = ref_date.isoformat()
+                priced = np.array(
+                    [f.get(key) if f is not None else None for f in fetched], dtype=object
+                )
+            else:
+                priced = np.zeros(n, dtype=object)
+            ref_prices[ref] = np.where(use_trade, trade_price, priced)
+
+        today_key = self.today.isoformat()
+        if self.pricer_enabled:
+            price = np.array([f.get(today_key) if f else None for f in fetched], dtype=object)
+        else:
+            price = np.zeros(n, dtype=object)
+
+        qty = _numeric(quantity, fill=0.0)
+        (direction,) = _per_distinct(
+            [_column(out, "position")],
+            lambda side: (1.0 if str(side or "").strip().lower() == "buy" else -1.0,),
+        )
+        direction = direction.astype(float)
+        price_num = _numeric(price)
+
+        def pnl_since(ref_price):
+            pnl = (price_num - _numeric(ref_price)) * qty * direction
+            return np.where(np.isnan(pnl), None, pnl)
+
+        base_columns = [c for c in df.columns if not c.startswith("_") and c != price_column]
+        result = out[base_columns].copy()
+        result["quantity"] = quantity
+        result["trade_id"] = trade_ids
+        if self.kind == FX_FORWARD:
+            result["original_trade_id"] = original_ids
+        else:
+            # FX Options use the underlying CCYs as trade/settlement currencies
+            result["trade_currency"] = out["_trade_ccy"].to_numpy()
+            result["settlement_currency"] = out["_settle_ccy"].to_numpy()
+        result["eoy_date"] = self.ref_dates["eoy"].isoformat()
+        result["eom_date"] = self.ref_dates["eom"].isoformat()
+        result["eod_date"] = self.ref_dates["eod"].isoformat()
+        result["today_date"] = today_key
+        result["trade_price"] = trade_price
+        result["eoy_price"] = ref_prices["eoy"]
+        result["eom_price"] = ref_prices["eom"]
+        result["eod_price"] = ref_prices["eod"]
+        result["price"] = price
+        result["underlying"] = out["_underlying"].to_numpy()
+        result["ticker"] = out["_ticker"].to_numpy()
+        result["itd_pnl"] = pnl_since(trade_price)
+        result["ytd_pnl"] = pnl_since(ref_prices["eoy"])
+        result["mtd_pnl"] = pnl_since(ref_prices["eom"])
+        result["dtd_pnl"] = pnl_since(ref_prices["eod"])
+        result["grouped_trades"] = grouped_trades
+        result["trade_count"] = trade_count
+        # Missing values are served as null, never NaN
+        result = result.astype(object)
+        return result.where(result.notna(), None).to_dict(orient="records")
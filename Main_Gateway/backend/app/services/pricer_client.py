@@ -0,0 +1,100 @@
+"""
+Shared async HTTP client for the external pricer microservice.
+One pooled httpx.AsyncClient serves every request, so pricer calls reuse
+keep-alive connections and never block the event loop.
+"""
+
+import os
+from typing import Optional
+
+import httpx
+
+from app.util.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class PricerClient:
+    """
+    Async client for the pricer's bulk pricing endpoint.
+
+    Configure via environment variables:
+     - PRICER_BASE_URL: base URL to the pricer service (e.g., https://pricer.internal:8443)
+     - PRICER_TIMEOUT_MS: HTTP timeout in milliseconds (default 5000)
+     - PRICER_MAX_CONNECTIONS: connections kept to the pricer (default 20)
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        timeout_ms: int = 5000,
+        max_connections: int = 20,
+    ):
+        self.base_url = (base_url or "").rstrip("/")
+        self.client = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=httpx.Timeout(timeout_ms / 1000),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+        )
+
+    async def bulk_price(self, request_items: list[dict]) -> dict[str, dict[str, float]]:
+        """
+        Call the pricer in bulk. Returns mapping: id -> { date -> price }.
+        If the pricer is not configured or the request fails, returns empty dict.
+        """
+        if not self.base_url or not request_items:
+            return {}
+        try:
+            resp = await self.client.post(
+                "/api/price/bulk", json={"requests": request_items}
+            )
+            resp.raise_for_status()
+            data = resp.json() or {}
+            results = data.get("results") or []
+            out: dict[str, dict[str, float]] = {}
+            for r in results:
+                rid = str(r.get("id"))
+                prices = r.get("prices") or {}
+                # Normalize keys to ISO strings
+                out[rid] = {str(k): v for k, v in prices.items()}
+            return out
+        except Exception as e:
+            logger.warning(f"Pricer bulk request failed: {e}")
+            return {}
+
+    async def close(self):
+        await self.client.aclose()
+
+
+# Global singleton instance
+_pricer_client: Optional[PricerClient] = None
+
+
+def get_pricer_client() -> PricerClient:
+    """Get or create the global pricer client."""
+    global _pricer_client
+
+    if _pricer_client is None:
+        try:
+            timeout_ms = int(os.getenv("PRICER_TIMEOUT_MS", "5000"))
+        except ValueError:
+            timeout_ms = 5000
+        _pricer_client = PricerClient(
+            os.getenv("PRICER_BASE_URL", ""),
+            timeout_ms=timeout_ms,
+            max_connections=int(os.getenv("PRICER_MAX_CONNECTIONS", "20")),
+        )
+    return _pricer_client
+
+
+async def close_pricer_client():
+    """Close the global pricer client, if it was created."""
+    global _pricer_client
+
+    if _pricer_client is not None:
+        await _pricer_client.close()
+        _pricer_client = None
+        logger.info("Pricer client closed")
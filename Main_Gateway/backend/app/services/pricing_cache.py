@@ -0,0 +1,180 @@
+"""
+Request-coalescing cache in front of the pricer's bulk endpoint.
+Prices are cached per (instrument, date); concurrent requests for the same
+price share one pricer call.
+"""
+
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict
+from datetime import date
+from typing import Optional
+
+from app.services.pricer_client import PricerClient, get_pricer_client
+from app.util.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def _instrument_key(item: dict) -> str:
+    """Identify what is priced: every request field except the caller's id and dates."""
+    return json.dumps(
+        {k: v for k, v in item.items() if k not in ("id", "dates")},
+        sort_keys=True,
+        default=str,
+    )
+
+
+class PricingCache:
+    """
+    TTL + LRU cache of pricer results keyed by (instrument, date).
+
+    - Prices for dates before today never change and are kept for
+      ttl_historical_s; today's (and future) prices are kept for ttl_today_s.
+    - A price that is already being fetched is awaited rather than requested
+      again (single-flight), so panels loading the same trades at the same
+      time send one pricer request between them.
+    - Missing prices are not cached.
+    - At most max_entries prices are kept; the least recently used go first.
+
+    Must be used from a single event loop.
+    """
+
+    def __init__(
+        self,
+        pricer: PricerClient,
+        max_entries: int = 50000,
+        ttl_today_s: float = 30,
+        ttl_historical_s: float = 86400,
+    ):
+        self.pricer = pricer
+        self.max_entries = max_entries
+        self.ttl_today_s = ttl_today_s
+        self.ttl_historical_s = ttl_historical_s
+        self._entries: OrderedDict[tuple[str, str], tuple[float, float]] = OrderedDict()
+        self._inflight: dict[tuple[str, str], asyncio.Future] = {}
+        self.metrics = {
+            "hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "evictions": 0,
+            "pricer_requests": 0,
+        }
+
+    async def bulk_price(self, request_items: list[dict]) -> dict[str, dict[str, float]]:
+        """
+        Same contract as PricerClient.bulk_price: id -> { date -> price }, with
+        only the prices that are not cached or in flight sent to the pricer.
+        """
+        now = time.monotonic()
+        loop = asyncio.get_running_loop()
+        out: dict[str, dict[str, float]] = {}
+        waiting: list[tuple[str, str, asyncio.Future]] = []
+        to_fetch: dict[str, dict] = {}
+
+        for item in request_items:
+            rid = str(item.get("id"))
+            instrument = _instrument_key(item)
+            for d in dict.fromkeys(str(d) for d in item.get("dates") or []):
+                key = (instrument, d)
+                entry = self._entries.get(key)
+                if entry is not None:
+                    if entry[0] > now:
+                        self.metrics["hits"] += 1
+                        self._entries.move_to_end(key)
+                        out.setdefault(rid, {})[d] = entry[1]
+                        continue
+                    del self._entries[key]
+                future = self._inflight.get(key)
+                if future is not None:
+                    self.metrics["coalesced"] += 1
+                else:
+                    self.metrics["misses"] += 1
+                    future = loop.create_future()
+                    self._inflight[key] = future
+                    group = to_fetch.setdefault(instrument, {"item": item, "dates": []})
+                    group["dates"].append(d)
+                waiting.append((rid, d, future))
+
+        if to_fetch:
+            await self._fetch(to_fetch)
+
+        for rid, d, future in waiting:
+            price = await future
+            if price is not None:
+                out.setdefault(rid, {})[d] = price
+        return out
+
+    def stats(self) -> dict:
+        lookups = self.metrics["hits"] + self.metrics["misses"] + self.metrics["coalesced"]
+        return {
+            **self.metrics,
+            "entries": len(self._entries),
+            "inflight": len(self._inflight),
+            "hit_ratio": (self.metrics["hits"] / lookups) if lookups else None,
+        }
+
+    def clear(self):
+        self._entries.clear()
+
+    async def _fetch(self, to_fetch: dict[str, dict]):
+        groups = list(to_fetch.items())
+        request_items = [
+            {**group["item"], "id": f"cache-{i}", "dates": group["dates"]}
+            for i, (_, group) in enumerate(groups)
+        ]
+        fetched: dict[str, dict[str, float]] = {}
+        try:
+            self.metrics["pricer_requests"] += 1
+            fetched = await self.pricer.bulk_price(request_items)
+        finally:
+            # Always release waiters, even if this request was cancelled
+            today = date.today().isoformat()
+            expires_today = time.monotonic() + self.ttl_today_s
+            expires_historical = time.monotonic() + self.ttl_historical_s
+            for i, (instrument, group) in enumerate(groups):
+                prices = fetched.get(f"cache-{i}") or {}
+                for d in group["dates"]:
+                    key = (instrument, d)
+                    price = prices.get(d)
+                    if price is not None:
+                        self._store(
+                            key, price, expires_historical if d < today else expires_today
+                        )
+                    future = self._inflight.pop(key, None)
+                    if future is not None and not future.done():
+                        future.set_result(price)
+
+    def _store(self, key: tuple[str, str], price: float, expires: float):
+        self._entries[key] = (expires, price)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.metrics["evictions"] += 1
+
+
+# Global singleton instance
+_pricing_cache: Optional[PricingCache] = None
+
+
+def get_pricing_cache() -> PricingCache:
+    """
+    Get or create the global pricing cache.
+
+    Configure via environment variables:
+     - PRICER_CACHE_MAX_ENTRIES: prices kept before LRU eviction (default 50000)
+     - PRICER_CACHE_TTL_TODAY_S: lifetime of today's prices (default 30)
+     - PRICER_CACHE_TTL_HISTORICAL_S: lifetime of past dates' prices (default 86400)
+    """
+    global _pricing_cache
+
+    if _pricing_cache is None:
+        _pricing_cache = PricingCache(
+            get_pricer_client(),
+            max_entries=int(os.getenv("PRICER_CACHE_MAX_ENTRIES", "50000")),
+            ttl_today_s=float(os.getenv("PRICER_CACHE_TTL_TODAY_S", "30")),
+            ttl_historical_s=float(os.getenv("PRICER_CACHE_TTL_HISTORICAL_S", "86400")),
+        )
+    return _pricing_cache
@@ -0,0 +1,72 @@
+from app.services.live_pnl import LivePnlService
+
+
+class _RecordingBook:
+    def __init__(self):
+        self.applied = []
+
+    def apply(self, symbol, mid):
+        self.applied.append((symbol, mid))
+        return 1
+
+
+def _quote(side, price, provider="LP1", quantity="1000000", symbol="EUR/USD"):
+    return {
+        "type": "quote",
+        "symbol": symbol,
+        "settlement": "SP",
+        "side": side,
+        "price": price,
+        "provider": provider,
+        "quantity": quantity,
+    }
+
+
+def _service(**kwargs):
+    service = LivePnlService(**kwargs)
+    book = _RecordingBook()
+    service._books[0] = book
+    return service, book
+
+
+def test_bid_and_ask_are_paired_per_provider_and_tier():
+    service, book = _service()
+    service.on_esp_quote(_quote("Bid", 1.1000, provider="LP1"))
+    service.on_esp_quote(_quote("Ask", 1.1010, provider="LP2"))
+    # No provider has both sides yet: nothing is revalued
+    assert book.applied == []
+
+    service.on_esp_quote(_quote("Ask", 1.1002, provider="LP1"))
+    assert book.applied == [("EUR/USD", 1.1001)]
+
+
+def test_mid_comes_from_the_tightest_pair():
+    service, book = _service()
+    service.on_esp_quote(_quote("Bid", 1.0990, quantity="10000000"))
+    service.on_esp_quote(_quote("Ask", 1.1030, quantity="10000000"))
+    service.on_esp_quote(_quote("Bid", 1.1000, quantity="1000000"))
+    service.on_esp_quote(_quote("Ask", 1.1002, quantity="1000000"))
+    # A wide tier ticking does not move the mid off the tight pair
+    service.on_esp_quote(_quote("Ask", 1.1050, quantity="10000000"))
+    assert book.applied[-1] == ("EUR/USD", 1.1001)
+    assert book.applied[-2] == ("EUR/USD", 1.1001)
+
+
+def test_configured_provider_and_tier_only():
+    service, book = _service(provider="LP2", quantity="5000000")
+    service.on_esp_quote(_quote("Bid", 1.1000, provider="LP1", quantity="5000000"))
+    service.on_esp_quote(_quote("Ask", 1.1002, provider="LP1", quantity="5000000"))
+    service.on_esp_quote(_quote("Bid", 1.1004, provider="LP2", quantity="1000000"))
+    service.on_esp_quote(_quote("Ask", 1.1006, provider="LP2", quantity="1000000"))
+    assert book.applied == []
+
+    service.on_esp_quote(_quote("Bid", 1.1010, provider="LP2", quantity="5000000"))
+    service.on_esp_quote(_quote("Ask", 1.1014, provider="LP2", quantity="5000000"))
+    assert book.applied == [("EUR/USD", 1.1012)]
+
+
+def test_stale_pairs_are_ignored():
+    service, book = _service(max_quote_age_s=0.0)
+    service.on_esp_quote(_quote("Bid", 1.1000))
+    service.on_esp_quote(_quote("Ask", 1.1002))
+    assert book.applied == []
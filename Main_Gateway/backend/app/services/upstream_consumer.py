@@ -0,0 +1,143 @@
+"""
+asyncio consumer for one FIX service WebSocket stream (ESP, RFS or executions).
+
+Two tasks on the app's event loop, joined by a bounded asyncio queue:
+
+  - ingest: connects, reads messages and queues them, reconnecting with
+    exponential backoff (plus jitter) when the upstream drops or refuses.
+  - fan-out: takes messages off the queue and awaits the handler
+    (FixController.broadcast), which only queues them on client senders.
+
+Reading never waits on the handler, so a busy fan-out shows up as queue depth
+and, past max_queue, dropped oldest messages, instead of stalling the upstream
+socket.
+"""
+
+import asyncio
+import random
+import time
+from typing import Awaitable, Callable
+
+from websockets.asyncio.client import connect
+
+from app.util.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class UpstreamConsumer:
+    def __init__(
+        self,
+        url: str,
+        stream: str,
+        handler: Callable[[str], Awaitable[None]],
+        max_queue: int = 10000,
+        initial_backoff: float = 0.5,
+        max_backoff: float = 30.0,
+    ):
+        self.url = url
+        self.stream = stream
+        self.handler = handler
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self._queue: asyncio.Queue[tuple[str, float]] = asyncio.Queue(maxsize=max_queue)
+        self._tasks: list[asyncio.Task] = []
+        self.connected = False
+        self.metrics = {
+            "received": 0,
+            "dispatched": 0,
+            "dropped": 0,
+            "reconnects": 0,
+            "handler_errors": 0,
+            "queue_high_water": 0,
+            "latency_ms": 0.0,
+            "max_latency_ms": 0.0,
+            "messages_per_s": 0.0,
+        }
+        self._latency_total_ms = 0.0
+        self._window_start = time.monotonic()
+        self._window_count = 0
+
+    def start(self) -> "UpstreamConsumer":
+        self._tasks = [
+            asyncio.create_task(self._ingest(), name=f"upstream-{self.stream}-ingest"),
+            asyncio.create_task(self._fan_out(), name=f"upstream-{self.stream}-fanout"),
+        ]
+        return self
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self.connected = False
+
+    def stats(self) -> dict:
+        dispatched = self.metrics["dispatched"]
+        elapsed = time.monotonic() - self._window_start
+        if elapsed >= 1.0:  # no message has closed the window; report the quiet spell
+            self.metrics["messages_per_s"] = round(self._window_count / elapsed, 1)
+        return {
+            "url": self.url,
+            "connected": self.connected,
+            "queue_depth": self._queue.qsize(),
+            **self.metrics,
+            "avg_latency_ms": round(self._latency_total_ms / dispatched, 3) if dispatched else 0.0,
+        }
+
+    async def _ingest(self):
+        backoff = self.initial_backoff
+        while True:
+            try:
+                async with connect(self.url) as ws:
+                    self.connected = True
+                    backoff = self.initial_backoff
+                    logger.info(f"[{self.stream}] Connected to {self.url}")
+                    async for message in ws:
+                        if isinstance(message, bytes):
+                            message = message.decode("utf-8")
+                        self._enqueue(message)
+                logger.warning(f"[{self.stream}] Upstream closed the connection")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[{self.stream}] WebSocket error: {e}")
+            finally:
+                self.connected = False
+            delay = backoff * random.uniform(0.5, 1.0)
+            logger.warning(f"[{self.stream}] Reconnecting in {delay:.1f}s...")
+            self.metrics["reconnects"] += 1
+            await asyncio.sleep(delay)
+            backoff = min(backoff * 2, self.max_backoff)
+
+    def _enqueue(self, message: str):
+        now = time.monotonic()
+        if self._queue.full():
+            self._queue.get_nowait()
+            self.metrics["dropped"] += 1
+        self._queue.put_nowait((message, now))
+        self.metrics["received"] += 1
+        self.metrics["queue_high_water"] = max(
+            self.metrics["queue_high_water"], self._queue.qsize()
+        )
+        self._window_count += 1
+        elapsed = now - self._window_start
+        if elapsed >= 1.0:
+            self.metrics["messages_per_s"] = round(self._window_count / elapsed, 1)
+            self._window_start = now
+            self._window_count = 0
+
+    async def _fan_out(self):
+        while True:
+            message, received_at = await self._queue.get()
+            logger.debug(f"[From {self.url}] {message}")
+            try:
+                await self.handler(message)
+            except Exception as e:
+                self.metrics["handler_errors"] += 1
+                logger.error(f"[broadcast:{self.stream}] Failed: {e}")
+            latency_ms = (time.monotonic() - received_at) * 1000
+            self.metrics["dispatched"] += 1
+            self.metrics["latency_ms"] = round(latency_ms, 3)
+            self.metrics["max_latency_ms"] = max(self.metrics["max_latency_ms"], round(latency_ms, 3))
+            self._latency_total_ms += latency_ms
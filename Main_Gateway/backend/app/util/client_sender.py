@@ -0,0 +1,154 @@
+"""
+Per-WebSocket outbound queue, drained by the socket's own task.
+
+Broadcasting puts a message on every client's queue without awaiting; each
+ClientSender then sends at its socket's pace, so one slow browser only delays
+itself. Queues are bounded:
+
+  - DROP_OLDEST: when full, the oldest queued message is dropped.
+  - CONFLATE: messages put with the same key replace the queued one in place
+    (e.g. the latest price per symbol), then the drop-oldest bound applies.
+
+With a flush_interval the sender sends at most once per interval, everything
+queued at that moment, so under CONFLATE a client gets the latest value of
+each key at its own cadence (e.g. 50 ms for a trader, 1 s for a dashboard).
+The last update of a key is always delivered, just not every update before it.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+from fastapi import WebSocket
+
+from app.util.logger import get_logger
+
+logger = get_logger(__name__)
+
+DROP_OLDEST = "drop_oldest"
+CONFLATE = "conflate"
+
+
+class ClientSender:
+    def __init__(
+        self,
+        ws: WebSocket,
+        name: str,
+        policy: str = DROP_OLDEST,
+        max_queue: int = 1000,
+        flush_interval: float = 0.0,
+    ):
+        self.ws = ws
+        self.name = name
+        self.policy = policy
+        self.max_queue = max_queue
+        self.flush_interval = flush_interval
+        self.closed = False
+        # key -> (message, enqueue time); unkeyed messages get a unique sequence key
+        self._queue: OrderedDict[Hashable, tuple[str, float]] = OrderedDict()
+        self._seq = 0
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.sent = 0
+        self.dropped = 0
+        self.conflated = 0
+        self.lag_ms = 0.0
+        self.max_lag_ms = 0.0
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    def close(self):
+        self.closed = True
+        self._queue.clear()
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+
+    def replace(self, message: str) -> bool:
+        """
+        Drop everything still queued and queue message instead, e.g. a full
+        snapshot for a client that fell behind and lost deltas. Returns False
+        once the sender is closed.
+        """
+        if self.closed:
+            return False
+        self.dropped += len(self._queue)
+        self._queue.clear()
+        return self.put(message)
+
+    def discard_keyed(self):
+        """
+        Drop pending keyed messages, e.g. before a snapshot that supersedes
+        them. Otherwise a later value for one of those keys would replace the
+        pending one in its old queue position and reach the client ahead of
+        the snapshot header.
+        """
+        if self.policy != CONFLATE:
+            return
+        # Unkeyed messages are queued under int sequence keys (see put)
+        for key in [key for key in self._queue if not isinstance(key, int)]:
+            del self._queue[key]
+
+    def put(self, message: str, key: Optional[Hashable] = None) -> bool:
+        """Queue message without waiting. Returns False once the sender is closed."""
+        if self.closed:
+            return False
+        if key is not None and self.policy == CONFLATE and key in self._queue:
+            # Keep the queue position and the first enqueue time, so lag is the
+            # age of the oldest update the client has not seen yet
+            self._queue[key] = (message, self._queue[key][1])
+            self.conflated += 1
+            return True
+        if key is None or self.policy != CONFLATE:
+            self._seq += 1
+            key = self._seq
+        if len(self._queue) >= self.max_queue:
+            self._queue.popitem(last=False)
+            self.dropped += 1
+        self._queue[key] = (message, time.monotonic())
+        self._wakeup.set()
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "policy": self.policy,
+            "flush_interval_ms": round(self.flush_interval * 1000),
+            "queue_depth": len(self._queue),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "conflated": self.conflated,
+            "lag_ms": round(self.lag_ms, 3),
+            "max_lag_ms": round(self.max_lag_ms, 3),
+            "closed": self.closed,
+        }
+
+    async def _run(self):
+        next_flush = 0.0
+        try:
+            while True:
+                while not self._queue:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                if self.flush_interval > 0:
+                    # Let updates conflate until this client's next flush
+                    await asyncio.sleep(max(0.0, next_flush - time.monotonic()))
+                    batch = list(self._queue.values())
+                    self._queue.clear()
+                    next_flush = time.monotonic() + self.flush_interval
+                else:
+                    batch = [self._queue.popitem(last=False)[1]]
+                for message, enqueued in batch:
+                    await self.ws.send_text(message)
+                    self.sent += 1
+                    self.lag_ms = (time.monotonic() - enqueued) * 1000
+                    self.max_lag_ms = max(self.max_lag_ms, self.lag_ms)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"[{self.name}] Send failed, closing sender: {e}")
+        finally:
+            self.closed = True
+            self._queue.clear()
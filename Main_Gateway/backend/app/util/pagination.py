@@ -0,0 +1,119 @@
+"""
+Keyset (cursor) pagination and NDJSON streaming for list endpoints.
+
+A cursor is the sort key of the last row of a page, base64url-encoded JSON,
+and is opaque to clients: they pass back the next_cursor of one page to get
+the next. Unlike OFFSET, the database seeks straight to the cursor through
+the sort index (see migrations/009_create_keyset_pagination_indexes.sql),
+so deep pages cost the same as the first. A cursor and an offset cannot be
+combined.
+
+A sort key column that can be NULL is listed in the query's nullable
+columns; its cursor value may then be null, and the query has to place NULL
+rows explicitly (NULLS FIRST / LAST) and seek past them.
+"""
+
+import base64
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Iterable, Iterator
+
+from fastapi.responses import StreamingResponse
+
+from app.database.connection import run_db
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def encode_cursor(row: dict, keyset: tuple[str, ...]) -> str:
+    """Cursor pointing just past row, for a query ordered by keyset."""
+    values = [_json_default(row[c]) if row[c] is not None else None for c in keyset]
+    payload = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(
+    cursor: str, keyset: tuple[str, ...], nullable: tuple[str, ...] = ()
+) -> dict:
+    """
+    Bind parameters ("after_<column>") for the row a cursor points past.
+    Only the nullable columns may be null. Raises ValueError if the cursor
+    is malformed or for another keyset.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list) or len(values) != len(keyset):
+        raise ValueError("Invalid cursor")
+    if any(v is None and c not in nullable for c, v in zip(keyset, values)):
+        raise ValueError("Invalid cursor")
+    return {f"after_{c}": v for c, v in zip(keyset, values)}
+
+
+def check_offset(cursor: str | None, offset: int) -> None:
+    """Raise ValueError if a cursor and a non-zero offset are both given."""
+    if cursor and offset:
+        raise ValueError("Pass either 'cursor' or 'offset', not both")
+
+
+def next_cursor(rows: list[dict], limit: int, keyset: tuple[str, ...]) -> str | None:
+    """Cursor for the page after rows, or None if rows was the last page."""
+    if not rows or len(rows) < limit:
+        return None
+    return encode_cursor(rows[-1], keyset)
+
+
+def ndjson_response(rows: Iterable[dict], chunk_rows: int = 500) -> StreamingResponse:
+    """
+    Stream rows as newline-delimited JSON, one object per line.
+
+    rows is typically connection.stream_rows(); it is advanced on the DB
+    executor chunk_rows at a time, so the event loop never blocks on the
+    database and only one chunk is held in memory.
+    """
+    return StreamingResponse(
+        _ndjson_chunks(iter(rows), chunk_rows), media_type=NDJSON_MEDIA_TYPE
+    )
+
+
+async def _ndjson_chunks(rows: Iterator[dict], chunk_rows: int):
+    encoded = _encode_lines(rows, chunk_rows)
+    try:
+        while True:
+            chunk = await run_db(next, encoded, None)
+            if chunk is None:
+                break
+            yield chunk
+    finally:
+        # Release the server-side cursor and its connection if the client left early
+        await run_db(encoded.close)
+
+
+def _encode_lines(rows: Iterator[dict], chunk_rows: int) -> Iterator[bytes]:
+    try:
+        lines = []
+        for row in rows:
+            lines.append(json.dumps(row, default=_json_default))
+            if len(lines) >= chunk_rows:
+                yield ("\n".join(lines) + "\n").encode()
+                lines = []
+        if lines:
+            yield ("\n".join(lines) + "\n").encode()
+    finally:
+        close = getattr(rows, "close", None)
+        if close is not None:
+            close()
+
+
+def _json_default(value):
+    # Same representations as FastAPI's jsonable_encoder for the paged endpoints
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (int, float, str, bool)):
+        return value
+    return str(value)
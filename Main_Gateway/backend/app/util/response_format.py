@@ -0,0 +1,119 @@
+"""
+Content negotiation for list endpoints that return {"status", "count", "data": [row, ...]}.
+
+Rows are wide dicts that repeat every key name, so for grids two more compact
+shapes are offered, chosen by the Accept header or a ?format= query parameter:
+
+  - format=columnar / Accept: application/vnd.gzc.columnar+json
+      {"status", "count", ..., "columns": [name, ...], "rows": [[value, ...], ...]}
+      encoded with orjson.
+  - format=arrow / Accept: application/vnd.apache.arrow.stream
+      Apache Arrow IPC stream of one record batch; the envelope fields other
+      than data are in the schema metadata. Needs pyarrow.
+
+Anything else gets the envelope back unchanged, as plain JSON.
+"""
+
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+
+import orjson
+from fastapi import HTTPException, Request
+from fastapi.responses import Response
+
+try:
+    import pyarrow as pa
+except ImportError:  # declared in requirements; answer 406 if it is missing
+    pa = None
+
+COLUMNAR_JSON_MEDIA_TYPE = "application/vnd.gzc.columnar+json"
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+_FORMATS = {
+    "columnar": COLUMNAR_JSON_MEDIA_TYPE,
+    "arrow": ARROW_STREAM_MEDIA_TYPE,
+}
+
+
+def negotiate(request: Request, payload: dict):
+    """
+    Return payload in the format the client asked for: a Response for
+    columnar JSON or Arrow, otherwise payload itself for FastAPI to encode.
+    """
+    media_type = _requested_media_type(request)
+    if media_type == COLUMNAR_JSON_MEDIA_TYPE:
+        return Response(encode_columnar(payload), media_type=media_type)
+    if media_type == ARROW_STREAM_MEDIA_TYPE:
+        if pa is None:
+            raise HTTPException(
+                status_code=406, detail="Arrow responses need pyarrow on the server"
+            )
+        return Response(encode_arrow(payload), media_type=media_type)
+    return payload
+
+
+def to_columns(rows: list[dict]) -> tuple[list[str], list[list]]:
+    """Column names in order of first appearance, and each row's values in that order."""
+    columns = list(dict.fromkeys(key for row in rows for key in row))
+    keys = tuple(columns)
+    if all(tuple(row) == keys for row in rows):
+        # Rows from one query share their keys in order; skip the per-key lookups
+        return columns, [list(row.values()) for row in rows]
+    return columns, [[row.get(c) for c in columns] for row in rows]
+
+
+def encode_columnar(payload: dict) -> bytes:
+    columns, rows = to_columns(payload.get("data") or [])
+    body = {k: v for k, v in payload.items() if k != "data"}
+    body["columns"] = columns
+    body["rows"] = rows
+    return orjson.dumps(body, default=_orjson_default)
+
+
+def encode_arrow(payload: dict) -> bytes:
+    columns, rows = to_columns(payload.get("data") or [])
+    arrays = [_arrow_array([row[i] for row in rows]) for i in range(len(columns))]
+    metadata = {
+        k: json.dumps(v, default=_orjson_default)
+        for k, v in payload.items()
+        if k != "data"
+    }
+    table = pa.Table.from_arrays(arrays, names=columns, metadata=metadata)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def _requested_media_type(request: Request) -> str | None:
+    fmt = request.query_params.get("format")
+    if fmt:
+        return _FORMATS.get(fmt.lower())
+    accept = request.headers.get("accept", "")
+    for media_type in _FORMATS.values():
+        if media_type in accept:
+            return media_type
+    return None
+
+
+def _arrow_array(values: list):
+    # Columns mixing types Arrow cannot unify (e.g. "N/A" among prices) go as strings
+    values = [float(v) if isinstance(v, Decimal) else v for v in values]
+    try:
+        return pa.array(values, from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return pa.array([None if v is None else str(v) for v in values], pa.string())
+
+
+def _orjson_default(value):
+    # Same representations as FastAPI's jsonable_encoder for the row JSON
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, float):  # numpy.float64 and other float subclasses
+        return float(value)
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if hasattr(value, "item"):  # numpy scalars
+        return value.item()
+    return str(value)
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Load test for concurrent /api/portfolio/fx-positions requests.
+
+Fires N requests at once through the real router and measures how long the
+whole batch takes and how late a 10 ms ticker on the same event loop runs
+(the delay a /ws_esp broadcast would see). The database and the pricer are
+replaced by fixed delays so only the gateway's own scheduling is measured:
+  - the DAO sleeps --db-ms in whatever thread it runs on (as psycopg2 blocks)
+  - the pricer awaits --pricer-ms (as the shared httpx client does)
+  - --trades synthetic trades per request go through the valuation engine
+
+--inline-db runs DAO calls and valuation directly on the event loop, as the
+endpoints did before run_db, for comparison.
+
+Usage:
+    python bench_portfolio_concurrency.py                  # 10 concurrent requests
+    python bench_portfolio_concurrency.py --requests 50 --db-ms 300 --trades 20000
+    python bench_portfolio_concurrency.py --inline-db
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+import httpx
+from fastapi import FastAPI
+
+from app.auth.azure_auth import validate_token
+from app.controllers import portfolio_controller
+from app.daos.portfolio_dao import PortfolioDAO
+from app.services.pricing_cache import get_pricing_cache
+
+SELECTED_DATE = "2025-06-18"
+PAIRS = [("EUR", "USD"), ("USD", "JPY"), ("GBP", "USD"), ("USD", "MXN")]
+
+
+def _rows(count):
+    rng = random.Random(42)
+    today = date.fromisoformat(SELECTED_DATE)
+    return [
+        {
+            "trade_id": 100000 + i,
+            "trade_date": today - timedelta(days=rng.randint(0, 600)),
+            "maturity_date": today + timedelta(days=rng.randint(1, 360)),
+            "quantity": Decimal(rng.randint(1, 50) * 100000),
+            "position": rng.choice(["Buy", "Sell"]),
+            "fund_id": rng.randint(1, 5),
+            "original_trade_id": None,
+            "trade_currency": pair[0],
+            "settlement_currency": pair[1],
+            "price": Decimal("1.0850"),
+        }
+        for i, pair in enumerate(rng.choice(PAIRS) for _ in range(count))
+    ]
+
+
+def _patch(db_ms, pricer_ms, trades, inline_db):
+    rows = _rows(trades)
+
+    def get_fx_positions(self, selected_date=None, fund_id=None):
+        time.sleep(db_ms / 1000)
+        return rows
+
+    async def bulk_price(request_items):
+        await asyncio.sleep(pricer_ms / 1000)
+        return {item["id"]: {d: 1.09 for d in item["dates"]} for item in request_items}
+
+    async def run_inline(func, *args, **kwargs):
+        return func(*args, **kwargs)
+
+    PortfolioDAO.get_fx_positions = get_fx_positions
+    get_pricing_cache().bulk_price = bulk_price
+    portfolio_controller.PRICER_BASE_URL = "http://pricer.invalid"
+    if inline_db:
+        portfolio_controller.run_db = run_inline
+
+
+async def _ticker(lags, stop):
+    interval = 0.01
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+
+
+async def _bench(requests_n):
+    app = FastAPI()
+    app.include_router(portfolio_controller.router)
+    app.dependency_overrides[validate_token] = lambda: {"sub": "bench"}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://gateway") as client:
+        # Warm up (imports, calendars) outside the measurement
+        resp = await client.get(
+            "/api/portfolio/fx-positions", params={"date": SELECTED_DATE}
+        )
+        resp.raise_for_status()
+
+        lags = []
+        stop = asyncio.Event()
+        ticker = asyncio.create_task(_ticker(lags, stop))
+        start = time.perf_counter()
+        responses = await asyncio.gather(
+            *(
+                client.get(
+                    "/api/portfolio/fx-positions",
+                    params={"date": SELECTED_DATE, "fundId": i % 5 + 1},
+                )
+                for i in range(requests_n)
+            )
+        )
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await ticker
+    failed = sum(1 for r in responses if r.status_code != 200)
+    return elapsed, max(lags, default=0.0), failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=10)
+    parser.add_argument("--db-ms", type=float, default=300)
+    parser.add_argument("--pricer-ms", type=float, default=200)
+    parser.add_argument("--trades", type=int, default=2000)
+    parser.add_argument("--inline-db", action="store_true")
+    args = parser.parse_args()
+
+    _patch(args.db_ms, args.pricer_ms, args.trades, args.inline_db)
+    elapsed, max_lag, failed = asyncio.run(_bench(args.requests))
+    one = (args.db_ms + args.pricer_ms) / 1000
+    print(
+        f"{args.requests} concurrent /fx-positions "
+        f"({'inline' if args.inline_db else 'run_db'}, db {args.db_ms:g} ms, "
+        f"pricer {args.pricer_ms:g} ms, {args.trades:,d} trades)"
+    )
+    print(
+        f"  total {elapsed:6.2f}s  (one request alone ~{one:.2f}s, "
+        f"serialised ~{one * args.requests:.2f}s)"
+    )
+    print(f"  max event loop lag {max_lag * 1000:8.1f} ms")
+    if failed:
+        print(f"  {failed} requests failed")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
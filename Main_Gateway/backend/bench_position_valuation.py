@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Benchmark for PositionValuationEngine on synthetic FX forward and FX option trades.
+
+Times each stage of /fx-positions and /fx-option-positions valuation
+(load, price_requests, value) with a synthetic pricer map, so only the
+grouping, reference price and PnL computation is measured.
+
+Usage:
+    python bench_position_valuation.py                    # 10k, 100k and 1M trades
+    python bench_position_valuation.py --sizes 10000 50000
+"""
+import argparse
+import random
+import sys
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from app.services.position_valuation import (
+    FX_FORWARD,
+    FX_OPTION,
+    PositionValuationEngine,
+)
+
+TODAY = date(2025, 6, 18)
+DTD = date(2025, 6, 17)
+EOM = date(2025, 6, 30)
+EOY = date(2024, 12, 31)
+PAIRS = [("EUR", "USD"), ("USD", "JPY"), ("GBP", "USD"), ("USD", "MXN"), ("AUD", "USD")]
+
+
+def _synthetic_rows(kind, count, tickers):
+    rng = random.Random(42)
+    maturities = [TODAY + timedelta(days=rng.randint(1, 720)) for _ in range(max(1, tickers // len(PAIRS)))]
+    rows = []
+    for i in range(count):
+        trade_ccy, settle_ccy = rng.choice(PAIRS)
+        row = {
+            "trade_id": 100000 + i,
+            "trade_date": TODAY - timedelta(days=rng.randint(0, 600)),
+            "maturity_date": rng.choice(maturities),
+            "quantity": Decimal(rng.randint(1, 50) * 100000),
+            "position": rng.choice(["Buy", "Sell"]),
+            "fund_id": rng.randint(1, 5),
+            "original_trade_id": rng.choice([None, 90000 + i % 1000]),
+        }
+        if kind == FX_FORWARD:
+            row.update(
+                trade_currency=trade_ccy,
+                settlement_currency=settle_ccy,
+                price=Decimal("1.0850"),
+            )
+        else:
+            row.update(
+                underlying_trade_currency=trade_ccy,
+                underlying_settlement_currency=settle_ccy,
+                premium=Decimal("0.0125"),
+                option_type=rng.choice(["Call", "Put"]),
+                option_style="European",
+                strike=rng.choice([1.05, 1.10, 1.15]),
+                strike_currency=settle_ccy,
+                cut="NY",
+            )
+        rows.append(row)
+    return rows
+
+
+def _fetched_map(requests):
+    return {
+        item["id"]: {d: 1.0 + (hash((item["id"], d)) % 1000) / 10000 for d in item["dates"]}
+        for item in requests
+    }
+
+
+def _bench(kind, count):
+    rows = _synthetic_rows(kind, count, tickers=max(10, count // 20))
+    engine = PositionValuationEngine(kind, TODAY, DTD, EOM, EOY, pricer_enabled=True)
+
+    start = time.perf_counter()
+    positions = engine.load(rows)
+    loaded = time.perf_counter()
+    requests = engine.price_requests(positions)
+    requested = time.perf_counter()
+    fetched = _fetched_map(requests)
+    start_value = time.perf_counter()
+    out = engine.value(positions, fetched, fund_id=0)
+    valued = time.perf_counter()
+
+    total = (loaded - start) + (requested - loaded) + (valued - start_value)
+    print(
+        f"{kind:10s} {count:>9,d} trades -> {len(out):>7,d} rows: "
+        f"load {loaded - start:6.2f}s  requests {requested - loaded:6.2f}s  "
+        f"value {valued - start_value:6.2f}s  total {total:6.2f}s "
+        f"({total / count * 1e6:.1f} us/trade)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000]
+    )
+    args = parser.parse_args()
+    for count in args.sizes:
+        for kind in (FX_FORWARD, FX_OPTION):
+            _bench(kind, count)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Benchmark response size and encoding time of the portfolio grid formats.
+
+Encodes /fx-positions and /fx-option-positions output (synthetic trades run
+through PositionValuationEngine) as:
+  - row JSON: FastAPI's default path, jsonable_encoder + json.dumps
+  - columnar JSON: app.util.response_format.encode_columnar (orjson)
+  - Arrow IPC: app.util.response_format.encode_arrow (if pyarrow is installed)
+
+Usage:
+    python bench_response_format.py                  # 1k, 10k and 50k positions' worth of trades
+    python bench_response_format.py --trades 20000
+"""
+import argparse
+import gzip
+import json
+import sys
+import time
+
+from fastapi.encoders import jsonable_encoder
+
+from app.services.position_valuation import (
+    FX_FORWARD,
+    FX_OPTION,
+    PositionValuationEngine,
+)
+from app.util import response_format
+from bench_position_valuation import DTD, EOM, EOY, TODAY, _fetched_map, _synthetic_rows
+
+
+def _row_json(payload):
+    # What JSONResponse does with a returned dict
+    return json.dumps(
+        jsonable_encoder(payload),
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def _timed(encode, payload, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = encode(payload)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return body, best
+
+
+def _bench(kind, trades):
+    rows = _synthetic_rows(kind, trades, tickers=max(10, trades // 2))
+    engine = PositionValuationEngine(kind, TODAY, DTD, EOM, EOY, pricer_enabled=True)
+    positions = engine.load(rows)
+    out = engine.value(positions, _fetched_map(engine.price_requests(positions)), fund_id=1)
+    payload = {"status": "success", "count": len(out), "data": out}
+
+    encoders = [("row json", _row_json), ("columnar", response_format.encode_columnar)]
+    if response_format.pa is not None:
+        encoders.append(("arrow", response_format.encode_arrow))
+    print(f"{kind} {len(out):,d} positions x {len(out[0]) if out else 0} fields")
+    for name, encode in encoders:
+        body, elapsed = _timed(encode, payload)
+        print(
+            f"  {name:9s} {len(body) / 1024:10,.0f} KiB  "
+            f"gzip {len(gzip.compress(body, 6)) / 1024:8,.0f} KiB  "
+            f"encode {elapsed * 1000:8.1f} ms"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--trades", type=int, nargs="+", default=[1_000, 10_000, 50_000])
+    args = parser.parse_args()
+    for trades in args.trades:
+        for kind in (FX_FORWARD, FX_OPTION):
+            _bench(kind, trades)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
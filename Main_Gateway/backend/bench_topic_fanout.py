@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Benchmark ESP fan-out cost of FixController.broadcast with topic subscriptions.
+
+Clients subscribe to a random subset of the topics (symbol x tenor) and
+every topic ticks in turn. Three ways of routing the same ticks are compared:
+  - broadcast: no subscriptions, every tick is queued for every client
+  - scan: the per-client filter a subscription check without an index costs
+  - index: FixController.broadcast routing through TopicIndex
+
+Each reports the time per tick and the number of messages queued for clients.
+Client senders are not started, so only routing and queueing is measured.
+
+Usage:
+    python bench_topic_fanout.py                       # 100 clients, 200 topics
+    python bench_topic_fanout.py --clients 500 --topics 1000 --per-client 20
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+
+from app.controllers.fix_controller import FixController
+from app.util.client_sender import CONFLATE, ClientSender
+from app.util.topic_index import TopicIndex
+
+TENORS = ["SP", "W1", "M1", "M3", "M6", "Y1"]
+
+
+def _topics(count):
+    symbols = [f"C{i:03d}/USD" for i in range((count + len(TENORS) - 1) // len(TENORS))]
+    return [(s, t) for s in symbols for t in TENORS][:count]
+
+
+def _ticks(topics, ticks):
+    return [
+        json.dumps(
+            {
+                "type": "quote",
+                "quote_type": "esp",
+                "symbol": symbol,
+                "rate_type": "SPOT",
+                "price": 1.0 + i / 1e6,
+                "side": "Bid" if i % 2 else "Ask",
+                "provider": "FSS",
+                "quantity": "1M",
+                "settlement": tenor,
+                "version": i,
+            }
+        )
+        for i, (symbol, tenor) in enumerate(
+            topics[i % len(topics)] for i in range(ticks)
+        )
+    ]
+
+
+def _clients(count):
+    return {
+        f"user{i}": [ClientSender(None, f"esp:user{i}", CONFLATE, max_queue=100_000)]
+        for i in range(count)
+    }
+
+
+def _queued(clients):
+    return sum(s.sent + len(s._queue) + s.conflated for g in clients.values() for s in g)
+
+
+async def _bench(clients_n, topics_n, per_client, ticks_n):
+    rng = random.Random(7)
+    topics = _topics(topics_n)
+    ticks = _ticks(topics, ticks_n)
+    subscriptions = [rng.sample(topics, min(per_client, len(topics))) for _ in range(clients_n)]
+    results = []
+
+    # broadcast to all
+    clients = _clients(clients_n)
+    FixController.topic_indexes[FixController.ESP] = index = TopicIndex()
+    for group in clients.values():
+        index.add(group[0])
+    start = time.perf_counter()
+    for tick in ticks:
+        await FixController.broadcast(clients, tick, FixController.ESP)
+    results.append(("broadcast", time.perf_counter() - start, _queued(clients)))
+
+    # per-client scan of subscription sets
+    clients = _clients(clients_n)
+    wanted = [set(s) for s in subscriptions]
+    senders = [g[0] for g in clients.values()]
+    start = time.perf_counter()
+    for tick in ticks:
+        data = json.loads(tick)
+        topic = (data["symbol"], data["settlement"])
+        key = FixController._esp_key(data)
+        for sender, topics_wanted in zip(senders, wanted):
+            if topic in topics_wanted:
+                sender.put(tick, key)
+    results.append(("scan", time.perf_counter() - start, _queued(clients)))
+
+    # inverted index
+    clients = _clients(clients_n)
+    FixController.topic_indexes[FixController.ESP] = index = TopicIndex()
+    for group, topics_wanted in zip(clients.values(), subscriptions):
+        for symbol, tenor in topics_wanted:
+            index.subscribe(group[0], symbols=[symbol], tenors=[tenor])
+    start = time.perf_counter()
+    for tick in ticks:
+        await FixController.broadcast(clients, tick, FixController.ESP)
+    results.append(("index", time.perf_counter() - start, _queued(clients)))
+
+    print(
+        f"{clients_n} clients, {topics_n} topics, {per_client} topics per client, "
+        f"{ticks_n:,d} ticks"
+    )
+    for name, elapsed, queued in results:
+        print(
+            f"  {name:9s} {elapsed / ticks_n * 1e6:8.1f} us/tick  "
+            f"{queued / ticks_n:7.1f} messages/tick  {queued:12,d} queued"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument("--topics", type=int, default=200)
+    parser.add_argument("--per-client", type=int, default=10)
+    parser.add_argument("--ticks", type=int, default=20_000)
+    args = parser.parse_args()
+    asyncio.run(_bench(args.clients, args.topics, args.per_client, args.ticks))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Print PostgreSQL plans for the position queries before and after the latest-lineage tables.
+
+"before" is the per-trade LEFT JOIN LATERAL (... ORDER BY operation_timestamp DESC LIMIT 1)
+the DAOs used to run; "after" is the join on gzc_*_latest_lineage used by
+PortfolioDAO/CashDAO since migrations/008_create_latest_lineage_tables.sql.
+Uses the database configured for the gateway (POSTGRES_* environment variables).
+The plan shape itself is asserted by app/daos/test_lineage_query_plans.py.
+
+Usage:
+    python explain_lineage_queries.py                       # EXPLAIN only
+    python explain_lineage_queries.py --analyze --date 2025-06-18
+"""
+import argparse
+import sys
+from datetime import date
+
+from sqlalchemy import text
+
+from app.database.connection import engine
+
+_SELECT = """
+    SELECT
+        t.*,
+        ln.id AS lineage_id,
+        ln.operation AS lineage_operation,
+        ln.operation_timestamp AS lineage_operation_timestamp,
+        ln.original_trade_id AS lineage_original_trade_id,
+        ln.parent_lineage_id AS lineage_parent_lineage_id,
+        ot.trade_id AS original_trade_id,
+        ot.{price} AS original_trade_price,
+        ot.quantity AS original_trade_quantity,
+        pt.trade_id AS parent_trade_id,
+        pt.{price} AS parent_trade_price,
+        pt.quantity AS parent_trade_quantity
+    FROM public.{trade} t
+    {latest_join}
+    LEFT JOIN public.{trade} ot
+        ON ot.trade_id = ln.original_trade_id
+    LEFT JOIN public.{trade}_lineage pln
+        ON pln.id = ln.parent_lineage_id
+    LEFT JOIN public.{trade} pt
+        ON pt.trade_id = pln.current_trade_id
+    WHERE t.maturity_date::date >= (:selected_date)::date
+      AND t.trade_date::date    <= (:selected_date)::date
+    ORDER BY t.maturity_date ASC, t.trade_id DESC LIMIT 5000 OFFSET 0
+"""
+
+_JOINS = {
+    "before": """LEFT JOIN LATERAL (
+        SELECT l.*
+        FROM public.{trade}_lineage l
+        WHERE l.current_trade_id = t.trade_id
+        ORDER BY l.operation_timestamp DESC, l.id DESC
+        LIMIT 1
+    ) ln ON TRUE""",
+    "after": """LEFT JOIN public.{trade}_latest_lineage latest
+        ON latest.current_trade_id = t.trade_id
+    LEFT JOIN public.{trade}_lineage ln
+        ON ln.id = latest.lineage_id""",
+}
+
+_TABLES = {
+    "fx-positions": ("gzc_fx_trade", "price"),
+    "fx-option-positions": ("gzc_fx_option_trade", "premium"),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--date", default=date.today().isoformat())
+    parser.add_argument(
+        "--analyze", action="store_true", help="run the queries (EXPLAIN ANALYZE, BUFFERS)"
+    )
+    args = parser.parse_args()
+    options = "ANALYZE, BUFFERS" if args.analyze else "COSTS"
+
+    with engine.connect() as conn:
+        for name, (trade, price) in _TABLES.items():
+            for label, join in _JOINS.items():
+                sql = _SELECT.format(
+                    trade=trade, price=price, latest_join=join.format(trade=trade)
+                )
+                plan = conn.execute(
+                    text(f"EXPLAIN ({options}) {sql}"), {"selected_date": args.date}
+                ).scalars()
+                print(f"=== {name} ({label}) ===")
+                print("\n".join(plan))
+                print()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
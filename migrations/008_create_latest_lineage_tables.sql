@@ -0,0 +1,163 @@
+-- Migration: Maintain the latest lineage row per current trade
+-- Purpose: Replace the per-row LEFT JOIN LATERAL (... ORDER BY operation_timestamp DESC, id DESC LIMIT 1)
+-- in the FX / FX option position queries with a primary key join.
+--
+-- gzc_fx_trade_latest_lineage / gzc_fx_option_trade_latest_lineage hold, for every
+-- current_trade_id that has lineage, the id of its latest lineage row (by
+-- operation_timestamp DESC, id DESC). They are kept up to date by triggers on the lineage
+-- tables, so readers never see a stale row and there is no refresh to schedule.
+--
+-- Plan shape (position queries, fund filter off). Main_Gateway/backend/app/daos/
+-- test_lineage_query_plans.py asserts it with EXPLAIN (FORMAT JSON) on the four PortfolioDAO /
+-- CashDAO position queries when a database is configured. Captured with
+-- explain_lineage_queries.py --analyze on a scratch PostgreSQL 16 database (50,000 trades and
+-- 150,000 lineage rows per table, all migrations through 009), not production data:
+--   Before: Nested Loop Left Join
+--             -> Index Scan using idx_fx_trade_maturity_keyset on gzc_fx_trade t
+--             -> Limit -> Index Scan using idx_fx_lineage_current_latest   (loops=5000, once per trade)
+--   After:  Nested Loop Left Join
+--             -> Index Scan using idx_fx_trade_maturity_keyset on gzc_fx_trade t
+--             -> Index Scan using gzc_fx_trade_latest_lineage_pkey on latest   (loops=5000)
+--           followed by a primary key lookup of gzc_fx_trade_lineage ln, no per-trade Limit or Sort.
+-- With the covering index below the old per-trade Limit no longer sorts, and both ran in about
+-- 40-45 ms for the 5,000-row page on that data set.
+
+-- Covering index for "latest lineage of a trade"; supersedes the single column index
+CREATE INDEX IF NOT EXISTS idx_fx_lineage_current_latest
+    ON public.gzc_fx_trade_lineage(current_trade_id, operation_timestamp DESC, id DESC);
+DROP INDEX IF EXISTS public.idx_fx_lineage_current_trade;
+
+CREATE INDEX IF NOT EXISTS idx_fxopt_lineage_current_latest
+    ON public.gzc_fx_option_trade_lineage(current_trade_id, operation_timestamp DESC, id DESC);
+DROP INDEX IF EXISTS public.idx_fxopt_lineage_current_trade;
+
+-- FX Trade latest lineage
+CREATE TABLE IF NOT EXISTS public.gzc_fx_trade_latest_lineage (
+    current_trade_id    BIGINT PRIMARY KEY, -- gzc_fx_trade_lineage.current_trade_id
+    lineage_id          BIGINT NOT NULL,    -- latest gzc_fx_trade_lineage.id for that trade
+    mod_timestamp       TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE OR REPLACE FUNCTION public.gzc_refresh_fx_latest_lineage(p_trade_id BIGINT)
+RETURNS VOID AS $$
+DECLARE
+    v_lineage_id BIGINT;
+BEGIN
+    IF p_trade_id IS NULL THEN
+        RETURN;
+    END IF;
+
+    -- Serialise concurrent writers for the same trade; the lookup below then sees their rows
+    PERFORM pg_advisory_xact_lock(hashtext('gzc_fx_trade_latest_lineage'), hashtext(p_trade_id::text));
+
+    SELECT l.id INTO v_lineage_id
+    FROM public.gzc_fx_trade_lineage l
+    WHERE l.current_trade_id = p_trade_id
+    ORDER BY l.operation_timestamp DESC, l.id DESC
+    LIMIT 1;
+
+    IF v_lineage_id IS NULL THEN
+        DELETE FROM public.gzc_fx_trade_latest_lineage WHERE current_trade_id = p_trade_id;
+    ELSE
+        INSERT INTO public.gzc_fx_trade_latest_lineage (current_trade_id, lineage_id)
+        VALUES (p_trade_id, v_lineage_id)
+        ON CONFLICT (current_trade_id) DO UPDATE
+            SET lineage_id = EXCLUDED.lineage_id,
+                mod_timestamp = NOW()
+            WHERE public.gzc_fx_trade_latest_lineage.lineage_id IS DISTINCT FROM EXCLUDED.lineage_id;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION public.gzc_fx_trade_lineage_latest_trigger()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM public.gzc_refresh_fx_latest_lineage(OLD.current_trade_id);
+    END IF;
+    IF TG_OP = 'INSERT' OR (TG_OP = 'UPDATE' AND NEW.current_trade_id IS DISTINCT FROM OLD.current_trade_id) THEN
+        PERFORM public.gzc_refresh_fx_latest_lineage(NEW.current_trade_id);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_fx_trade_lineage_latest ON public.gzc_fx_trade_lineage;
+CREATE TRIGGER trg_fx_trade_lineage_latest
+    AFTER INSERT OR DELETE OR UPDATE OF current_trade_id, operation_timestamp
+    ON public.gzc_fx_trade_lineage
+    FOR EACH ROW EXECUTE FUNCTION public.gzc_fx_trade_lineage_latest_trigger();
+
+-- FX Option Trade latest lineage
+CREATE TABLE IF NOT EXISTS public.gzc_fx_option_trade_latest_lineage (
+    current_trade_id    BIGINT PRIMARY KEY, -- gzc_fx_option_trade_lineage.current_trade_id
+    lineage_id          BIGINT NOT NULL,    -- latest gzc_fx_option_trade_lineage.id for that trade
+    mod_timestamp       TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE OR REPLACE FUNCTION public.gzc_refresh_fxopt_latest_lineage(p_trade_id BIGINT)
+RETURNS VOID AS $$
+DECLARE
+    v_lineage_id BIGINT;
+BEGIN
+    IF p_trade_id IS NULL THEN
+        RETURN;
+    END IF;
+
+    PERFORM pg_advisory_xact_lock(hashtext('gzc_fx_option_trade_latest_lineage'), hashtext(p_trade_id::text));
+
+    SELECT l.id INTO v_lineage_id
+    FROM public.gzc_fx_option_trade_lineage l
+    WHERE l.current_trade_id = p_trade_id
+    ORDER BY l.operation_timestamp DESC, l.id DESC
+    LIMIT 1;
+
+    IF v_lineage_id IS NULL THEN
+        DELETE FROM public.gzc_fx_option_trade_latest_lineage WHERE current_trade_id = p_trade_id;
+    ELSE
+        INSERT INTO public.gzc_fx_option_trade_latest_lineage (current_trade_id, lineage_id)
+        VALUES (p_trade_id, v_lineage_id)
+        ON CONFLICT (current_trade_id) DO UPDATE
+            SET lineage_id = EXCLUDED.lineage_id,
+                mod_timestamp = NOW()
+            WHERE public.gzc_fx_option_trade_latest_lineage.lineage_id IS DISTINCT FROM EXCLUDED.lineage_id;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION public.gzc_fx_option_trade_lineage_latest_trigger()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM public.gzc_refresh_fxopt_latest_lineage(OLD.current_trade_id);
+    END IF;
+    IF TG_OP = 'INSERT' OR (TG_OP = 'UPDATE' AND NEW.current_trade_id IS DISTINCT FROM OLD.current_trade_id) THEN
+        PERFORM public.gzc_refresh_fxopt_latest_lineage(NEW.current_trade_id);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_fx_option_trade_lineage_latest ON public.gzc_fx_option_trade_lineage;
+CREATE TRIGGER trg_fx_option_trade_lineage_latest
+    AFTER INSERT OR DELETE OR UPDATE OF current_trade_id, operation_timestamp
+    ON public.gzc_fx_option_trade_lineage
+    FOR EACH ROW EXECUTE FUNCTION public.gzc_fx_option_trade_lineage_latest_trigger();
+
+-- Backfill from existing lineage (safe to re-run)
+INSERT INTO public.gzc_fx_trade_latest_lineage (current_trade_id, lineage_id)
+SELECT DISTINCT ON (l.current_trade_id) l.current_trade_id, l.id
+FROM public.gzc_fx_trade_lineage l
+WHERE l.current_trade_id IS NOT NULL
+ORDER BY l.current_trade_id, l.operation_timestamp DESC, l.id DESC
+ON CONFLICT (current_trade_id) DO UPDATE SET lineage_id = EXCLUDED.lineage_id;
+
+INSERT INTO public.gzc_fx_option_trade_latest_lineage (current_trade_id, lineage_id)
+SELECT DISTINCT ON (l.current_trade_id) l.current_trade_id, l.id
+FROM public.gzc_fx_option_trade_lineage l
+WHERE l.current_trade_id IS NOT NULL
+ORDER BY l.current_trade_id, l.operation_timestamp DESC, l.id DESC
+ON CONFLICT (current_trade_id) DO UPDATE SET lineage_id = EXCLUDED.lineage_id;
+
+ANALYZE public.gzc_fx_trade_latest_lineage;
+ANALYZE public.gzc_fx_option_trade_latest_lineage;
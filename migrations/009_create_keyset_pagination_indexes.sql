@@ -0,0 +1,45 @@
+-- Migration: Indexes behind the keyset (cursor) pagination of trade and position listings
+-- Purpose: Let "WHERE <sort key> past cursor ORDER BY <sort key> LIMIT n" seek through an
+-- index in the query's exact sort order instead of sorting every matching row per page.
+--
+-- Each index matches one ORDER BY in Main_Gateway/backend/app/daos/fx_trades_dao.py:
+--   trade listings:    ORDER BY trade_date DESC NULLS FIRST, trade_id DESC
+--   position listings: ORDER BY maturity_date ASC, trade_id DESC  (WHERE maturity_date >= :date)
+-- The fund variants serve the position listings filtered by fundId, which are also the
+-- order PortfolioDAO / CashDAO read FX and FX option positions in.
+-- Cash transactions page on id DESC; an index is added only if none leads with id
+-- (normally the primary key already does).
+
+-- FX trades
+CREATE INDEX IF NOT EXISTS idx_fx_trade_trade_date_keyset
+    ON public.gzc_fx_trade(trade_date DESC NULLS FIRST, trade_id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_fx_trade_maturity_keyset
+    ON public.gzc_fx_trade(maturity_date, trade_id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_fx_trade_fund_maturity_keyset
+    ON public.gzc_fx_trade(fund_id, maturity_date, trade_id DESC);
+
+-- FX option trades
+CREATE INDEX IF NOT EXISTS idx_fxopt_trade_trade_date_keyset
+    ON public.gzc_fx_option_trade(trade_date DESC NULLS FIRST, trade_id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_fxopt_trade_maturity_keyset
+    ON public.gzc_fx_option_trade(maturity_date, trade_id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_fxopt_trade_fund_maturity_keyset
+    ON public.gzc_fx_option_trade(fund_id, maturity_date, trade_id DESC);
+
+-- Cash transactions
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1
+        FROM pg_index i
+        JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]
+        WHERE i.indrelid = 'public.gzc_cash_transactions'::regclass
+          AND a.attname = 'id'
+    ) THEN
+        CREATE INDEX idx_cash_transactions_id ON public.gzc_cash_transactions(id);
+    END IF;
+END$$;
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Fail when the modules copied between FSS_Socket and Main_Gateway drift apart.
+
+Each backend is built and deployed from its own directory, so shared code is
+kept as identical copies. Run from anywhere:
+
+    python scripts/check_shared_modules.py
+"""
+import filecmp
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Pairs of paths that must stay byte-identical
+SHARED_MODULES = [
+    (
+        "FSS_Socket/backend/app/util/topic_index.py",
+        "Main_Gateway/backend/app/util/topic_index.py",
+    ),
+    (
+        "FSS_Socket/backend/app/util/business_calendar.py",
+        "Main_Gateway/backend/app/services/business_calendar.py",
+    ),
+]
+
+
+def main():
+    drifted = [
+        (first, second)
+        for first, second in SHARED_MODULES
+        if not filecmp.cmp(ROOT / first, ROOT / second, shallow=False)
+    ]
+    for first, second in drifted:
+        print(f"{first} and {second} differ; copy the change to both")
+    return 1 if drifted else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())